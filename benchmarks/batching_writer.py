@@ -0,0 +1,55 @@
+"""
+    Measures the cost of sending ticks of many small messages (POSITION) over TCP loopback with Nagle disabled: one
+    send per message, and a :class:`~pygtlink.BatchingWriter` flushed at the end of each tick.
+
+    Usage (from the repository root): PYTHONPATH=. python benchmarks/batching_writer.py [--ticks N] [--messages M]
+"""
+import argparse
+import threading
+import time
+from pygtlink import *
+
+
+def drain(sock):
+    buffer = bytearray(1 << 20)
+    while sock.recv_into(buffer):
+        pass
+
+
+def measure(name, ticks, messages, batched):
+    listener = TcpListener('127.0.0.1', 0)
+    sender = TcpTransport.connect('127.0.0.1', listener.getPort(), noDelay=True)
+    receiver = listener.accept()
+    thread = threading.Thread(target=drain, args=(receiver.getSocket(),))
+    thread.start()
+
+    template = MessageTemplate.forPosition("Tracker")
+    writer = BatchingWriter(sender, maxBytes=1 << 20, maxBuffers=1024) if batched else sender
+    start = time.perf_counter()
+    for tick in range(ticks):
+        for i in range(messages):
+            template.send(writer, i, tick, 0, 0, 0, 0, 1)
+        if batched:
+            writer.flush()
+    elapsed = time.perf_counter() - start
+    if batched:
+        writer.close()
+    sender.close()
+    thread.join()
+    receiver.close()
+    listener.close()
+    print("{:10s} {:8.1f} us/tick ({:.2f} us/message)".format(name, elapsed / ticks * 1e6,
+                                                              elapsed / ticks / messages * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=500)
+    args = parser.parse_args()
+    measure('send', args.ticks, args.messages, False)
+    measure('batched', args.ticks, args.messages, True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+    Measures the receive throughput of small frames (POSITION, 86 bytes) over a socket pair: with
+    :func:`~pygtlink.Transport.receiveFrame` (two reads per frame) and with :func:`~pygtlink.iterFrames` (a
+    :class:`~pygtlink.FrameDecoder` fed by large recv_into reads). The sender writes pre-encoded frames in large
+    chunks, so that the receiver is the bottleneck.
+
+    Usage (from the repository root): PYTHONPATH=. python benchmarks/frame_decoder.py [--count N]
+"""
+import argparse
+import socket
+import threading
+import time
+from pygtlink import *
+
+
+def send(sock, stream):
+    sock.sendall(stream)
+    sock.shutdown(socket.SHUT_WR)
+
+
+def measure(name, receive, stream, count):
+    sock_a, sock_b = socket.socketpair()
+    thread = threading.Thread(target=send, args=(sock_a, stream))
+    start = time.perf_counter()
+    thread.start()
+    received = receive(SocketTransport(sock_b))
+    elapsed = time.perf_counter() - start
+    thread.join()
+    sock_a.close()
+    sock_b.close()
+    assert received == count
+    print("{:14s} {:10.0f} frames/s".format(name, count / elapsed))
+
+
+def receive_frames(transport):
+    count = 0
+    while True:
+        header, body = transport.receiveFrame()
+        if header is None:
+            return count
+        count += 1
+
+
+def decode_frames(transport):
+    count = 0
+    for _ in iterFrames(transport):
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=200000)
+    args = parser.parse_args()
+
+    template = MessageTemplate.forPosition("Tracker")
+    stream = b''.join(bytes(template.pack(i, 0, 0, 0, 0, 0, 1)) for i in range(args.count))
+    measure('receiveFrame', receive_frames, stream, args.count)
+    measure('FrameDecoder', decode_frames, stream, args.count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+    Measures the startup cost of pygtlink with ``python -X importtime``: the cumulative import time of the package and
+    of the heaviest modules it pulls in, for a few typical entry points.
+
+    Usage: python benchmarks/import_time.py [--repeat N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+STATEMENTS = [
+    "import pygtlink",
+    "from pygtlink import MessageBase",
+    "from pygtlink import PositionMessage, StatusMessage",
+    "from pygtlink import ImageMessage2",
+    "from pygtlink import *",
+]
+
+
+def measure(statement):
+    """Runs statement in a fresh interpreter
+
+    :returns: A dictionary with the cumulative import time in microseconds of each module imported at top level
+        (which, for the lazily loaded submodules, is not always below pygtlink), and one with the cumulative import
+        time of numpy and crcmod wherever they are imported
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], env=env,
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times, dependencies = {}, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # column titles
+        if len(name) - len(name.lstrip()) == 1:
+            times[name.strip()] = int(cumulative)
+        if name.strip() in ("numpy", "crcmod"):
+            dependencies[name.strip()] = int(cumulative)
+    return times, dependencies
+
+
+def total(times, baseline):
+    """Sums the cumulative import time of the top level modules not imported by the interpreter itself
+    """
+    return sum(t for name, t in times.items() if name not in baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per statement, the best one is reported")
+    args = parser.parse_args()
+
+    baseline = set(measure("pass")[0])
+    print("{:<55} {:>10} {:>10} {:>10}".format("statement", "total", "numpy", "crcmod"))
+    for statement in STATEMENTS:
+        runs = [measure(statement) for _ in range(args.repeat)]
+        times, dependencies = min(runs, key=lambda r: total(r[0], baseline))
+        print("{:<55} {:>8.1f}ms {:>8.1f}ms {:>8.1f}ms".format(statement, total(times, baseline) / 1000,
+                                                             dependencies.get("numpy", 0) / 1000,
+                                                             dependencies.get("crcmod", 0) / 1000))
+
+
+if __name__ == '__main__':
+    main()
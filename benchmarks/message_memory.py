@@ -0,0 +1,79 @@
+"""
+    Measures the memory used per message when many messages are kept alive, e.g. buffered for analysis: N messages of
+    each type are created (or received, i.e. unpacked from a packed frame) and the memory allocated for them is
+    measured with tracemalloc.
+
+    Usage (from the repository root): PYTHONPATH=. python benchmarks/message_memory.py [--count N]
+"""
+import argparse
+import tracemalloc
+import numpy as np
+from pygtlink import *
+
+
+def make_position():
+    msg = PositionMessage()
+    msg.setDeviceName("Tracker")
+    msg.setPosition([1, 2, 3])
+    return msg
+
+
+def make_status():
+    msg = StatusMessage()
+    msg.setDeviceName("Device")
+    return msg
+
+
+def make_image():
+    msg = ImageMessage2()
+    msg.setDeviceName("US")
+    msg.setSpacing([1, 1, 1])
+    msg.setData(np.zeros([4, 4], dtype=np.uint8))
+    return msg
+
+
+def receive(factory, template):
+    # unpacks a copy of the template frame into a new message, as a client receiving it would do
+    msg = factory()
+    msg.header = bytes(template.header)
+    msg.unpack()
+    msg.body = bytes(template.body)
+    msg.unpack()
+    return msg
+
+
+def measure(create, count):
+    """Creates count objects with create() and keeps them alive
+
+    :returns: The number of bytes allocated per object
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [create() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # the list holding them is not part of the messages
+    return (after - before) / count - 8 if objects else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000, help="messages created per case")
+    args = parser.parse_args()
+
+    cases = [("IgtlHeader", IgtlHeader)]
+    for name, factory, make in (("POSITION", PositionMessage, make_position),
+                                ("STATUS", StatusMessage, make_status),
+                                ("IMAGE (4x4)", ImageMessage2, make_image)):
+        template = make()
+        template.pack()
+        cases.append(("{} new".format(name), factory))
+        cases.append(("{} received".format(name), lambda f=factory, t=template: receive(f, t)))
+
+    print("{:<25} {:>12}".format("object", "bytes/object"))
+    for name, create in cases:
+        print("{:<25} {:>12.0f}".format(name, measure(create, args.count)))
+
+
+if __name__ == '__main__':
+    main()
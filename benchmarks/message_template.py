@@ -0,0 +1,55 @@
+"""
+    Measures the cost of packing a POSITION message per send: a new message packed each time, the same message
+    repacked with new values, and a :class:`~pygtlink.MessageTemplate` patched in place. A struct pack_into of the
+    7 floats alone is given as the lower bound.
+
+    Usage (from the repository root): PYTHONPATH=. python benchmarks/message_template.py [--count N]
+"""
+import argparse
+import struct
+import time
+from pygtlink import *
+
+
+def new_message(i):
+    msg = PositionMessage()
+    msg.setDeviceName("Tracker")
+    msg.setTimeStamp(time.time())
+    msg.setPosition([i, 2, 3])
+    msg.pack()
+    return msg.header + msg.body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    reused = PositionMessage()
+    reused.setDeviceName("Tracker")
+
+    def repack(i):
+        reused.setTimeStamp(time.time())
+        reused.setPosition([i, 2, 3])
+        reused._isBodyPacked = False
+        reused.pack()
+        return reused.header + reused.body
+
+    template = MessageTemplate.forPosition("Tracker")
+    buffer = bytearray(28)
+    payload = struct.Struct('>7f')
+
+    cases = [('new message', new_message),
+             ('reused message', repack),
+             ('template', lambda i: template.pack(i, 2, 3, 0, 0, 0, 1)),
+             ('pack_into only', lambda i: payload.pack_into(buffer, 0, i, 2, 3, 0, 0, 0, 1))]
+    for name, pack in cases:
+        start = time.perf_counter()
+        for i in range(args.count):
+            pack(i)
+        elapsed = time.perf_counter() - start
+        print("{:16s} {:6.2f} us/message".format(name, elapsed / args.count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+    Measures packing and unpacking a POLYDATA message of a surface mesh (float32 points, triangles and point normals),
+    as streamed to 3D Slicer, and the resulting update rate.
+
+    Usage (from the repository root): PYTHONPATH=. python benchmarks/polydata_message.py [--points N] [--repeat N]
+"""
+import argparse
+import time
+import numpy as np
+from pygtlink import *
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    points = np.random.rand(args.points, 3).astype(np.float32)
+    triangles = np.random.randint(0, args.points, size=(2 * args.points, 3)).astype(np.int32)
+    normals = np.random.rand(args.points, 3).astype(np.float32)
+
+    pack_time = unpack_time = 0.0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        msg = PolyDataMessage()
+        msg.setDeviceName("Segmentation")
+        msg.setPoints(points)
+        msg.setPolygons(triangles)
+        msg.addAttribute("Normals", normals, PolyDataMessage.POINT_NORMAL)
+        msg.pack()
+        pack_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        rcv_msg = PolyDataMessage()
+        rcv_msg.header = msg.header
+        rcv_msg.unpack()
+        rcv_msg.body = msg.body
+        rcv_msg.unpack()
+        rcv_msg.getPolygons(uniform=True)
+        unpack_time += time.perf_counter() - start
+
+    size = len(msg.body) / 1e6
+    print("{} points, {} triangles, {:.1f} MB body".format(args.points, len(triangles), size))
+    for name, elapsed in (('pack', pack_time), ('unpack', unpack_time)):
+        elapsed /= args.repeat
+        print("{:8s} {:7.2f} ms/message {:7.1f} messages/s {:7.0f} MB/s".format(name, elapsed * 1e3, 1 / elapsed,
+                                                                               size / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,52 @@
-from pygtlink.utils import *
-from pygtlink.igtl_header import *
-from pygtlink.igtl_message_base import *
-from pygtlink.image_message2 import *
-from pygtlink.sensor_message import *
-from pygtlink.status_message import *
-from pygtlink.position_message import *
-from pygtlink.server_socket import *
-from pygtlink.client_socket import *
-
-__all__ = []
-__all__ += igtl_header.__all__
-__all__ += igtl_message_base.__all__
-__all__ += image_message2.__all__
-__all__ += sensor_message.__all__
-__all__ += status_message.__all__
-__all__ += position_message.__all__
-__all__ += server_socket.__all__
-__all__ += client_socket.__all__
+"""
+    The modules are loaded lazily (PEP 562): ``import pygtlink`` is cheap and e.g. ``pygtlink.ImageMessage2`` only
+    imports the image module (and numpy) on first access. ``from pygtlink import *`` still loads everything.
+"""
+import ast
+import importlib
+import os
+import re
+
+# The modules with public names, in dependency order. Their names are read from the __all__ in their source
+_MODULES = ['utils', 'igtl_header', 'igtl_message_base', 'image_message2', 'sensor_message', 'status_message',
+            'position_message', 'ndarray_message', 'polydata_message', 'frame_decoder', 'header_scan', 'export',
+            'message_pool', 'message_template', 'latency', 'streaming', 'adaptive_streaming', 'volume_streaming',
+            'file_streaming', 'broadcast', 'batching_writer', 'tracing', 'loadgen', 'router', 'send_scheduler',
+            'encoding_pipeline', 'shm_transport', 'transport', 'client_socket', 'server_socket', 'connection_manager']
+
+_ALL_PATTERN = re.compile(r'^__all__ = (\[.*?\])', re.MULTILINE | re.DOTALL)
+
+# Module of each public name, built on first access
+_exports = None
+
+
+def _getExports():
+    """Gets the module of each public name, from the __all__ of the modules, without importing them
+    """
+    global _exports
+    if _exports is None:
+        exports = {}
+        directory = os.path.dirname(__file__)
+        for module in _MODULES:
+            with open(os.path.join(directory, module + '.py'), encoding='utf-8') as f:
+                names = ast.literal_eval(_ALL_PATTERN.search(f.read()).group(1))
+            exports.update(dict.fromkeys(names, module))
+        _exports = exports
+    return _exports
+
+
+def __getattr__(name):
+    if name == '__all__':
+        value = list(_getExports())
+    else:
+        module = _getExports().get(name)
+        if module is None:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+        value = getattr(importlib.import_module('pygtlink.' + module), name)
+    # cache it, so that next accesses do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_getExports()))
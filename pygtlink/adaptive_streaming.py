@@ -0,0 +1,320 @@
+from pygtlink.image_message2 import ImageMessage2
+import logging
+import threading
+import time
+import numpy as np
+
+__all__ = ['AdaptiveImageStreamer', 'downsampleImage']
+
+
+def downsampleImage(data, factor, method='mean'):
+    """Downsamples an image by an integer factor along each axis longer than 1 (e.g. not along the third axis of a 2D
+    image). The image is cropped to a multiple of the factor first.
+
+    :param numpy.ndarray data: The image, as returned by :func:`~pygtlink.ImageMessage2.getData`
+    :param int factor: The downsampling factor
+    :param str method: 'mean' averages each block of factor^n voxels, 'stride' keeps the first voxel of each block
+
+    :returns: The downsampled image, with the same dtype
+    """
+    if factor <= 1:
+        return data
+    factors = [factor if size > 1 else 1 for size in data.shape[:3]] + [1] * (data.ndim - 3)
+    if method == 'stride':
+        return data[tuple(slice(None, None, f) for f in factors)][
+            tuple(slice(0, size // f) for size, f in zip(data.shape, factors))]
+    if method != 'mean':
+        raise ValueError("unknown downsampling method {}".format(method))
+
+    cropped = data[tuple(slice(0, size // f * f) for size, f in zip(data.shape, factors))]
+    # each axis is split into (blocks, factor) and the mean is taken over the factor axes
+    blocks = cropped.reshape([n for size, f in zip(cropped.shape, factors) for n in (size // f, f)])
+    mean = blocks.mean(axis=tuple(range(1, blocks.ndim, 2)), dtype=np.float64)
+    if np.issubdtype(data.dtype, np.integer):
+        mean = np.rint(mean)
+    return mean.astype(data.dtype)
+
+
+def _deriveImage(message, factor, roi, method):
+    # Builds the message sent at a given (factor, roi), adjusting spacing and matrix so that the voxels keep their
+    # physical position. The matrix translation is the image center, i.e. the position of voxel index (size - 1) / 2
+    data = message.getData()
+    spacing = np.array(message.getSpacing(), dtype=np.float64)
+    matrix = np.array(message.getMatrix(), dtype=np.float64)
+    sizes = np.array(data.shape[:3], dtype=np.float64)
+    start = np.zeros(3)
+
+    if roi is not None:
+        roi_start, roi_size = roi
+        data = data[tuple(slice(s, s + n) for s, n in zip(roi_start, roi_size))]
+        start = np.array(roi_start, dtype=np.float64)
+
+    steps = np.ones(3)
+    if factor > 1:
+        steps = np.array([factor if n > 1 else 1 for n in data.shape[:3]], dtype=np.float64)
+        data = downsampleImage(data, factor, method)
+    kept = np.array(data.shape[:3], dtype=np.float64)
+
+    # the center of the kept voxels, in voxel indices of the original image: the blocks averaged by 'mean' cover
+    # kept * steps voxels, 'stride' keeps the first voxel of each block
+    if method == 'stride':
+        center = start + (kept - 1) * steps / 2
+    else:
+        center = start + (kept * steps - 1) / 2
+    offset = (center - (sizes - 1) / 2) * spacing
+    spacing = spacing * steps
+
+    matrix[0:3, 3] += matrix[0:3, 0:3].dot(offset)
+
+    derived = ImageMessage2()
+    derived.setDeviceName(message.getDeviceName())
+    derived._timeStampSec, derived._timeStampFraction = message.getTimeStampSecFrac()
+    derived.setHeaderVersion(message.getHeaderVersion())
+    derived.setMessageID(message.getMessageID())
+    # the values are copied undecoded, with their encoding
+    for key, (encoding, value) in message.getRawMetaData().items():
+        derived.setMetaDataElement(key, value, encoding)
+    derived._numComponents = message._numComponents
+    derived._scalarType = message._scalarType
+    derived._coordinate = message._coordinate
+    derived._endian = message._endian
+    derived.setData(np.ascontiguousarray(data))
+    derived.setSpacing(spacing)
+    derived.setMatrix(matrix)
+    return derived
+
+
+class _Client(object):
+    """A client of the streamer, with a single slot mailbox: a frame not sent yet is replaced by the next one"""
+
+    def __init__(self, connection, roi):
+        self.connection = connection
+        self.roi = roi
+        self.level = 0
+        self.pending = None
+        self.drainRate = None  # bytes/s
+        self.sentFrames = 0
+        self.droppedFrames = 0
+        self.droppedSinceAdapt = 0
+        self.sentBytes = 0
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = None
+
+
+class AdaptiveImageStreamer(object):
+    """
+        Streams :class:`~pygtlink.ImageMessage2` frames to several clients, adapting the resolution of each client to
+        its bandwidth. Each client has a writer thread, which measures the client drain rate (bytes per second of send
+        time) and only ever holds the latest frame: a client too slow for the frame rate drops frames.
+
+        Level 0 is the full resolution and level n is downsampled by factor^n. A client moves to a coarser level when
+        it drops frames or its drain rate cannot sustain the current level at the publishing frame rate, and back to a
+        finer level when its drain rate can sustain it with margin. Clients may also ask for a region of interest,
+        cropped before downsampling. Spacing and matrix are adjusted so that the image geometry stays correct.
+
+        Each (level, region of interest) is encoded once per frame and shared by all the clients using it.
+
+        :param int levels: The number of resolution levels, including the full resolution
+        :param int factor: The downsampling factor between two consecutive levels
+        :param str method: The downsampling method, 'mean' or 'stride' (see :func:`~pygtlink.downsampleImage`)
+        :param float headroom: The fraction of the drain rate a level may use
+        :param float smoothing: The weight of a new measure in the moving averages of drain rate and frame rate
+        :param clock: The clock used to measure the frame rate and the drain rates
+
+        :ivar dict _clients: The clients by id of their connection
+        :ivar float _frameRate: The publishing frame rate (exponential moving average)
+    """
+
+    def __init__(self, levels=3, factor=2, method='mean', headroom=0.8, smoothing=0.2, clock=time.monotonic):
+        self._levels = levels
+        self._factor = factor
+        self._method = method
+        self._headroom = headroom
+        self._smoothing = smoothing
+        self._clock = clock
+        self._clients = {}
+        self._frameRate = None
+        self._lastPublish = None
+        self._lock = threading.Lock()
+
+    def addClient(self, connection, roi=None):
+        """Adds a client and starts its writer thread
+
+        :param connection: The client connection, any object with a send(data) method, e.g.
+            :class:`~pygtlink.ClientSocket` or :class:`~pygtlink.SocketServer`
+        :param roi: The region of interest as (start, size), two sequences of 3 voxel indices, or None for the whole
+            image
+        """
+        client = _Client(connection, roi)
+        client.thread = threading.Thread(target=self._run, args=(client,), name="AdaptiveImageStreamer", daemon=True)
+        with self._lock:
+            self._clients[id(connection)] = client
+        client.thread.start()
+
+    def removeClient(self, connection):
+        """Removes a client and stops its writer thread
+
+        :param connection: The client connection
+        """
+        with self._lock:
+            client = self._clients.pop(id(connection), None)
+        if client is not None:
+            self._stop(client)
+
+    def setRegionOfInterest(self, connection, roi):
+        """Sets the region of interest of a client
+
+        :param connection: The client connection
+        :param roi: The region of interest as (start, size), or None for the whole image
+        """
+        with self._lock:
+            self._clients[id(connection)].roi = roi
+
+    def setLevel(self, connection, level):
+        """Forces the resolution level of a client. The level keeps adapting from there
+
+        :param connection: The client connection
+        :param int level: The level, 0 being the full resolution
+        """
+        with self._lock:
+            self._clients[id(connection)].level = min(max(int(level), 0), self._levels - 1)
+
+    def getLevel(self, connection):
+        """Gets the current resolution level of a client
+
+        :param connection: The client connection
+
+        :returns: The level, 0 being the full resolution
+        """
+        return self._clients[id(connection)].level
+
+    def getNumberOfClients(self):
+        return len(self._clients)
+
+    def getClientStatistics(self, connection):
+        """Gets the statistics of a client
+
+        :param connection: The client connection
+
+        :returns: A dictionary with level, drain rate (bytes/s, None before the first frame), sent and dropped frames
+            and sent bytes
+        """
+        client = self._clients[id(connection)]
+        with client.condition:
+            return {'level': client.level, 'drainRate': client.drainRate, 'sentFrames': client.sentFrames,
+                    'droppedFrames': client.droppedFrames, 'sentBytes': client.sentBytes}
+
+    def publish(self, message):
+        """Sends a frame to all the clients, at the resolution level of each one. It does not wait for the frame to be
+        sent
+
+        :param pygtlink.ImageMessage2 message: The frame
+
+        :returns: The number of encoded versions of the frame
+        """
+        now = self._clock()
+        if self._lastPublish is not None and now > self._lastPublish:
+            self._frameRate = self._average(self._frameRate, 1.0 / (now - self._lastPublish))
+        self._lastPublish = now
+
+        with self._lock:
+            clients = list(self._clients.values())
+
+        encoded = {}
+        for client in clients:
+            level = self._adaptLevel(client, message)
+            key = (level, self._roiKey(client.roi))
+            if key not in encoded:
+                encoded[key] = self._encode(message, level, client.roi)
+            self._post(client, encoded[key])
+        return len(encoded)
+
+    def close(self):
+        """Stops all the writer threads, once they have sent their pending frame
+        """
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            self._stop(client)
+
+    def _adaptLevel(self, client, message):
+        with client.condition:
+            level, rate = client.level, client.drainRate
+            dropped, client.droppedSinceAdapt = client.droppedSinceAdapt, 0
+        if rate is None or self._frameRate is None:
+            return level
+
+        def needed(lvl):
+            return self._estimateSize(message, lvl, client.roi) * self._frameRate
+
+        budget = rate * self._headroom
+        if (dropped or needed(level) > budget) and level < self._levels - 1:
+            level += 1
+        elif level > 0 and not dropped and needed(level - 1) <= budget:
+            level -= 1
+        with client.condition:
+            client.level = level
+        return level
+
+    def _estimateSize(self, message, level, roi):
+        # the size of the pixel data at a level, without encoding it
+        shape = message.getData().shape if roi is None else roi[1]
+        factor = self._factor ** level
+        voxels = 1
+        for n in shape[:3]:
+            voxels *= n // factor if n > 1 else 1
+        return voxels * message.getScalarSize() * message.getNumComponents()
+
+    def _encode(self, message, level, roi):
+        if level == 0 and roi is None:
+            derived = message
+        else:
+            derived = _deriveImage(message, self._factor ** level, roi, self._method)
+        derived.pack()
+        return derived.header + derived.body
+
+    def _post(self, client, data):
+        with client.condition:
+            if client.pending is not None:
+                client.droppedFrames += 1
+                client.droppedSinceAdapt += 1
+            client.pending = data
+            client.condition.notify()
+
+    def _run(self, client):
+        while True:
+            with client.condition:
+                client.condition.wait_for(lambda: client.pending is not None or not client.running)
+                if client.pending is None:
+                    return  # stopped, after sending the last frame
+                data, client.pending = client.pending, None
+
+            start = self._clock()
+            try:
+                client.connection.send(data)
+            except OSError as e:
+                logging.info("Adaptive streamer client removed after send error: {}".format(e))
+                self.removeClient(client.connection)
+                return
+            elapsed = self._clock() - start
+
+            with client.condition:
+                client.sentFrames += 1
+                client.sentBytes += len(data)
+                if elapsed > 0:
+                    client.drainRate = self._average(client.drainRate, len(data) / elapsed)
+
+    def _stop(self, client):
+        with client.condition:
+            client.running = False
+            client.condition.notify()
+        if client.thread is not threading.current_thread():
+            client.thread.join()
+
+    def _average(self, average, value):
+        return value if average is None else (1 - self._smoothing) * average + self._smoothing * value
+
+    @staticmethod
+    def _roiKey(roi):
+        return None if roi is None else (tuple(roi[0]), tuple(roi[1]))
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+
+__all__ = ['BatchingWriter']
+
+# Defaults: a batch is written after 2 ms, or as soon as it holds 64 KiB or 512 buffers (sendmsg is limited to IOV_MAX
+# buffers, 1024 on Linux)
+DEFAULT_MAX_DELAY = 0.002
+DEFAULT_MAX_BYTES = 64 * 1024
+DEFAULT_MAX_BUFFERS = 512
+
+
+class BatchingWriter(object):
+    """
+        Collects the frames written to a connection and writes them in batches, with a single sendmsg (writev) call
+        per batch on socket transports (see :func:`~pygtlink.Transport.sendBuffers`): many small messages per tick
+        then cost one syscall, and one TCP packet instead of many tiny ones when Nagle is disabled.
+
+        A batch is written when it reaches maxBytes or maxBuffers (by the writing thread), when its first frame has
+        waited maxDelay (by a flusher thread), or on :func:`~pygtlink.BatchingWriter.flush`, so batching never delays a
+        frame more than maxDelay. Frames are written in order.
+
+        The connection must not be written to directly while the writer is used.
+
+        :param connection: A :class:`~pygtlink.ClientSocket`, :class:`~pygtlink.SocketServer` or
+            :class:`~pygtlink.Transport`
+        :param float maxDelay: The maximum time a frame waits for its batch to be written (seconds)
+        :param int maxBytes: The batch size written at once
+        :param int maxBuffers: The maximum number of buffers of a batch
+
+        :ivar list _batch: The buffers of the batch being collected
+        :ivar float _batchStart: The time the first frame of the batch was written, None if the batch is empty
+    """
+
+    def __init__(self, connection, maxDelay=DEFAULT_MAX_DELAY, maxBytes=DEFAULT_MAX_BYTES,
+                 maxBuffers=DEFAULT_MAX_BUFFERS):
+        self._transport = connection.getTransport() if hasattr(connection, 'getTransport') else connection
+        self._maxDelay = maxDelay
+        self._maxBytes = maxBytes
+        self._maxBuffers = maxBuffers
+        self._batch = []
+        self._batchBytes = 0
+        self._batchStart = None
+        self._frames = 0
+        self._batches = 0
+        self._sentBytes = 0
+        self._error = None
+        self._running = True
+        self._condition = threading.Condition(threading.Lock())
+        # held while a batch is taken and sent, so that batches are sent in order
+        self._sendLock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="BatchingWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, data):
+        """Adds a packed frame (or part of it) to the batch
+
+        :param data: A bytes-like object. Buffers which are not bytes are copied, since they may be reused (e.g. the
+            frames of a :class:`~pygtlink.MessageTemplate`)
+        """
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        with self._condition:
+            full = self._append(data, len(data))
+        if full:
+            self.flush()
+
+    def writeMessage(self, message):
+        """Packs (if needed) a message and adds it to the batch
+
+        :param pygtlink.MessageBase message: The message
+
+        :returns: True if the message was added, False if it could not be packed
+        """
+        if not message.pack():
+            return False
+        header, body = bytes(message.header), bytes(message.body)
+        with self._condition:
+            full = self._append(body, len(header) + len(body), header)
+        if full:
+            self.flush()
+        return True
+
+    def send(self, data):
+        """Same as :func:`~pygtlink.BatchingWriter.write`, so that the writer can replace a connection, e.g. for
+        :func:`~pygtlink.MessageTemplate.send`
+        """
+        self.write(data)
+
+    def sendMessage(self, message):
+        """Same as :func:`~pygtlink.BatchingWriter.writeMessage`
+        """
+        return self.writeMessage(message)
+
+    def flush(self):
+        """Writes the batch now
+
+        :raises OSError: If a batch could not be sent, by this call or before. The writer then stops: the error is
+            raised again by the following calls
+        """
+        with self._sendLock:
+            with self._condition:
+                if self._error is not None:
+                    raise self._error
+                batch, batch_bytes = self._take()
+            if batch:
+                try:
+                    self._transport.sendBuffers(batch)
+                except OSError as e:
+                    # the batch is lost, and part of it may have been sent: the stream cannot be continued
+                    with self._condition:
+                        self._error = e
+                        self._running = False
+                        self._condition.notify_all()
+                    raise
+                with self._condition:
+                    self._batches += 1
+                    self._sentBytes += batch_bytes
+
+    def close(self):
+        """Writes the batch and stops the flusher thread. The connection is not closed
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+        self.flush()
+
+    def getPendingSize(self):
+        """Gets the size of the batch not written yet
+        """
+        with self._condition:
+            return self._batchBytes
+
+    def getStatistics(self):
+        """Gets the numbers of frames, batches and bytes written
+
+        :returns: A dictionary with frames, batches, bytes and framesPerBatch
+        """
+        with self._condition:
+            return {'frames': self._frames, 'batches': self._batches, 'bytes': self._sentBytes,
+                    'framesPerBatch': self._frames / self._batches if self._batches else 0.0}
+
+    def getError(self):
+        """Gets the send error that stopped the writer, if any
+        """
+        return self._error
+
+    def _append(self, data, size, header=None):
+        # appends a frame to the batch (the condition is held), returns whether the batch is full
+        if self._error is not None:
+            raise self._error
+        if header is not None:
+            self._batch.append(header)
+        if self._batchStart is None:
+            self._batchStart = time.monotonic()
+            self._condition.notify()
+        self._batch.append(data)
+        self._batchBytes += size
+        self._frames += 1
+        return self._batchBytes >= self._maxBytes or len(self._batch) >= self._maxBuffers
+
+    def _take(self):
+        batch, batch_bytes = self._batch, self._batchBytes
+        self._batch = []
+        self._batchBytes = 0
+        self._batchStart = None
+        return batch, batch_bytes
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (self._batchStart is None or
+                                         time.monotonic() < self._batchStart + self._maxDelay):
+                    timeout = None if self._batchStart is None else self._batchStart + self._maxDelay - time.monotonic()
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+            try:
+                self.flush()
+            except OSError as e:
+                # flush() recorded the error
+                logging.info("Batching writer stopped after send error: {}".format(e))
+                return
@@ -0,0 +1,297 @@
+import collections
+import logging
+import threading
+
+__all__ = ['SharedFrame', 'Broadcaster', 'DROP_OLDEST', 'DROP_NEWEST', 'DISCONNECT']
+
+# What a client queue does when it is full
+DROP_OLDEST = 'dropOldest'  # the oldest queued frame is dropped, the client always gets the latest frames
+DROP_NEWEST = 'dropNewest'  # the new frame is dropped
+DISCONNECT = 'disconnect'  # the client is removed
+
+DEFAULT_QUEUE_SIZE = 8
+
+
+class SharedFrame(object):
+    """
+        A packed message shared by several client queues. It is immutable and reference counted: each queue holding it
+        owns a reference, released once the frame is sent or dropped. When the last reference is released, the
+        release callback is called, e.g. to recycle the buffers (see :func:`~pygtlink.EncodedFrame.release`).
+
+        :param buffers: The binary header and body parts, in wire order
+        :param str messageType: The message type, used to select the subscribed clients
+        :param str deviceName: The device name, used to select the subscribed clients
+        :param release: A function called when the last reference is released, None for none
+    """
+
+    __slots__ = ('buffers', 'messageType', 'deviceName', '_size', '_references', '_release', '_lock')
+
+    def __init__(self, buffers, messageType="", deviceName="", release=None):
+        self.buffers = tuple(buffers)
+        self.messageType = messageType
+        self.deviceName = deviceName
+        self._size = sum(len(b) for b in self.buffers)
+        self._references = 1  # the reference of the creator
+        self._release = release
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromMessage(cls, message):
+        """Packs a message (if needed) into a shared frame
+
+        :param pygtlink.MessageBase message: The message
+
+        :returns: The frame, None if the message could not be packed
+        """
+        if not message.pack():
+            return None
+        return cls((bytes(message.header), bytes(message.body)), message.getMessageType(), message.getDeviceName())
+
+    def getSize(self):
+        """Gets the size of the packed message (header + body)
+        """
+        return self._size
+
+    def getReferenceCount(self):
+        return self._references
+
+    def acquire(self):
+        """Adds a reference
+        """
+        with self._lock:
+            if self._references <= 0:
+                raise ValueError("the frame was already released")
+            self._references += 1
+        return self
+
+    def release(self):
+        """Releases a reference, calling the release callback with the last one
+        """
+        with self._lock:
+            self._references -= 1
+            last = self._references == 0
+        if last and self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+
+class _Client(object):
+    """A client of the broadcaster, with its bounded send queue and writer thread"""
+
+    def __init__(self, connection, subscriptions, queueSize):
+        self.connection = connection
+        self.transport = connection.getTransport() if hasattr(connection, 'getTransport') else connection
+        self.subscriptions = subscriptions
+        self.queue = collections.deque()
+        self.queueSize = queueSize
+        self.sentFrames = 0
+        self.sentBytes = 0
+        self.droppedFrames = 0
+        self.sending = False
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def isSubscribed(self, messageType, deviceName):
+        if self.subscriptions is None:
+            return True
+        for key in ((messageType, deviceName), (messageType, None), (None, deviceName), (None, None)):
+            if key in self.subscriptions:
+                return True
+        return False
+
+
+class Broadcaster(object):
+    """
+        Sends messages to many clients, encoding each message once: :func:`~pygtlink.Broadcaster.broadcast` packs the
+        message into a :class:`~pygtlink.SharedFrame`, and the same frame is queued for every subscribed client. The
+        encoding cost does not depend on the number of clients.
+
+        Each client has a bounded send queue and a writer thread, so that a slow client does not slow down the others
+        nor the producer. When the queue of a client is full, the policy decides: DROP_OLDEST (the default) drops the
+        oldest queued frame, DROP_NEWEST drops the new frame and DISCONNECT removes the client. A client is also
+        removed when sending to it fails.
+
+        Clients accepted by a :class:`~pygtlink.SocketServer` (see :func:`~pygtlink.SocketServer.accept`) can be
+        added as they connect.
+
+        :param int queueSize: The maximum number of frames queued per client
+        :param str policy: What a full client queue does: DROP_OLDEST, DROP_NEWEST or DISCONNECT
+
+        :ivar dict _clients: The clients by id of their connection
+    """
+
+    def __init__(self, queueSize=DEFAULT_QUEUE_SIZE, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, DISCONNECT):
+            raise ValueError("unknown policy {}".format(policy))
+        self._queueSize = queueSize
+        self._policy = policy
+        self._clients = {}
+        self._encodedFrames = 0
+        self._lock = threading.Lock()
+
+    def addClient(self, connection, subscriptions=None):
+        """Adds a client and starts its writer thread
+
+        :param connection: The client connection: a :class:`~pygtlink.ClientSocket`, :class:`~pygtlink.SocketServer`
+            or :class:`~pygtlink.Transport`
+        :param subscriptions: The (message type, device name) pairs the client receives, None being a wildcard in a
+            pair. None (the default) for all the messages
+        """
+        client = _Client(connection, None if subscriptions is None else set(subscriptions), self._queueSize)
+        client.thread = threading.Thread(target=self._run, args=(client,), name="Broadcaster", daemon=True)
+        with self._lock:
+            self._clients[id(connection)] = client
+        client.thread.start()
+
+    def removeClient(self, connection):
+        """Removes a client, dropping its queued frames. The connection is not closed: a frame being sent is still
+        sent
+
+        :param connection: The client connection
+        """
+        with self._lock:
+            client = self._clients.pop(id(connection), None)
+        if client is not None:
+            self._stop(client)
+
+    def getNumberOfClients(self):
+        return len(self._clients)
+
+    def broadcast(self, message):
+        """Packs a message once and queues it for all the subscribed clients. It does not wait for the message to be
+        sent
+
+        :param pygtlink.MessageBase message: The message
+
+        :returns: The number of clients the message was queued for, -1 if the message could not be packed
+        """
+        frame = SharedFrame.fromMessage(message)
+        if frame is None:
+            return -1
+        with self._lock:
+            self._encodedFrames += 1
+        return self.broadcastFrame(frame)
+
+    def broadcastFrame(self, frame):
+        """Queues an already packed frame for all the subscribed clients. The reference of the caller is released
+
+        :param pygtlink.SharedFrame frame: The frame
+
+        :returns: The number of clients the frame was queued for
+        """
+        with self._lock:
+            clients = [client for client in self._clients.values()
+                       if client.isSubscribed(frame.messageType, frame.deviceName)]
+        queued = 0
+        try:
+            for client in clients:
+                if self._enqueue(client, frame):
+                    queued += 1
+        finally:
+            frame.release()
+        return queued
+
+    def flush(self, timeout=None):
+        """Waits until the queues of all the clients are empty
+
+        :param float timeout: The maximum time to wait for each client
+
+        :returns: True if all the queues were emptied
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+        flushed = True
+        for client in clients:
+            with client.condition:
+                flushed = client.condition.wait_for(
+                    lambda: (not client.queue and not client.sending) or not client.running, timeout) and flushed
+        return flushed
+
+    def getClientStatistics(self, connection):
+        """Gets the statistics of a client
+
+        :param connection: The client connection
+
+        :returns: A dictionary with queued, sent and dropped frames and sent bytes
+        """
+        client = self._clients[id(connection)]
+        with client.condition:
+            return {'queued': len(client.queue), 'sentFrames': client.sentFrames, 'sentBytes': client.sentBytes,
+                    'droppedFrames': client.droppedFrames}
+
+    def getEncodedFrameCount(self):
+        """Gets the number of messages packed by :func:`~pygtlink.Broadcaster.broadcast`
+        """
+        return self._encodedFrames
+
+    def close(self):
+        """Removes all the clients
+        """
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            self._stop(client)
+
+    def _enqueue(self, client, frame):
+        disconnect = False
+        with client.condition:
+            if not client.running:
+                return False
+            if len(client.queue) >= client.queueSize:
+                client.droppedFrames += 1
+                if self._policy == DROP_NEWEST:
+                    return False
+                if self._policy == DISCONNECT:
+                    disconnect = True
+                else:
+                    client.queue.popleft().release()
+            if not disconnect:
+                client.queue.append(frame.acquire())
+                client.condition.notify()
+        if disconnect:
+            logging.info("Broadcaster client removed: its queue is full")
+            self.removeClient(client.connection)
+            return False
+        return True
+
+    def _run(self, client):
+        while True:
+            with client.condition:
+                client.condition.wait_for(lambda: client.queue or not client.running)
+                if not client.running:
+                    return
+                # the frame being sent is owned by the writer, it can no longer be dropped
+                frame = client.queue.popleft()
+                client.sending = True
+
+            try:
+                self._send(client.transport, frame.buffers)
+            except OSError as e:
+                logging.info("Broadcaster client removed after send error: {}".format(e))
+                self.removeClient(client.connection)
+                return
+            finally:
+                frame.release()
+
+            with client.condition:
+                client.sending = False
+                client.sentFrames += 1
+                client.sentBytes += frame.getSize()
+                client.condition.notify_all()
+
+    @staticmethod
+    def _send(transport, buffers):
+        if hasattr(transport, 'sendBuffers'):
+            transport.sendBuffers(buffers)
+        else:
+            for data in buffers:
+                transport.send(data)
+
+    def _stop(self, client):
+        with client.condition:
+            client.running = False
+            while client.queue:
+                client.queue.popleft().release()
+            client.condition.notify_all()
+        # not joined: a writer thread blocked in a send (e.g. a stalled client) ends once the send returns
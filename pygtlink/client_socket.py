@@ -1,4 +1,4 @@
-import socket
+from pygtlink.transport import TcpTransport, UnixTransport
 import logging
 #  very simple server with 2 socket open: one for data stream and the other for commands
 
@@ -11,12 +11,13 @@ class ClientSocket:
     """
         Implementation of IGTL client
 
-        :ivar socket.socket _clientSocket: The client TCP socket
+        :ivar pygtlink.Transport _transport: The transport connected to the server (TCP, Unix domain socket or
+            in-process pipe)
     """
 
-    def __init__(self):
+    def __init__(self, transport=None):
         logging.info("Starting Socket Client ... ")
-        self._clientSocket = None
+        self._transport = transport
 
     def connectToServer(self, serverAddress, port):
         """Connects to the IGTL server
@@ -24,23 +25,42 @@ class ClientSocket:
             :param str serverAddress: Server Address
             :param int port: Server Port
         """
-        self._clientSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._clientSocket.connect((serverAddress, port))
+        self._transport = TcpTransport.connect(serverAddress, port)
+
+    def connectToUnixServer(self, path):
+        """Connects to an IGTL server listening on a Unix domain socket
+
+            :param str path: The socket path
+        """
+        self._transport = UnixTransport.connect(path)
+
+    def setTransport(self, transport):
+        """Sets an already connected transport, e.g. an end of a :class:`~pygtlink.PipeTransport`
+
+            :param pygtlink.Transport transport: The transport to use
+        """
+        self._transport = transport
+
+    def getTransport(self):
+        """Gets the transport connected to the server
+
+            :returns: The :class:`~pygtlink.Transport`, None if not connected
+        """
+        return self._transport
 
     def setTimeout(self, timeout=0):
         """Sets receive timeout
 
             :param int timeout: The receive timeout to be set
         """
-        if self._clientSocket is not None:
-            self._clientSocket.settimeout(timeout)
+        if self._transport is not None:
+            self._transport.settimeout(timeout)
 
     def kill(self):
         """Shut down the connection and closes the socket
         """
         logging.info("shutting down connection")
-        self._clientSocket.shutdown(socket.SHUT_RDWR)
-        self._clientSocket.close()
+        self._transport.close()
 
     def receive(self, length):
         """Receives a message of <length> bytes from the IGTL server
@@ -49,25 +69,27 @@ class ClientSocket:
 
             :returns: The received message (a byte string)
         """
-        res, recData = self._recvall(self._clientSocket, length)
-        if not res:
-            return None
-        return recData
+        return self._transport.receive(length)
+
+    def receiveFrame(self):
+        """Receives a complete message (header and body) from the IGTL server
+
+            :returns: The binary header and the binary body, (None, None) if the connection was closed
+        """
+        return self._transport.receiveFrame()
 
     def send(self, data):
         """Sends data to the IGTL server
 
             :param data: the message to be sent (as a byte string)
         """
-        self._clientSocket.sendall(data)
-
-    @staticmethod
-    def _recvall(s, n):
-        # Helper function to recv n bytes or return None if EOF is hit
-        rawData = B''
-        while len(rawData) < n:
-            packet = s.recv(n - len(rawData))
-            if not packet:
-                return False, rawData
-            rawData += packet
-        return True, rawData
+        self._transport.send(data)
+
+    def sendMessage(self, message):
+        """Packs (if needed) and sends a message to the IGTL server, without concatenating header and body
+
+            :param pygtlink.MessageBase message: the message to be sent
+
+            :returns: True if the message was sent, False if it could not be packed
+        """
+        return self._transport.sendMessage(message)
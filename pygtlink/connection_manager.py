@@ -0,0 +1,393 @@
+from pygtlink.transport import TcpTransport, UnixTransport
+import collections
+import logging
+import random
+import socket
+import threading
+import time
+
+__all__ = ['ManagedConnection', 'ConnectionManager']
+
+DEFAULT_BUFFER_BUDGET = 16 * 1024 * 1024
+DEFAULT_CONNECT_TIMEOUT = 2.0
+
+
+class ManagedConnection(object):
+    """
+        A persistent connection to an IGTL server, reconnecting with jittered exponential backoff when it goes down.
+        While disconnected, outgoing messages are buffered within a byte budget (the oldest ones are dropped first) and
+        sent after reconnecting; subscriptions (e.g. STT_ messages) are replayed on every reconnect.
+
+        It offers the same send/receive methods of :class:`~pygtlink.ClientSocket`. Instances are normally obtained
+        from a :class:`~pygtlink.ConnectionManager`.
+
+        :ivar _connect: Callable creating a connected :class:`~pygtlink.Transport`. It is called without holding the
+            connection lock, so it should give up after a timeout: meanwhile the messages sent are buffered
+        :ivar pygtlink.Transport _transport: The current transport, None while disconnected
+        :ivar collections.OrderedDict _subscriptions: The packed subscription messages by (message type, device name)
+        :ivar collections.deque _outbox: The messages buffered while disconnected
+        :ivar int _attempts: The number of failed connection attempts since the last successful one
+        :ivar float _nextAttempt: The monotonic time of the next connection attempt
+        :ivar bool _connecting: Whether a thread is connecting, the other ones do not make concurrent attempts
+    """
+
+    def __init__(self, name, connect, minBackoff=0.05, maxBackoff=5.0, bufferBudget=DEFAULT_BUFFER_BUDGET):
+        self._name = name
+        self._connect = connect
+        self._minBackoff = minBackoff
+        self._maxBackoff = maxBackoff
+        self._bufferBudget = bufferBudget
+        self._transport = None
+        self._subscriptions = collections.OrderedDict()
+        self._outbox = collections.deque()
+        self._outboxBytes = 0
+        self._attempts = 0
+        self._nextAttempt = 0.0
+        self._connecting = False
+        self._connectedOnce = False
+        self._reconnects = 0
+        self._dropped = 0
+        self._closed = False
+        self._lock = threading.RLock()
+
+    def getName(self):
+        return self._name
+
+    def isConnected(self):
+        """Gets whether the connection is currently up
+        """
+        return self._transport is not None
+
+    def getTransport(self):
+        """Gets the current transport, None while disconnected
+        """
+        return self._transport
+
+    def getStatistics(self):
+        """Gets the connection statistics
+
+        :returns: A dictionary with connected, reconnects, failed attempts, buffered messages and bytes, dropped
+            messages
+        """
+        with self._lock:
+            return {'connected': self.isConnected(), 'reconnects': self._reconnects, 'attempts': self._attempts,
+                    'buffered': len(self._outbox), 'bufferedBytes': self._outboxBytes, 'dropped': self._dropped}
+
+    def ensureConnected(self, force=False):
+        """Connects if disconnected and the backoff delay elapsed
+
+        :param bool force: If True, ignores the backoff delay
+
+        :returns: True if the connection is up
+        """
+        with self._lock:
+            if self._transport is not None:
+                return True
+            if self._closed or self._connecting or (not force and time.monotonic() < self._nextAttempt):
+                return False
+            self._connecting = True
+
+        # connect without the lock, so that the sending threads buffer their messages instead of waiting for the
+        # connect timeout; the transport is swapped in under the lock
+        try:
+            transport, error = self._connect(), None
+        except OSError as e:
+            transport, error = None, e
+
+        with self._lock:
+            self._connecting = False
+            if transport is None:
+                self._attempts += 1
+                delay = min(self._maxBackoff, self._minBackoff * 2 ** (self._attempts - 1))
+                self._nextAttempt = time.monotonic() + random.uniform(delay / 2, delay)
+                logging.info("Connection to {} failed ({}), next attempt in {:.3f} s".format(
+                    self._name, error, self._nextAttempt - time.monotonic()))
+                return False
+            if self._closed:
+                transport.close()
+                return False
+
+            self._transport = transport
+            if self._connectedOnce:
+                self._reconnects += 1
+            self._connectedOnce = True
+            self._attempts = 0
+            try:
+                for data in self._subscriptions.values():
+                    self._transport.send(data)
+                while self._outbox:
+                    self._transport.send(self._outbox[0])
+                    self._outboxBytes -= len(self._outbox.popleft())
+            except OSError as e:
+                self._markDown(e)
+                return False
+            return True
+
+    def checkHealth(self):
+        """Checks that the connection was not closed by the peer, reconnecting if needed and due
+
+        :returns: True if the connection is up
+        """
+        with self._lock:
+            if self._transport is not None and not self._transport.isAlive():
+                self._markDown(ConnectionResetError("connection closed by peer"))
+        return self.ensureConnected()
+
+    def subscribe(self, message):
+        """Sends a subscription message (e.g. :class:`~pygtlink.StartStreamMessage`) and replays it after every
+        reconnect. A new subscription with the same type and device name replaces the previous one.
+
+        :param pygtlink.MessageBase message: The subscription message
+        """
+        if not message.pack():
+            return
+        data = message.header + message.body
+        with self._lock:
+            self._subscriptions[(message.getMessageType(), message.getDeviceName())] = data
+            if self._transport is not None:
+                self._send(data, buffer=False)
+
+    def unsubscribe(self, messageType, deviceName):
+        """Stops replaying a subscription
+
+        :param str messageType: The type of the subscription message (e.g. STT_IMAGE)
+        :param str deviceName: The device name of the subscription message
+        """
+        with self._lock:
+            self._subscriptions.pop((messageType, deviceName), None)
+
+    def send(self, data):
+        """Sends data, buffering it if the connection is down
+
+        :param data: the message to be sent (as a byte string)
+
+        :returns: True if the data was sent, False if it was buffered
+        """
+        self.ensureConnected()
+        with self._lock:
+            if self._transport is None:
+                self._buffer(data)
+                return False
+            return self._send(data, buffer=True)
+
+    def sendMessage(self, message):
+        """Packs (if needed) and sends a message, buffering it if the connection is down
+
+        :param pygtlink.MessageBase message: the message to be sent
+
+        :returns: True if the message was sent, False if it was buffered or could not be packed
+        """
+        if not message.pack():
+            return False
+        return self.send(message.header + message.body)
+
+    def receive(self, length):
+        """Receives a message of <length> bytes
+
+        :param int length: The length of the message to be received
+
+        :returns: The received message (a byte string), None if the connection is down
+        :raises socket.timeout: If a receive timeout was set (see setTimeout) and it expired
+        """
+        transport = self._receiveTransport()
+        if transport is None:
+            return None
+        try:
+            data = transport.receive(length)
+        except socket.timeout:
+            # the timeout set with setTimeout() expired: the connection is idle, not down
+            raise
+        except OSError as e:
+            data = None
+            self._markDown(e, transport)
+        if data is None:
+            self._markDown(ConnectionResetError("connection closed by peer"), transport)
+        return data
+
+    def receiveFrame(self):
+        """Receives a complete message (header and body)
+
+        :returns: The binary header and the binary body, (None, None) if the connection is down
+        :raises socket.timeout: If a receive timeout was set (see setTimeout) and it expired
+        """
+        transport = self._receiveTransport()
+        if transport is None:
+            return None, None
+        try:
+            header, body = transport.receiveFrame()
+        except socket.timeout:
+            # the timeout set with setTimeout() expired: the connection is idle, not down
+            raise
+        except OSError as e:
+            header, body = None, None
+            self._markDown(e, transport)
+        if header is None:
+            self._markDown(ConnectionResetError("connection closed by peer"), transport)
+        return header, body
+
+    def setTimeout(self, timeout=0):
+        with self._lock:
+            if self._transport is not None:
+                self._transport.settimeout(timeout)
+
+    def close(self):
+        """Closes the connection and stops reconnecting
+        """
+        with self._lock:
+            self._closed = True
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
+
+    def _receiveTransport(self):
+        self.ensureConnected()
+        return self._transport
+
+    def _send(self, data, buffer):
+        try:
+            self._transport.send(data)
+            return True
+        except OSError as e:
+            self._markDown(e)
+            if buffer:
+                self._buffer(data)
+            return False
+
+    def _buffer(self, data):
+        if len(data) > self._bufferBudget:
+            self._dropped += 1
+            return
+        self._outbox.append(data)
+        self._outboxBytes += len(data)
+        while self._outboxBytes > self._bufferBudget:
+            self._outboxBytes -= len(self._outbox.popleft())
+            self._dropped += 1
+
+    def _markDown(self, error, transport=None):
+        with self._lock:
+            if self._transport is None or (transport is not None and transport is not self._transport):
+                return
+            logging.info("Connection to {} lost: {}".format(self._name, error))
+            try:
+                self._transport.close()
+            except OSError:
+                pass
+            self._transport = None
+            self._nextAttempt = time.monotonic() + random.uniform(0, self._minBackoff)
+
+
+class ConnectionManager(object):
+    """
+        Pool of :class:`~pygtlink.ManagedConnection` to several IGTL servers. Connections are created on first use
+        and kept warm, so switching between devices reuses them instead of reconnecting. A maintenance thread
+        (see :func:`~pygtlink.ConnectionManager.start`) checks their health and reconnects them in the background.
+
+        :ivar dict _connections: The pooled connections by server
+        :ivar float _connectTimeout: The timeout of the TCP and Unix socket connections, in seconds
+    """
+
+    def __init__(self, minBackoff=0.05, maxBackoff=5.0, bufferBudget=DEFAULT_BUFFER_BUDGET, noDelay=True,
+                 connectTimeout=DEFAULT_CONNECT_TIMEOUT):
+        self._minBackoff = minBackoff
+        self._maxBackoff = maxBackoff
+        self._bufferBudget = bufferBudget
+        self._noDelay = noDelay
+        self._connectTimeout = connectTimeout
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+    def getConnection(self, address, port):
+        """Gets the pooled connection to a TCP server, creating it if needed
+
+        :param str address: The server address
+        :param int port: The server port
+
+        :returns: The :class:`~pygtlink.ManagedConnection`
+        """
+        return self.getCustomConnection("{}:{}".format(address, port),
+                                        lambda: TcpTransport.connect(address, port, self._noDelay,
+                                                                     self._connectTimeout))
+
+    def getUnixConnection(self, path):
+        """Gets the pooled connection to a Unix domain socket server, creating it if needed
+
+        :param str path: The socket path
+
+        :returns: The :class:`~pygtlink.ManagedConnection`
+        """
+        return self.getCustomConnection("unix:{}".format(path),
+                                        lambda: UnixTransport.connect(path, self._connectTimeout))
+
+    def getCustomConnection(self, name, connect):
+        """Gets a pooled connection created with a custom transport factory
+
+        :param str name: The connection name, identifying it in the pool
+        :param connect: Callable creating a connected :class:`~pygtlink.Transport`, raising OSError on failure
+
+        :returns: The :class:`~pygtlink.ManagedConnection`
+        """
+        with self._lock:
+            connection = self._connections.get(name)
+            if connection is None:
+                connection = ManagedConnection(name, connect, self._minBackoff, self._maxBackoff, self._bufferBudget)
+                self._connections[name] = connection
+        connection.ensureConnected()
+        return connection
+
+    def getConnections(self):
+        """Gets all the pooled connections
+        """
+        with self._lock:
+            return list(self._connections.values())
+
+    def removeConnection(self, name):
+        """Closes a pooled connection and removes it from the pool
+
+        :param str name: The connection name (e.g. "address:port")
+        """
+        with self._lock:
+            connection = self._connections.pop(name, None)
+        if connection is not None:
+            connection.close()
+
+    def checkHealth(self):
+        """Checks all the pooled connections, reconnecting the ones that are down and due
+
+        :returns: The number of connections that are up
+        """
+        return sum(1 for connection in self.getConnections() if connection.checkHealth())
+
+    def start(self, interval=0.1):
+        """Starts the maintenance thread
+
+        :param float interval: The health check interval in seconds
+        """
+        if self._thread is not None:
+            return
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="ConnectionManager", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the maintenance thread
+        """
+        if self._thread is None:
+            return
+        self._stopEvent.set()
+        self._thread.join()
+        self._thread = None
+
+    def close(self):
+        """Stops the maintenance thread and closes all the connections
+        """
+        self.stop()
+        with self._lock:
+            connections, self._connections = list(self._connections.values()), {}
+        for connection in connections:
+            connection.close()
+
+    def _run(self, interval):
+        while not self._stopEvent.wait(interval):
+            self.checkHealth()
@@ -0,0 +1,257 @@
+from pygtlink.utils import CRC64
+from pygtlink.igtl_header import IGTL_HEADER_CRC_OFFSET
+from pygtlink.image_message2 import ImageMessage2
+import collections
+import concurrent.futures
+import struct
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+
+__all__ = ['EncodingPipeline', 'EncodedFrame']
+
+# Offset of the crc in the packed IGTL header (H12s20sIIQ precede it)
+
+
+def _encodeImage(src, out, dst_dtype, img_header, prefix, suffix):
+    # Writes image header + converted pixels into out and returns the crc of prefix + content + suffix. The dtype
+    # conversion and the byte swap are done in a single pass by copyto, with no intermediate array
+    header_size = len(img_header)
+    out[:header_size] = img_header
+    dst = np.ndarray(src.shape, dtype=dst_dtype, buffer=out, offset=header_size)
+    np.copyto(dst, src, casting='unsafe')
+    content_size = header_size + dst.nbytes
+    del dst
+
+    crc = CRC64(prefix)
+    crc = CRC64(out[:content_size], crc)
+    return CRC64(suffix, crc)
+
+
+def _encodeImageBlocks(in_name, out_name, shape, src_dtype, dst_dtype, img_header, prefix, suffix):
+    # Process pool entry point: pixels are read from and written to shared memory blocks, only names are pickled
+    in_block = shared_memory.SharedMemory(name=in_name)
+    out_block = shared_memory.SharedMemory(name=out_name)
+    try:
+        src = np.ndarray(shape, dtype=src_dtype, buffer=in_block.buf)
+        crc = _encodeImage(src, out_block.buf, dst_dtype, img_header, prefix, suffix)
+        del src
+        return crc
+    finally:
+        in_block.close()
+        out_block.close()
+
+
+def _packMessage(message):
+    # Pool entry point for small messages (e.g. SensorMessage), which are simply pickled
+    message.pack()
+    return message.header, message.body
+
+
+class _SharedMemoryPool(object):
+    """Recycles shared memory blocks, so that steady streams do not create and map a new block per frame"""
+
+    def __init__(self, maxFree=16):
+        self._free = []
+        self._maxFree = maxFree
+        self._lock = threading.Lock()
+
+    def acquire(self, size):
+        size = max(size, 1)
+        with self._lock:
+            fitting = [block for block in self._free if size <= block.size <= 2 * size]
+            if fitting:
+                block = min(fitting, key=lambda b: b.size)
+                self._free.remove(block)
+                return block
+        return shared_memory.SharedMemory(create=True, size=size)
+
+    def release(self, block):
+        with self._lock:
+            if len(self._free) < self._maxFree:
+                self._free.append(block)
+                return
+        self._destroy(block)
+
+    def close(self):
+        with self._lock:
+            blocks, self._free = self._free, []
+        for block in blocks:
+            self._destroy(block)
+
+    @staticmethod
+    def _destroy(block):
+        try:
+            block.close()
+        except BufferError:
+            # a frame body still references the block: the mapping goes away with the last reference
+            pass
+        block.unlink()
+
+
+class EncodedFrame(object):
+    """
+        A packed message produced by :class:`~pygtlink.EncodingPipeline`. The body may live in a shared memory block,
+        which is recycled by :func:`~pygtlink.EncodedFrame.release`: the frame must not be used after releasing it.
+
+        :ivar bytes header: The binary header
+        :ivar list buffers: The binary header and body parts, in wire order
+    """
+
+    def __init__(self, header, buffers, release=None):
+        self.header = header
+        self.buffers = buffers
+        self._release = release
+
+    def getSize(self):
+        """Gets the size of the packed message (header + body)
+        """
+        return sum(len(b) for b in self.buffers)
+
+    def tobytes(self):
+        """Gets the packed message (header + body) as a byte string
+        """
+        return b''.join(self.buffers)
+
+    def sendTo(self, connection):
+        """Sends the frame over a connection and releases it
+
+        :param connection: Any object with a send(data) method, e.g. :class:`~pygtlink.ClientSocket`
+        """
+        try:
+            for data in self.buffers:
+                connection.send(data)
+        finally:
+            self.release()
+
+    def release(self):
+        """Releases the shared memory holding the body (if any)
+        """
+        self.buffers = []
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+
+class EncodingPipeline(object):
+    """
+        Packs messages on a pool of worker processes (or threads), returning the packed frames in submission order.
+
+        :class:`~pygtlink.ImageMessage2` pixels are copied once into a shared memory block and the workers write the
+        converted pixels into another shared memory block, so no pixel data is pickled; the workers also compute the
+        CRC64, so the main process only packs the small headers. Other messages (e.g.
+        :class:`~pygtlink.SensorMessage`) are pickled and packed by the workers.
+
+        With threads no shared memory is needed, but only the NumPy conversion runs outside the GIL.
+
+        :ivar concurrent.futures.Executor _executor: The worker pool
+        :ivar collections.deque _pending: The submitted frames not yet returned, in submission order
+        :ivar _SharedMemoryPool _blocks: The recycled shared memory blocks
+    """
+
+    def __init__(self, workers=None, useProcesses=True):
+        self._useProcesses = useProcesses
+        if useProcesses:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._pending = collections.deque()
+        self._blocks = _SharedMemoryPool()
+
+    def submit(self, message):
+        """Submits a message to be packed. The message can be modified and submitted again as soon as this function
+        returns; with threads, however, its pixel array must not be modified in place until its frame is returned.
+
+        :param pygtlink.MessageBase message: The message to pack
+        """
+        if isinstance(message, ImageMessage2):
+            self._pending.append(self._submitImage(message))
+            return
+
+        if self._useProcesses:
+            future = self._executor.submit(_packMessage, message)
+        else:
+            # small messages are cheap to pack and the message may be modified after submit(): pack them right away
+            future = concurrent.futures.Future()
+            future.set_result(_packMessage(message))
+
+        def finish():
+            header, body = future.result()
+            return EncodedFrame(header, [header, body])
+
+        self._pending.append(finish)
+
+    def getPendingCount(self):
+        """Gets the number of submitted messages whose frame was not returned yet
+        """
+        return len(self._pending)
+
+    def getFrame(self):
+        """Gets the frame of the oldest submitted message, waiting for it to be packed
+
+        :returns: The :class:`~pygtlink.EncodedFrame`, None if no message is pending
+        """
+        if not self._pending:
+            return None
+        return self._pending.popleft()()
+
+    def frames(self):
+        """Iterates over the frames of all the pending messages, in submission order
+        """
+        while self._pending:
+            yield self.getFrame()
+
+    def close(self):
+        """Waits for the pending messages, shuts the workers down and frees the shared memory
+        """
+        for frame in self.frames():
+            frame.release()
+        self._executor.shutdown()
+        self._blocks.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _submitImage(self, message):
+        src = message.getData()
+        img_header = message._packImageHeader()
+        dst_dtype = message._getWireDtype()
+        prefix, suffix = message._packExtendedHeader()
+        content_size = len(img_header) + src.size * dst_dtype.itemsize
+        body_size = len(prefix) + content_size + len(suffix)
+        header = bytearray(message._packHeader(body_size, 0))
+
+        if self._useProcesses:
+            in_block = self._blocks.acquire(src.nbytes)
+            out_block = self._blocks.acquire(content_size)
+            shared_src = np.ndarray(src.shape, dtype=src.dtype, buffer=in_block.buf)
+            shared_src[...] = src
+            del shared_src
+            future = self._executor.submit(_encodeImageBlocks, in_block.name, out_block.name, src.shape,
+                                           src.dtype.str, dst_dtype.str, img_header, prefix, suffix)
+            content = out_block.buf[:content_size]
+        else:
+            in_block = out_block = None
+            out = bytearray(content_size)
+            future = self._executor.submit(_encodeImage, src, out, dst_dtype, img_header, prefix, suffix)
+            content = memoryview(out)
+
+        def finish():
+            try:
+                crc = future.result()
+            except Exception:
+                if out_block is not None:
+                    self._blocks.release(out_block)
+                raise
+            finally:
+                if in_block is not None:
+                    self._blocks.release(in_block)
+            struct.pack_into('>Q', header, IGTL_HEADER_CRC_OFFSET, crc)
+            buffers = [bytes(header)] + [b for b in (prefix, content, suffix) if len(b) > 0]
+            release = None if out_block is None else (lambda: self._blocks.release(out_block))
+            return EncodedFrame(buffers[0], buffers, release)
+
+        return finish
@@ -0,0 +1,295 @@
+from pygtlink.igtl_header import IGTL_HEADER_SIZE
+from pygtlink.image_message2 import ImageMessage2, IGTL_IMAGE_HEADER_SIZE
+from pygtlink.sensor_message import IGTL_SENSOR_HEADER_SIZE
+from pygtlink.header_scan import scanFile, getTimestamps
+import concurrent.futures
+import mmap
+import os
+import re
+import numpy as np
+
+__all__ = ['RecordingExporter']
+
+EXPORTED_TYPES = ('POSITION', 'SENSOR', 'IMAGE')
+
+DEFAULT_PARTITION_SIZE = 64 * 1024 * 1024
+
+IGTL_POSITION_SIZE = 28
+
+# Extended header fields (header version >= 2): ext header size, metadata header size, metadata size, message id
+_EXTENDED_HEADER_DTYPE = np.dtype([('ext_size', '>u2'), ('meta_header_size', '>u2'), ('meta_size', '>u4'),
+                                   ('message_id', '>u4')])
+
+
+def _gather(data, starts, size):
+    # Copies size bytes at each start into a (len(starts), size) array, through a strided view of the buffer
+    if len(data) < size:
+        return np.empty((0, size), dtype=np.uint8)
+    windows = np.lib.stride_tricks.as_strided(data, shape=(len(data) - size + 1, size), strides=(1, 1),
+                                              writeable=False)
+    return windows[starts.astype(np.intp)]
+
+
+def _locateContent(data, offsets, bodySizes, versions):
+    # Content start and size of each frame, skipping the extended header and the metadata of version 2 frames
+    starts = offsets + IGTL_HEADER_SIZE
+    sizes = bodySizes.astype(np.int64)
+    extended = np.flatnonzero(versions >= 2)
+    if len(extended):
+        ext = _gather(data, starts[extended], _EXTENDED_HEADER_DTYPE.itemsize).view(_EXTENDED_HEADER_DTYPE)[:, 0]
+        starts[extended] += ext['ext_size']
+        sizes[extended] -= ext['ext_size'].astype(np.int64) + ext['meta_header_size'] + ext['meta_size']
+    return starts, sizes
+
+
+def _decodePositions(data, starts, sizes):
+    valid = sizes >= IGTL_POSITION_SIZE
+    values = np.full((len(starts), 7), np.nan, dtype=np.float32)
+    values[valid] = _gather(data, starts[valid], IGTL_POSITION_SIZE).view('>f4')
+    return {'position': values[:, 0:3], 'quaternion': values[:, 3:7]}
+
+
+def _decodeSensors(data, starts, sizes):
+    valid = sizes >= IGTL_SENSOR_HEADER_SIZE
+    header = np.zeros((len(starts), IGTL_SENSOR_HEADER_SIZE), dtype=np.uint8)
+    header[valid] = _gather(data, starts[valid], IGTL_SENSOR_HEADER_SIZE)
+    larray = header[:, 0].astype(np.int64)
+    larray = np.minimum(larray, np.maximum(sizes - IGTL_SENSOR_HEADER_SIZE, 0) // 8)
+
+    # frames with fewer elements than the longest one are padded with NaN
+    values = np.full((len(starts), int(larray.max(initial=0))), np.nan, dtype=np.float64)
+    for n in np.unique(larray):
+        if n == 0:
+            continue
+        rows = np.flatnonzero(larray == n)
+        values[rows, :n] = _gather(data, starts[rows] + IGTL_SENSOR_HEADER_SIZE, 8 * int(n)).view('>f8')
+    unit = header[:, 2:10].copy().view('>u8')[:, 0].astype(np.uint64)
+    return {'data': values, 'status': header[:, 1].copy(), 'unit': unit}
+
+
+def _decodeImages(data, starts, sizes, out, outStart):
+    # Images are copied one by one into the output stack (already converted to the stack dtype and byte order)
+    spacing = np.zeros((len(starts), 3), dtype=np.float64)
+    matrices = np.zeros((len(starts), 4, 4), dtype=np.float64)
+    msg = ImageMessage2()
+    for i, (start, size) in enumerate(zip(starts, sizes)):
+        # decoded into the stack, the message keeps no view over the mapped file
+        try:
+            msg.decodeContent(data[start:start + size], out=out[outStart + i])
+        except ValueError as e:
+            raise ValueError("image {}: {}".format(outStart + i, e)) from e
+        spacing[i] = msg.getSpacing()
+        matrices[i] = msg.getMatrix()
+    return {'spacing': spacing, 'matrix': matrices}
+
+
+def _decodePartition(path, groups, images):
+    """Decodes the frames of a partition of the file
+
+    :param str path: The recording path
+    :param dict groups: (message type, device name) -> (offsets, body sizes, versions, index of the first frame in
+        the group)
+    :param dict images: (message type, device name) -> image stack, either an array (thread mode) or the path of a
+        .npy file (process mode)
+
+    :returns: (message type, device name) -> dictionary of columns
+    """
+    results = {}
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        data = np.frombuffer(mapped, dtype=np.uint8)
+        try:
+            for key, (offsets, bodySizes, versions, first) in groups.items():
+                starts, sizes = _locateContent(data, offsets, bodySizes, versions)
+                if key[0] == 'POSITION':
+                    results[key] = _decodePositions(data, starts, sizes)
+                elif key[0] == 'SENSOR':
+                    results[key] = _decodeSensors(data, starts, sizes)
+                else:
+                    out = images[key]
+                    if isinstance(out, str):
+                        out = np.load(out, mmap_mode='r+')
+                    results[key] = _decodeImages(data, starts, sizes, out, first)
+                    if isinstance(out, np.memmap):
+                        out.flush()
+                    del out
+        finally:
+            del data
+    return results
+
+
+def _groupStreams(headers):
+    # Splits the frames by (message type, device name). Both names are joined into a single byte string key, which
+    # np.unique sorts much faster than the two fields of a structured array
+    names = np.empty(len(headers), dtype=[('type', 'S12'), ('device', 'S20')])
+    names['type'] = headers['type']
+    names['device'] = headers['device']
+    keys, inverse = np.unique(names.view('V32'), return_inverse=True)
+    order = np.argsort(inverse.reshape(-1), kind='stable')
+    bounds = np.searchsorted(inverse.reshape(-1)[order], np.arange(len(keys) + 1))
+    streams = {}
+    for i, key in enumerate(keys.view(names.dtype)):
+        streams[(key['type'].decode(), key['device'].decode())] = order[bounds[i]:bounds[i + 1]]
+    return streams
+
+
+def _fileName(messageType, deviceName):
+    return "{}_{}".format(messageType, re.sub(r'[^A-Za-z0-9_.-]', '_', deviceName))
+
+
+class RecordingExporter(object):
+    """
+        Exports POSITION, SENSOR and IMAGE streams of a raw IGTL capture (a file of concatenated frames) to per-device
+        columnar NumPy arrays. The headers are scanned once (see :func:`~pygtlink.scanFile`), the file is partitioned
+        by frame boundaries and the partitions are decoded on a pool of worker processes (or threads), each one
+        memory mapping the file.
+
+        The exported columns are, for each (message type, device name):
+            * all: ``timestamp`` (float64 seconds)
+            * POSITION: ``position`` (n x 3) and ``quaternion`` (n x 4), float32
+            * SENSOR: ``data`` (n x max array length, float64, NaN padded), ``status`` (uint8) and ``unit`` (uint64)
+            * IMAGE: ``images`` (n x subvolume dimensions, with a last axis for the components if there are several,
+              in the image scalar type), ``spacing`` (n x 3) and ``matrix`` (n x 4 x 4). With an output directory
+              the image stack is a memmap of a .npy file, so it does not need to fit in memory. All the images of a
+              device must have the same dimensions and scalar type
+
+        Worker processes cannot decode into an in-memory image stack: without an output directory, recordings with
+        IMAGE streams are decoded on threads.
+
+        :ivar str _path: The recording path
+        :ivar _headers: The scanned headers (a structured array of :data:`~pygtlink.SCAN_DTYPE`)
+    """
+
+    def __init__(self, path, workers=None, useProcesses=True, partitionSize=DEFAULT_PARTITION_SIZE):
+        self._path = path
+        self._workers = workers
+        self._useProcesses = useProcesses
+        self._partitionSize = partitionSize
+        self._headers, _ = scanFile(path)
+        self._timestamps = getTimestamps(self._headers)
+
+    def getHeaders(self):
+        """Gets the scanned headers
+
+        :returns: A structured array of :data:`~pygtlink.SCAN_DTYPE`, with one element per frame
+        """
+        return self._headers
+
+    def getStreams(self):
+        """Gets the streams in the recording
+
+        :returns: A list of (message type, device name, number of frames, first timestamp, last timestamp)
+        """
+        streams = []
+        for (messageType, deviceName), rows in _groupStreams(self._headers).items():
+            timestamps = self._timestamps[rows]
+            streams.append((messageType, deviceName, len(rows), float(timestamps.min()), float(timestamps.max())))
+        return streams
+
+    def export(self, devices=None, messageTypes=EXPORTED_TYPES, startTime=None, stopTime=None, outputDir=None):
+        """Decodes the selected frames into columnar arrays
+
+        :param devices: The device names to export, None for all of them
+        :param messageTypes: The message types to export, among POSITION, SENSOR and IMAGE
+        :param float startTime: Only frames with a timestamp >= startTime are exported
+        :param float stopTime: Only frames with a timestamp < stopTime are exported
+        :param str outputDir: If given, the columns of each stream are saved to <type>_<device>.npz, and image stacks
+            to <type>_<device>_images.npy
+
+        :returns: A dictionary {(message type, device name): {column name: array}}
+        """
+        selected = self._select(devices, messageTypes, startTime, stopTime)
+        headers = self._headers[selected]
+        timestamps = self._timestamps[selected]
+
+        members = _groupStreams(headers)
+        images = {key: self._createImageStack(key, headers[rows[0]], len(rows), outputDir)
+                  for key, rows in members.items() if key[0] == 'IMAGE'}
+
+        # the image stacks are in memory without an output directory, only threads can write into them
+        use_processes = self._useProcesses and (outputDir is not None or not images)
+        chunks = {key: [] for key in members}
+        for partition, future in self._submitPartitions(headers, members, images, use_processes):
+            for key, columns in future.result().items():
+                chunks[key].append(columns)
+
+        exported = {}
+        for key, rows in members.items():
+            columns = {'timestamp': timestamps[rows]}
+            for name in chunks[key][0]:
+                columns[name] = self._concatenate([chunk[name] for chunk in chunks[key]])
+            if key in images:
+                stack = images[key]
+                columns['images'] = np.load(stack, mmap_mode='r') if isinstance(stack, str) else stack
+            exported[key] = columns
+
+            if outputDir is not None:
+                np.savez(os.path.join(outputDir, _fileName(*key) + ".npz"),
+                         **{name: value for name, value in columns.items() if name != 'images'})
+        return exported
+
+    def _select(self, devices, messageTypes, startTime, stopTime):
+        mask = np.isin(self._headers['type'], [t.encode() for t in messageTypes if t in EXPORTED_TYPES])
+        if devices is not None:
+            mask &= np.isin(self._headers['device'], [d.encode() for d in devices])
+        if startTime is not None:
+            mask &= self._timestamps >= startTime
+        if stopTime is not None:
+            mask &= self._timestamps < stopTime
+        return np.flatnonzero(mask)
+
+    def _createImageStack(self, key, header, count, outputDir):
+        # the stack shape and dtype are given by the first image of the stream
+        msg = ImageMessage2()
+        with open(self._path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            starts, sizes = _locateContent(data, header['offset'].astype(np.int64).reshape(1),
+                                           header['body_size'].astype(np.int64).reshape(1),
+                                           header['version'].reshape(1))
+            image_header = data[starts[0]:starts[0] + min(sizes[0], IGTL_IMAGE_HEADER_SIZE)].tobytes()
+            del data
+        if len(image_header) < IGTL_IMAGE_HEADER_SIZE:
+            raise ValueError("invalid IMAGE frame at offset {}".format(header['offset']))
+        msg.decodeContent(image_header)
+        # the frames only hold the subvolume, with the components along the last axis
+        shape = (count,) + tuple(msg.getDataShape())
+        dtype = msg.getScalarType()
+
+        if outputDir is None:
+            return np.empty(shape, dtype=dtype)
+        path = os.path.join(outputDir, _fileName(*key) + "_images.npy")
+        np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape).flush()
+        return path
+
+    def _submitPartitions(self, headers, members, images, useProcesses):
+        # partitions are contiguous ranges of frames of about partitionSize bytes
+        frame_sizes = IGTL_HEADER_SIZE + headers['body_size'].astype(np.int64)
+        bounds = np.searchsorted(np.cumsum(frame_sizes), np.arange(self._partitionSize, frame_sizes.sum(),
+                                                                     self._partitionSize), side='right')
+        bounds = np.unique(np.concatenate(([0], bounds, [len(headers)])))
+
+        if useProcesses:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._workers)
+        with executor:
+            futures = []
+            for begin, end in zip(bounds[:-1], bounds[1:]):
+                groups = {}
+                for key, rows in members.items():
+                    lo, hi = np.searchsorted(rows, (begin, end))
+                    if lo == hi:
+                        continue
+                    part = headers[rows[lo:hi]]
+                    groups[key] = (part['offset'].astype(np.int64), part['body_size'].astype(np.int64),
+                                   part['version'].copy(), int(lo))
+                futures.append(((begin, end), executor.submit(_decodePartition, self._path, groups, images)))
+            for item in futures:
+                yield item
+
+    @staticmethod
+    def _concatenate(arrays):
+        # sensor data of different partitions may have different widths
+        if arrays[0].ndim == 2 and len({a.shape[1] for a in arrays}) > 1:
+            width = max(a.shape[1] for a in arrays)
+            arrays = [np.pad(a, ((0, 0), (0, width - a.shape[1])), constant_values=np.nan) for a in arrays]
+        return np.concatenate(arrays)
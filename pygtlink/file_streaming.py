@@ -0,0 +1,104 @@
+from pygtlink.utils import CRC64
+import mmap
+import numpy as np
+
+__all__ = ['sendImageMessage']
+
+# Size of the chunks the image data is converted and sent in (bytes)
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def _getFileRange(data):
+    # Gets (file name, offset) of the data if its bytes are a contiguous range of a memory mapped file, None otherwise
+    root = data
+    while isinstance(root, np.ndarray) and not isinstance(root.base, mmap.mmap):
+        root = root.base
+    if not isinstance(root, np.memmap) or root.filename is None or not data.flags['C_CONTIGUOUS']:
+        return None
+    start = data.__array_interface__['data'][0] - root.__array_interface__['data'][0]
+    return root.filename, root.offset + start
+
+
+def _wireChunks(data, wireDtype, chunkSize):
+    # Yields the image data in the wire format, in chunks of about chunkSize bytes. Data already in the wire format
+    # and contiguous is not copied, otherwise each chunk is converted on its own
+    if data.dtype == wireDtype and data.flags['C_CONTIGUOUS']:
+        flat = memoryview(data.reshape(-1).view(np.uint8))
+        for start in range(0, len(flat), chunkSize):
+            yield flat[start:start + chunkSize]
+        return
+
+    row_size = max(data[0].size * wireDtype.itemsize, 1) if len(data) else 1
+    rows = max(1, chunkSize // row_size)
+    for start in range(0, len(data), rows):
+        yield memoryview(np.ascontiguousarray(data[start:start + rows], dtype=wireDtype).reshape(-1).view(np.uint8))
+
+
+def _fileChunks(file, offset, count, chunkSize):
+    # Yields count bytes of a file from offset, in chunks read into the same buffer
+    buffer = memoryview(bytearray(min(count, chunkSize)))
+    file.seek(offset)
+    while count > 0:
+        n = file.readinto(buffer[:min(count, len(buffer))])
+        if not n:
+            raise EOFError("file ended {} bytes before the end of the image data".format(count))
+        yield buffer[:n]
+        count -= n
+
+
+class _NoFile(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+def sendImageMessage(connection, message, chunkSize=DEFAULT_CHUNK_SIZE, crc=True):
+    """Sends an image message without building its body in memory: the image data are converted and sent in chunks,
+    e.g. straight from the pages of a memory mapped file (see :func:`~pygtlink.ImageMessage2.setDataFromFile`). When
+    the data are a contiguous range of a file already in the wire format (scalar type and endian of the message),
+    the file range is sent with :func:`~pygtlink.Transport.sendfile`, i.e. socket.sendfile() on socket transports.
+
+    The sent bytes are the same as for :func:`~pygtlink.Transport.sendMessage`. The body crc needs a first pass over
+    the data, reading the file once more (from the page cache in most cases)
+
+    :param connection: A :class:`~pygtlink.ClientSocket`, :class:`~pygtlink.SocketServer` or
+        :class:`~pygtlink.Transport`
+    :param pygtlink.ImageMessage2 message: The message
+    :param int chunkSize: The size of the chunks the data are converted and sent in (bytes)
+    :param bool crc: If False, the body crc is not computed and 0 is sent instead: receivers must not check it
+
+    :returns: The number of bytes sent
+    """
+    transport = connection.getTransport() if hasattr(connection, 'getTransport') else connection
+    data = message.getData()
+    wire_dtype = message._getWireDtype()
+
+    ext_header, meta = message._packExtendedHeader()
+    prefix = ext_header + message._packImageHeader()
+    body_size = len(prefix) + data.size * wire_dtype.itemsize + len(meta)
+
+    file_range = _getFileRange(data) if data.dtype == wire_dtype else None
+    with open(file_range[0], 'rb') if file_range is not None else _NoFile() as f:
+        body_crc = 0
+        if crc:
+            # the file is read rather than its mapped pages, which would stay resident
+            chunks = _fileChunks(f, file_range[1], data.nbytes, chunkSize) if file_range is not None else \
+                _wireChunks(data, wire_dtype, chunkSize)
+            body_crc = CRC64(prefix)
+            for chunk in chunks:
+                body_crc = CRC64(chunk, body_crc)
+            body_crc = CRC64(meta, body_crc)
+
+        header = message._packHeader(body_size, body_crc)
+        transport.sendBuffers([header, prefix])
+        if file_range is not None:
+            transport.sendfile(f, file_range[1], data.nbytes)
+        else:
+            for chunk in _wireChunks(data, wire_dtype, chunkSize):
+                transport.send(chunk)
+
+    if meta:
+        transport.send(meta)
+    return len(header) + body_size
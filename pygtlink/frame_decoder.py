@@ -0,0 +1,148 @@
+from pygtlink.igtl_header import IGTL_HEADER_SIZE, IGTL_HEADER_BODY_SIZE_OFFSET
+import struct
+
+__all__ = ['FrameDecoder', 'iterFrames']
+
+# Default size of the receive buffer: many small frames are received per read
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+# Offset and format of the body size in the IGTL header (H12s20sII precede it)
+_BODY_SIZE = struct.Struct('>Q')
+
+
+class FrameDecoder(object):
+    """
+        A sans-IO IGTL framing decoder: it is given byte chunks of any size, either read straight into its buffer
+        (:func:`~pygtlink.FrameDecoder.getBuffer` and :func:`~pygtlink.FrameDecoder.bufferUpdated`, e.g. with
+        socket.recv_into or an asyncio.BufferedProtocol) or copied (:func:`~pygtlink.FrameDecoder.feed`), and returns
+        the complete frames they contain. Frames split across chunks are kept until they are complete.
+
+        With large reads, one recv_into call receives many small frames (e.g. POSITION frames of 86 bytes), instead of
+        two calls per frame (header and body).
+
+        The frames are memoryviews of the buffer, not copies. The buffer is never written over nor resized in place:
+        when it is full, the incomplete frame at its end is moved to a new buffer, so that the frames returned before
+        stay valid.
+
+        :param int bufferSize: The size of the receive buffer. A larger buffer is allocated for a frame larger than it
+        :param int maxBodySize: The maximum accepted body size, None for no limit. A larger body size raises
+            ValueError, e.g. when the stream is not an IGTL stream
+
+        :ivar bytearray _buffer: The receive buffer
+        :ivar int _start: The offset of the first byte not decoded yet in _buffer
+        :ivar int _end: The offset of the end of the received data in _buffer
+    """
+
+    def __init__(self, bufferSize=DEFAULT_BUFFER_SIZE, maxBodySize=None):
+        self._bufferSize = bufferSize
+        self._maxBodySize = maxBodySize
+        self._buffer = bytearray(bufferSize)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._needed = IGTL_HEADER_SIZE  # the size of the next frame, or of a header while it is unknown
+
+    def getBuffer(self):
+        """Gets the free part of the buffer, to receive data into. The received size must then be given to
+        :func:`~pygtlink.FrameDecoder.bufferUpdated`
+
+        :returns: A writable memoryview
+        """
+        free = len(self._buffer) - self._end
+        if free == 0 or self._start + self._needed > len(self._buffer):
+            self._reallocate()
+        return self._view[self._end:]
+
+    def bufferUpdated(self, nbytes):
+        """Records data received into the buffer returned by :func:`~pygtlink.FrameDecoder.getBuffer`
+
+        :param int nbytes: The number of bytes received
+        """
+        self._end += nbytes
+
+    def feed(self, data):
+        """Copies data into the buffer
+
+        :param data: A bytes-like object, e.g. the data given to asyncio.Protocol.data_received()
+        """
+        data = memoryview(data).cast('B')
+        while len(data):
+            buffer = self.getBuffer()
+            n = min(len(buffer), len(data))
+            buffer[:n] = data[:n]
+            self.bufferUpdated(n)
+            data = data[n:]
+
+    def receive(self, source):
+        """Reads once from a source into the buffer
+
+        :param source: A :class:`~pygtlink.Transport` or socket (recv_into), a :class:`~pygtlink.ClientSocket` or
+            :class:`~pygtlink.SocketServer` (their transport), or a binary file (readinto)
+
+        :returns: The number of bytes read, 0 if the source was closed or at its end
+        """
+        if hasattr(source, 'getTransport'):
+            source = source.getTransport()
+        read_into = source.recv_into if hasattr(source, 'recv_into') else source.readinto
+        n = read_into(self.getBuffer()) or 0
+        self.bufferUpdated(n)
+        return n
+
+    def frames(self):
+        """Gets the complete frames received so far
+
+        :returns: A list of (header, body) memoryviews
+        """
+        frames = []
+        buffer, start, end = self._buffer, self._start, self._end
+        while end - start >= IGTL_HEADER_SIZE:
+            body_size = _BODY_SIZE.unpack_from(buffer, start + IGTL_HEADER_BODY_SIZE_OFFSET)[0]
+            if self._maxBodySize is not None and body_size > self._maxBodySize:
+                raise ValueError("body size {} exceeds {}".format(body_size, self._maxBodySize))
+            body_start = start + IGTL_HEADER_SIZE
+            frame_end = body_start + body_size
+            if frame_end > end:
+                self._needed = frame_end - start
+                break
+            frames.append((self._view[start:body_start], self._view[body_start:frame_end]))
+            start = frame_end
+        else:
+            self._needed = IGTL_HEADER_SIZE
+        self._start = start
+        return frames
+
+    def getBufferedSize(self):
+        """Gets the size of the received data not returned as frames yet
+        """
+        return self._end - self._start
+
+    def _reallocate(self):
+        # moves the incomplete frame to a new buffer, large enough for it
+        pending = self._end - self._start
+        size = max(self._bufferSize, self._needed)
+        if size <= pending:
+            size = pending + self._bufferSize  # data fed without taking the frames out
+        buffer = bytearray(size)
+        buffer[:pending] = self._view[self._start:self._end]
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._start = 0
+        self._end = pending
+
+
+def iterFrames(source, bufferSize=DEFAULT_BUFFER_SIZE, maxBodySize=None):
+    """Reads frames from a source until it is closed (see :func:`~pygtlink.FrameDecoder.receive`)
+
+    :param source: A :class:`~pygtlink.Transport`, socket, :class:`~pygtlink.ClientSocket`,
+        :class:`~pygtlink.SocketServer` or binary file
+    :param int bufferSize: The size of the receive buffer
+    :param int maxBodySize: The maximum accepted body size, None for no limit
+
+    :returns: A generator of (header, body) memoryviews. An incomplete frame at the end of the source is dropped
+    """
+    decoder = FrameDecoder(bufferSize, maxBodySize)
+    while True:
+        for frame in decoder.frames():
+            yield frame
+        if not decoder.receive(source):
+            return
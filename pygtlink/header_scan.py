@@ -0,0 +1,104 @@
+from pygtlink.igtl_header import IGTL_HEADER_SIZE, IGTL_HEADER_BODY_SIZE_OFFSET
+import mmap
+import struct
+import numpy as np
+
+__all__ = ['HEADER_DTYPE', 'SCAN_DTYPE', 'scanHeaders', 'scanFile', 'getTimestamps']
+
+# The IGTL header as it is on the wire ('>H12s20sIIQQ')
+HEADER_DTYPE = np.dtype([('version', '>u2'),
+                         ('type', 'S12'),
+                         ('device', 'S20'),
+                         ('timestamp_sec', '>u4'),
+                         ('timestamp_frac', '>u4'),
+                         ('body_size', '>u8'),
+                         ('crc', '>u8')])
+
+# The scanned headers: native byte order, plus the offset of each frame in the scanned buffer
+SCAN_DTYPE = np.dtype([('version', 'u2'),
+                       ('type', 'S12'),
+                       ('device', 'S20'),
+                       ('timestamp_sec', 'u4'),
+                       ('timestamp_frac', 'u4'),
+                       ('body_size', 'u8'),
+                       ('crc', 'u8'),
+                       ('offset', 'u8')])
+
+# Offset and format of the body size in the IGTL header (H12s20sII precede it)
+_BODY_SIZE = struct.Struct('>Q')
+
+
+def _findFrames(buffer, start, end):
+    # The frame boundaries form a chain (each one depends on the previous body size), so they are walked reading only
+    # the body size of each header; everything else is decoded at once by scanHeaders()
+    offsets = []
+    offset = start
+    unpack_from = _BODY_SIZE.unpack_from
+    while offset + IGTL_HEADER_SIZE <= end:
+        frame_end = offset + IGTL_HEADER_SIZE + unpack_from(buffer, offset + IGTL_HEADER_BODY_SIZE_OFFSET)[0]
+        if frame_end > end:
+            break  # truncated frame
+        offsets.append(offset)
+        offset = frame_end
+    return offsets, offset
+
+
+def scanHeaders(buffer, start=0, end=None):
+    """Decodes the headers of all the complete IGTL frames in a buffer of concatenated frames (e.g. a recording).
+    Only the body sizes are read one by one to locate the frames, the headers are then decoded all at once with
+    :data:`HEADER_DTYPE`. A truncated frame at the end of the buffer is ignored.
+
+    Type and device names are byte strings, e.g. ``headers[headers['type'] == b'POSITION']``.
+
+    :param buffer: A bytes-like object, e.g. bytes or an mmap
+    :param int start: The offset of the first frame
+    :param int end: The end of the scanned range, defaults to the buffer size
+
+    :returns: A structured array of :data:`SCAN_DTYPE`, with one element per frame, and the offset where the scan
+        stopped (the end of the last complete frame)
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    end = len(data) if end is None else min(end, len(data))
+    offsets, stop = _findFrames(buffer, start, end)
+
+    headers = np.empty(len(offsets), dtype=SCAN_DTYPE)
+    if not offsets:
+        return headers, stop
+
+    offsets = np.array(offsets, dtype=np.uint64)
+    # one row per possible header start, without copying: indexing it by the offsets copies the headers only
+    windows = np.lib.stride_tricks.as_strided(data, shape=(end - IGTL_HEADER_SIZE + 1, IGTL_HEADER_SIZE),
+                                              strides=(1, 1), writeable=False)
+    rows = windows[offsets.astype(np.intp)]
+    wire = rows.view(HEADER_DTYPE).reshape(len(offsets))
+    for name in HEADER_DTYPE.names:
+        headers[name] = wire[name]
+    headers['offset'] = offsets
+    return headers, stop
+
+
+def scanFile(path, start=0):
+    """Decodes the headers of all the complete IGTL frames in a file (see :func:`scanHeaders`). The file is memory
+    mapped, so it is not read into memory
+
+    :param str path: The file path
+    :param int start: The offset of the first frame
+
+    :returns: A structured array of :data:`SCAN_DTYPE`, with one element per frame, and the offset where the scan
+        stopped
+    """
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return np.empty(0, dtype=SCAN_DTYPE), 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return scanHeaders(mapped, start)
+
+
+def getTimestamps(headers):
+    """Gets the timestamps of scanned headers
+
+    :param headers: A structured array of :data:`SCAN_DTYPE` or :data:`HEADER_DTYPE`
+
+    :returns: The timestamps in seconds (float64 array)
+    """
+    return headers['timestamp_sec'].astype(np.float64) + headers['timestamp_frac'].astype(np.float64) / 2 ** 32
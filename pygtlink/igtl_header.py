@@ -1,11 +1,21 @@
-from pygtlink import *
+from pygtlink.utils import IGTL_HEADER_VERSION_1
+import struct
 
-__all__ = ['IgtlHeader']
+__all__ = ['IgtlHeader', 'IGTL_HEADER_SIZE']
 
 IGTL_HEADER_SIZE = 58
 
+# Fields of the binary header ('>H12s20sIIQQ'): slices of the names, offsets of the numbers
+IGTL_HEADER_TYPE = slice(2, 14)
+IGTL_HEADER_DEVICE_NAME = slice(14, 34)
+IGTL_HEADER_TIMESTAMP_OFFSET = 34
+IGTL_HEADER_BODY_SIZE_OFFSET = 42
+IGTL_HEADER_CRC_OFFSET = 50
+
 
 class IgtlHeader(object):
+    __slots__ = ('version', 'type', 'devicename', 'timestamp_sec', 'timestamp_frac', 'body_size', 'crc')
+
     def __init__(self):
         self.version = IGTL_HEADER_VERSION_1  # version number
         self.type = ""
@@ -13,7 +23,7 @@ class IgtlHeader(object):
         self.timestamp_sec = 0
         self.timestamp_frac = 0
         self.body_size = 0  # the size of the binary body pack
-        self.crc = CRC64(b"")
+        self.crc = 0  # crc of an empty body
 
     def pack(self, endian=">"):
 
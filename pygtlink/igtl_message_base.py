@@ -1,6 +1,10 @@
-from pygtlink import *
+from pygtlink.utils import IGTL_HEADER_VERSION_1, IGTL_HEADER_VERSION_2, CRC64, igtl_sec_to_frac, \
+    igtl_frac_to_nanosec
+from pygtlink.igtl_header import IgtlHeader, IGTL_HEADER_SIZE
+from pygtlink import tracing
+import struct
 
-__all__ = ['MessageBase']
+__all__ = ['MessageBase', 'UNPACK_UNDEF', 'UNPACK_HEADER', 'UNPACK_BODY', 'IANA_TYPE_US_ASCII', 'IANA_TYPE_UTF_8']
 
 # Unpack status. They are returned by the Unpack() function.
 
@@ -8,6 +12,20 @@ UNPACK_UNDEF = 1,
 UNPACK_HEADER = 2,
 UNPACK_BODY = 3
 
+# Extended header (header version >= 2): ext header size, metadata header size, metadata size, message id
+IGTL_EXTENDED_HEADER_SIZE = 12
+_EXTENDED_HEADER = struct.Struct('>HHII')
+
+# Metadata header: index count followed by one (key size, value encoding, value size) entry per element
+IGTL_METADATA_INDEX_COUNT_SIZE = 2
+IGTL_METADATA_INDEX_ENTRY_SIZE = 8
+
+# Value encodings for metadata elements (IANA MIBenum character set codes)
+IANA_TYPE_US_ASCII = 3
+IANA_TYPE_UTF_8 = 106
+
+_IANA_CODECS = {IANA_TYPE_US_ASCII: 'ascii', IANA_TYPE_UTF_8: 'utf-8'}
+
 
 class MessageBase(object):
     """
@@ -29,8 +47,18 @@ class MessageBase(object):
     :ivar bool _isHeaderUnpacked: Unpacking (deserialization) status for the header
     :ivar bool _isBodyUnpacked: Unpacking (deserialization) status for the body
     :ivar bool _isBodyPacked: Packing (deserialization) status for the body
+    :ivar _content: The serialized message content, i.e. the body without the extended header and the metadata.
+        Child classes write it in _packContent() and read it in _unpackContent()
+    :ivar int _messageId: The message id sent in the extended header (header version >= 2)
+    :ivar dict _metaDataMap: The metadata elements as {key: (encoding, value bytes)}, None until an element is set.
+        When a message is unpacked, the metadata is decoded only the first time it is accessed
+    :ivar _metaDataRaw: The received (not yet decoded) metadata header and metadata
     """
 
+    __slots__ = ('header', 'body', '_messageSize', '_bodySize', '_messageType', '_headerVersion', '_deviceName',
+                 '_timeStampSec', '_timeStampFraction', '_receivedBodyCrc', '_isHeaderUnpacked', '_isBodyUnpacked',
+                 '_isBodyPacked', '_content', '_messageId', '_metaDataMap', '_metaDataRaw')
+
     def __init__(self):
         self.header = None  # binary header - in cpp  unsigned char* m_Header
         self.body = None  # binary body - in cpp  unsigned char* m_Body
@@ -46,8 +74,10 @@ class MessageBase(object):
         self._isHeaderUnpacked = False
         self._isBodyUnpacked = False
         self._isBodyPacked = False
-
-    # TODO: implement for OpenIGTLink_HEADER_VERSION >= 2
+        self._content = None
+        self._messageId = 0
+        self._metaDataMap = None
+        self._metaDataRaw = None
 
     def copyHeader(self, messageBase):
         """Copies the unpacked header from another message
@@ -119,7 +149,83 @@ class MessageBase(object):
         """
         return self._messageType
 
-    # TODO: implement for OpenIGTLink_HEADER_VERSION >= 2
+    def setMessageID(self, message_id):
+        """Sets the message id. The id is only sent with header version >= 2
+
+            :param int message_id: The message id to set
+        """
+        self._messageId = int(message_id)
+        self._isBodyPacked = False
+
+    def getMessageID(self):
+        """Gets the message id
+
+            :returns: The message id (0 for messages with header version 1)
+        """
+        return self._messageId
+
+    def setMetaDataElement(self, key, value, encoding=IANA_TYPE_US_ASCII):
+        """Sets a metadata element. Metadata is only sent with header version >= 2
+
+            :param str key: The element key
+            :param value: The element value, either a string or a byte string
+            :param int encoding: The value encoding (IANA_TYPE_US_ASCII or IANA_TYPE_UTF_8)
+
+            :returns: True if the element was set, False if the key or the value are too long
+        """
+        b_key = key.encode('utf-8')
+        if isinstance(value, str):
+            value = value.encode(_IANA_CODECS.get(encoding, 'utf-8'))
+
+        if len(b_key) > 0xFFFF or len(value) > 0xFFFFFFFF:
+            return False
+
+        self._decodeMetaData()
+        if self._metaDataMap is None:
+            self._metaDataMap = {}
+        self._metaDataMap[key] = (int(encoding), bytes(value))
+        self._isBodyPacked = False
+        return True
+
+    def getMetaDataElement(self, key):
+        """Gets a metadata element
+
+            :param str key: The element key
+
+            :returns: The decoded element value, or None if the key is not in the metadata
+        """
+        self._decodeMetaData()
+        element = None if self._metaDataMap is None else self._metaDataMap.get(key)
+        if element is None:
+            return None
+
+        encoding, value = element
+        codec = _IANA_CODECS.get(encoding)
+        return value if codec is None else value.decode(codec)
+
+    def getMetaData(self):
+        """Gets all the metadata elements
+
+            :returns: A dictionary {key: value} with the decoded element values
+        """
+        self._decodeMetaData()
+        return {key: self.getMetaDataElement(key) for key in self._metaDataMap or ()}
+
+    def getRawMetaData(self):
+        """Gets all the metadata elements as they are sent, e.g. to copy them to another message with
+        setMetaDataElement(key, value, encoding)
+
+            :returns: A dictionary {key: (encoding, value byte string)}
+        """
+        self._decodeMetaData()
+        return dict(self._metaDataMap or {})
+
+    def clearMetaData(self):
+        """Removes all the metadata elements
+        """
+        self._metaDataMap = None
+        self._metaDataRaw = None
+        self._isBodyPacked = False
 
     def setTimeStamp(self, timestamp):
         """Sets the message timestamp
@@ -130,7 +236,7 @@ class MessageBase(object):
                 function time.time() from the time module
          """
         self._timeStampSec = int(timestamp)
-        self._timeStampFraction = igtl_nanosec_to_frac(int((timestamp - self._timeStampSec) * 10 ** 9))
+        self._timeStampFraction = igtl_sec_to_frac(timestamp - self._timeStampSec)
 
     def getTimeStamp(self):
         """Gets the message timestamp
@@ -163,29 +269,34 @@ class MessageBase(object):
         if len(self._messageType) == 0:
             return 0
 
+        tracer = tracing._tracer
+        if tracer is not None:
+            start = tracer.clock()
+
         self._packContent()
+        self._packBody()
         self._isBodyPacked = True
 
-        header = IgtlHeader()
-        header.version = self._headerVersion
-        header.timestamp_sec = self._timeStampSec
-        header.timestamp_frac = self._timeStampFraction
-        header.body_size = self.getPackBodySize()
-        header.crc = CRC64(self.body)  # TODO: check this crc
-        header.type = self._messageType
-        header.devicename = self._deviceName
+        if tracer is not None:
+            crc_start = tracer.clock()
+            tracer.record('packContent', start, crc_start, self._messageType, self._deviceName, self._bodySize)
+        crc = CRC64(self.body)  # TODO: check this crc
+        if tracer is not None:
+            tracer.record('crc64', crc_start, tracer.clock(), self._messageType, self._deviceName, self._bodySize)
 
-        self.header = header.pack()
+        self.header = self._packHeader(self.getPackBodySize(), crc)
         self._messageSize = len(self.header) + len(self.body)
         return 1
 
-    def unpack(self, crccheck = 0):
+    def unpack(self, crccheck = 0, into=None):
         """Unpack() deserializes the header and/or body, extracting data from the byte stream.
             If the header has already been deserialized, Unpack() deserializes only the body part.
             UnpackBody() must be implemented to deserialize the body part. Unpack() performs 64-bit CRC check, when
             crccheck = 1.
 
             :param int crccheck: The body crccheck
+            :param into: A preallocated array the message data is decoded into, for messages with array data (see
+                the getData(out) function of the message class). It must have the shape and dtype of the data
 
             :returns: The unpacking result, i.e.
 
@@ -211,6 +322,8 @@ class MessageBase(object):
             return r
 
         r = self._unpackBody(crccheck, r)
+        if into is not None and self._isBodyUnpacked:
+            self._unpackInto(into)
 
         return r
 
@@ -259,6 +372,112 @@ class MessageBase(object):
 
     # PROTECTED FUNCTIONS
 
+    def _packHeader(self, body_size, crc):
+        """
+        Packs the message header for a body of the given size and crc
+
+        :returns: The binary header
+        """
+        header = IgtlHeader()
+        header.version = self._headerVersion
+        header.timestamp_sec = self._timeStampSec
+        header.timestamp_frac = self._timeStampFraction
+        header.body_size = body_size
+        header.crc = crc
+        header.type = self._messageType
+        header.devicename = self._deviceName
+        return header.pack()
+
+    def _packBody(self):
+        """
+        Builds the message body from the packed content. For header version >= 2 the body is
+        extended header + content + metadata header + metadata, otherwise it is the content only
+        """
+        if self._headerVersion < IGTL_HEADER_VERSION_2:
+            self.body = self._content
+        else:
+            ext_header, meta = self._packExtendedHeader()
+            self.body = b''.join((ext_header, self._content, meta))
+        self._bodySize = len(self.body)
+
+    def _packExtendedHeader(self):
+        """
+        Packs the parts of the body that surround the content: the extended header before it and the metadata header +
+        metadata after it. Both are empty for header version 1
+
+        :returns: The binary extended header, the binary metadata header + metadata
+        """
+        if self._headerVersion < IGTL_HEADER_VERSION_2:
+            return b'', b''
+
+        self._decodeMetaData()
+        elements = self._metaDataMap or {}
+        meta_header = bytearray(struct.pack('>H', len(elements)))
+        meta_data = bytearray()
+        for key, (encoding, value) in elements.items():
+            b_key = key.encode('utf-8')
+            meta_header += struct.pack('>HHI', len(b_key), encoding, len(value))
+            meta_data += b_key
+            meta_data += value
+
+        ext_header = _EXTENDED_HEADER.pack(IGTL_EXTENDED_HEADER_SIZE, len(meta_header), len(meta_data),
+                                           self._messageId)
+        return ext_header, bytes(meta_header + meta_data)
+
+    def _unpackExtendedHeader(self):
+        """
+        Splits a header version >= 2 body into content and metadata. The metadata itself is not decoded here, but only
+        the first time it is accessed
+
+        :returns: True if the extended header is consistent with the body size, False otherwise
+        """
+        if len(self.body) < IGTL_EXTENDED_HEADER_SIZE:
+            return False
+
+        ext_header_size, meta_header_size, meta_data_size, self._messageId = \
+            _EXTENDED_HEADER.unpack_from(self.body)
+
+        content_size = len(self.body) - ext_header_size - meta_header_size - meta_data_size
+        if ext_header_size < IGTL_EXTENDED_HEADER_SIZE or content_size < 0:
+            return False
+
+        body = memoryview(self.body)
+        content_end = ext_header_size + content_size
+        self._content = body[ext_header_size:content_end]
+        self._metaDataMap = None
+        self._metaDataRaw = body[content_end:] if meta_header_size > 0 else None
+        return True
+
+    def _decodeMetaData(self):
+        """
+        Decodes the received metadata (if any) into the metadata map
+        """
+        raw = self._metaDataRaw
+        if raw is None:
+            return
+        self._metaDataRaw = None
+
+        if len(raw) < IGTL_METADATA_INDEX_COUNT_SIZE:
+            return
+
+        count = struct.unpack_from('>H', raw)[0]
+        data_offset = IGTL_METADATA_INDEX_COUNT_SIZE + count * IGTL_METADATA_INDEX_ENTRY_SIZE
+        if len(raw) < data_offset:
+            return
+
+        index = struct.unpack_from('>' + 'HHI' * count, raw, IGTL_METADATA_INDEX_COUNT_SIZE)
+        if self._metaDataMap is None:
+            self._metaDataMap = {}
+        for i in range(0, 3 * count, 3):
+            key_size, encoding, value_size = index[i:i + 3]
+            key_end = data_offset + key_size
+            value_end = key_end + value_size
+            if value_end > len(raw):
+                break
+            key = bytes(raw[data_offset:key_end]).decode('utf-8')
+            self._metaDataMap[key] = (encoding, bytes(raw[key_end:value_end]))
+            data_offset = value_end
+
     def _unpackHeader(self):
         """
         Unpack the message header
@@ -304,9 +523,14 @@ class MessageBase(object):
             self._isBodyUnpacked = False
             return r
 
+        tracer = tracing._tracer
         if crccheck:
             # Calculate CRC of the body
+            if tracer is not None:
+                start = tracer.clock()
             crc = CRC64(self.body)
+            if tracer is not None:
+                tracer.record('crc64', start, tracer.clock(), self._messageType, self._deviceName, self._bodySize)
         else:
             crc = self._receivedBodyCrc
 
@@ -314,24 +538,42 @@ class MessageBase(object):
             self._isBodyUnpacked = False
             return
 
+        if self._headerVersion >= IGTL_HEADER_VERSION_2:
+            if not self._unpackExtendedHeader():
+                self._isBodyUnpacked = False
+                return r
+        else:
+            self._content = self.body
+
         # deserialize the body
+        if tracer is not None:
+            start = tracer.clock()
         self._unpackContent()
+        if tracer is not None:
+            tracer.record('unpackContent', start, tracer.clock(), self._messageType, self._deviceName, self._bodySize)
         self._isBodyUnpacked = True
         self._isBodyPacked = False
 
         return UNPACK_BODY
 
+    def _unpackInto(self, into):
+        """
+        Copies the unpacked data into a preallocated array, which then becomes the message data. Implemented by the
+        messages with array data
+        """
+        raise TypeError("{} messages cannot be unpacked into an array".format(self._messageType))
+
     def _packContent(self, endian=">"):
         """
-        Packs (serialize) the content. Must be implemented in all child classes
+        Packs (serialize) the content into _content. Must be implemented in all child classes
         :returns: an int
         """
-
+        self._content = b''
         return 0
 
     def _unpackContent(self, endian=">"):
         """
-        Unpacks (deserialize) the content. Must be implemented in all child classes.
+        Unpacks (deserialize) the content from _content. Must be implemented in all child classes.
 
         :returns: an int
         """
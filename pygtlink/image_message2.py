@@ -1,5 +1,7 @@
-from pygtlink import *
+from pygtlink.igtl_message_base import MessageBase
+import struct
 import enum
+import sys
 import numpy as np
 
 __all__ = ['ImageMessage2']
@@ -42,6 +44,12 @@ class PixelType(enum.IntEnum):
 s2np = {2: 'int8', 3: 'uint8', 4: 'int16', 5: 'uint16', 6: 'int32', 7: 'uint32', 10: 'float32', 11: 'float64'}
 np2s = {v: k for k, v in s2np.items()}
 
+# Shared read-only defaults, so that a new message does not allocate its own placeholder arrays
+_IDENTITY_MATRIX = np.identity(4)
+_IDENTITY_MATRIX.setflags(write=False)
+_EMPTY_IMAGE = np.array([0, 0])
+_EMPTY_IMAGE.setflags(write=False)
+
 
 class ImageMessage2(MessageBase):
     """
@@ -54,13 +62,17 @@ class ImageMessage2(MessageBase):
             :ivar int[3] _subOffset:  A vector containing the offset (number of voxels) of the first voxel of the
                 subvolume from the first voxel of the original image.
             :ivar nd.array _matrix: A matrix representing the origin and the orientation of the image. The matrix is
-                set to identity by default
+                identity by default, and only allocated when it is accessed or set
             :ivar int _endian: A variable for the Endian of the scalar values in the image.
             :ivar int _numComponents: A variable for the number of components
             :ivar int _scalarType: A variable for the scalar type of the voxels
             :ivar int _coordinate: A variable for the used coordinate system
+            :ivar nd.array _rawImage: The image data
     """
 
+    __slots__ = ('_dimensions', '_spacing', '_subDimensions', '_subOffset', '_matrix', '_endian', '_numComponents',
+                 '_scalarType', '_coordinate', '_rawImage')
+
     def __init__(self):
         MessageBase.__init__(self)
 
@@ -72,12 +84,12 @@ class ImageMessage2(MessageBase):
         self._spacing = [0, 0, 0]
         self._subDimensions = [0, 0, 0]
         self._subOffset = [0, 0, 0]
-        self._matrix = np.identity(4)
+        self._matrix = None
         self._endian = Endian.endianBig
         self._numComponents = 1
         self._scalarType = PixelType.TYPE_UINT8
         self._coordinate = CoordSys.coordinateRas
-        self._rawImage = np.array([0, 0])
+        self._rawImage = _EMPTY_IMAGE
 
     def setDimensions(self, dimensions):
         """
@@ -120,8 +132,8 @@ class ImageMessage2(MessageBase):
 
         :returns: True if the subvolume is successfully specified, False if an invalid subvolume is specified.
         """
-        if off[0] + dims[0] >= self._dimensions[1] or off[1] + dims[1] >= self._dimensions[2] or \
-            off[2] + dims[2] >= self._dimensions[2]:
+        if off[0] + dims[0] > self._dimensions[0] or off[1] + dims[1] > self._dimensions[1] or \
+            off[2] + dims[2] > self._dimensions[2]:
             return False
 
         if off[0] < 0 or off[1] < 0 or off[2] < 0 or dims[0] < 0 or dims[1] < 0 or dims[2] < 0:
@@ -161,7 +173,7 @@ class ImageMessage2(MessageBase):
         :param: list or array with the origin coordinates
         """
         self._isBodyPacked = False
-        self._matrix[1:3, 3] = np.array(origin)
+        self.getMatrix()[1:3, 3] = np.array(origin)
 
     def getOrigin(self):
         """ Gets the coordinates of the origin using an array of positions along the first (R or L), second (A or P) and
@@ -169,7 +181,7 @@ class ImageMessage2(MessageBase):
 
         :returns: list of origin coordinates
         """
-        return np.squeeze(self._matrix[1:3, 3])
+        return np.squeeze(self.getMatrix()[1:3, 3])
 
     def setNormals(self, m):
         """Sets the orientation of the image by an array of the normal vectors for the i, j and k indexes.
@@ -177,14 +189,14 @@ class ImageMessage2(MessageBase):
         :param m: a 3x3 matrix containing the normal vectors stored in columns
         """
         self._isBodyPacked = False
-        self._matrix[1:3, 1:3] = m
+        self.getMatrix()[1:3, 1:3] = m
 
     def getNormals(self):
         """Gets the orientation of the image as an array of the normal vectors for the i, j and k indexes.
 
         :returns: The image orientation vector concatenated in a matrix per columns
         """
-        return self._matrix[1:3, 1:3]
+        return self.getMatrix()[1:3, 1:3]
 
     def setMatrix(self, matrix):
         """Sets the orientation and origin matrix.
@@ -201,6 +213,8 @@ class ImageMessage2(MessageBase):
 
         :returns: The 4x4 matrix representing the origin and the orientation of the image.
         """
+        if self._matrix is None:
+            self._matrix = np.identity(4)
         return self._matrix
 
     def setNumComponents(self, num):
@@ -316,7 +330,8 @@ class ImageMessage2(MessageBase):
 
         :returns: The size (length) of the byte array for the subvolume image data.
         """
-        self._subDimensions[0]*self._subDimensions[1]*self._subDimensions[2]*self.getScalarSize()*self._numComponents
+        return self._subDimensions[0]*self._subDimensions[1]*self._subDimensions[2]*self.getScalarSize()*\
+            self._numComponents
 
     def setData(self, rawImgData):
         """
@@ -336,19 +351,103 @@ class ImageMessage2(MessageBase):
 
         imgShape = list(self._rawImage.shape)
         self.setDimensions(imgShape)
+        return True
+
+    def setDataFromFile(self, path, shape, dtype, offset=0):
+        """
+        Sets the image raw data from a raw file, which is mapped in memory (np.memmap) instead of being read. The
+        scalar type and the endian are set from dtype, so that the file bytes are sent as they are (see
+        :func:`~pygtlink.sendImageMessage`)
+
+        :param str path: The file path
+        :param shape: The image shape, as for :func:`~pygtlink.ImageMessage2.setData`
+        :param dtype: The numpy dtype of the file voxels, e.g. '<u2'
+        :param int offset: The offset of the first voxel in the file, e.g. the size of a file header
+
+        :returns: True if the data were correctly set, False otherwise
+        """
+        dtype = np.dtype(dtype)
+        if dtype.name not in np2s:
+            return False
+        self._scalarType = PixelType(np2s[dtype.name])
+        if dtype.itemsize > 1:
+            little = dtype.byteorder == '<' or (dtype.byteorder == '=' and sys.byteorder == 'little')
+            self._endian = Endian.endianLittle if little else Endian.endianBig
+        return self.setData(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape)))
 
-    def getData(self):
+    def getData(self, out=None):
         """
-        Gets the image raw data
+        Gets the image raw data. After unpacking, the data is a view over the message body (in the wire byte order),
+        with the subvolume dimensions
+
+        :param out: A preallocated array the data is copied (and converted) into, with the same shape as the data
+
+        :returns: The image raw data, or out
+        """
+        if out is None:
+            return self._rawImage
+        if out.shape != self._rawImage.shape:
+            raise ValueError("out has shape {}, expected {}".format(out.shape, self._rawImage.shape))
+        np.copyto(out, self._rawImage, casting='unsafe')
+        return out
+
+    def getDataShape(self):
+        """Gets the shape of the data sent in the body: the body only holds the subvolume, which is the entire volume
+        unless setSubVolume() was used, with one last axis for the components if there are several
+
+        :returns: The shape
+        """
+        return list(self._subDimensions) + ([self._numComponents] if self._numComponents > 1 else [])
+
+    def decodeContent(self, content, out=None):
+        """
+        Decodes a content (the body without its extended header and metadata) read without its header, e.g. from a
+        recording. If content only holds the image header (IGTL_IMAGE_HEADER_SIZE bytes), only the image parameters
+        are decoded. With out, the data is copied into out and the message keeps no reference to content, which can
+        then be a view over a mapped file; otherwise the data is a view over content
+
+        :param content: The content, a bytes-like object
+        :param out: A preallocated array the data is copied (and converted) into, see :func:`getData`
 
-        :returns: The image raw data
+        :returns: The image data (None if content only holds the image header), or out
         """
-        return self._rawImage
+        if len(content) < IGTL_IMAGE_HEADER_SIZE:
+            raise ValueError("the content holds {} bytes, less than an image header".format(len(content)))
+        self._content = content
+        try:
+            if len(content) == IGTL_IMAGE_HEADER_SIZE:
+                self._unpackImageHeader()
+                self._rawImage = None
+                return None
+            self._unpackContent()
+            if out is None:
+                return self._rawImage
+            return self.getData(out=out)
+        finally:
+            if out is not None or self._rawImage is None:
+                self._content = None
+                self._rawImage = None
+
+    def _unpackInto(self, into):
+        self._rawImage = self.getData(out=into)
 
     def _packContent(self, endian=">"):
 
         # IMAGE HEADER
+        b_img_header = self._packImageHeader(endian)
+
+        # IMAGE DATA
+        # convert the data to the scalar type and byte order used on the wire
+        b_data = self._rawImage.astype(self._getWireDtype(), copy=False).tobytes()
+
+        # get binary message body = image header + image data
+        self._content = b_img_header + b_data
 
+    def _packImageHeader(self, endian=">"):
+        """Packs the image header (the first IGTL_IMAGE_HEADER_SIZE bytes of the content)
+
+        :returns: The binary image header
+        """
         b_img_header = struct.pack(endian + 'HBBBB', IGTL_IMAGE_HEADER_VERSION, self._numComponents,
                                    self._scalarType, self._endian, self._coordinate)
 
@@ -358,11 +457,12 @@ class ImageMessage2(MessageBase):
 
         # Prepare the flatten transformation matrix and add its binarized version. The length of the axes must represent
         #  the pixel size (e.g. - spacing) in that dimension - therefore multiply it by the spacing
+        orientation = _IDENTITY_MATRIX if self._matrix is None else self._matrix
         matrix = np.zeros(12, dtype=np.float32)
-        matrix[0:3] = self._matrix[0:3, 0] * self._spacing[0]
-        matrix[3:6] = self._matrix[0:3, 1] * self._spacing[1]
-        matrix[6:9] = self._matrix[0:3, 2] * self._spacing[2]
-        matrix[9:12] = self._matrix[0:3, 3]  # Center position of the image (in millimeter)
+        matrix[0:3] = orientation[0:3, 0] * self._spacing[0]
+        matrix[3:6] = orientation[0:3, 1] * self._spacing[1]
+        matrix[6:9] = orientation[0:3, 2] * self._spacing[2]
+        matrix[9:12] = orientation[0:3, 3]  # Center position of the image (in millimeter)
         for i in range(12):
             b_img_header += struct.pack(endian + 'f', matrix[i])
 
@@ -374,20 +474,32 @@ class ImageMessage2(MessageBase):
         for i in range(3):
             b_img_header += struct.pack(endian + 'H', self._subDimensions[i])
 
-        # IMAGE DATA
-        self._rawImage = self._rawImage.astype(s2np[self._scalarType])  # convert the data to the correct format
-        byte_order = "F" if self._endian == 2 else "C"
-        b_data = self._rawImage.tostring(byte_order)
+        return b_img_header
 
-        # get binary message body = image header + image data
-        self.body = b_img_header + b_data
+    def _getWireDtype(self):
+        """Gets the dtype of the image scalars on the wire, i.e. the scalar type with the byte order given by the
+        image endian
 
-        self._bodySize = len(self.body)
+        :returns: The numpy dtype
+        """
+        byte_order = "<" if self._endian == Endian.endianLittle else ">"
+        return np.dtype(s2np[self._scalarType]).newbyteorder(byte_order)
 
     def _unpackContent(self, endian=">"):
 
         # unpack image header
-        img_binary_header = self.body[0:IGTL_IMAGE_HEADER_SIZE]
+        self._unpackImageHeader(endian)
+
+        # unpack image data
+        img_data = self._content[IGTL_IMAGE_HEADER_SIZE::]
+        flat_data = np.frombuffer(img_data, dtype=self._getWireDtype())
+
+        self._rawImage = flat_data.reshape(self.getDataShape())
+
+    def _unpackImageHeader(self, endian=">"):
+        """Unpacks the image header (the first IGTL_IMAGE_HEADER_SIZE bytes of the content)
+        """
+        img_binary_header = self._content[0:IGTL_IMAGE_HEADER_SIZE]
         unpacked_header = struct.unpack(endian + 'HBBBBHHHffffffffffffHHHHHH', img_binary_header)
 
         # self._img_header_version = unpacked_header[0]
@@ -396,7 +508,7 @@ class ImageMessage2(MessageBase):
         self._endian = Endian(unpacked_header[3])
         self._coordinate = CoordSys(unpacked_header[4])
         self._dimensions = list(unpacked_header[5:8])
-        self._matrix[0:3, :] = np.reshape(np.array(unpacked_header[8:20]), [3, 4], order='F') #TODO: check this
+        self.getMatrix()[0:3, :] = np.reshape(np.array(unpacked_header[8:20]), [3, 4], order='F') #TODO: check this
         self._subOffset = list(unpacked_header[20:23])
         self._subDimensions = list(unpacked_header[23:26])
 
@@ -408,9 +520,3 @@ class ImageMessage2(MessageBase):
         self._matrix[0:3, 0] = self._matrix[0:3, 0] / self._spacing[0]
         self._matrix[0:3, 1] = self._matrix[0:3, 1] / self._spacing[1]
         self._matrix[0:3, 2] = self._matrix[0:3, 2] / self._spacing[2]
-
-        # unpack image data
-        img_data = self.body[IGTL_IMAGE_HEADER_SIZE::]
-        flat_data = np.frombuffer(img_data, dtype=s2np[self._scalarType])
-
-        self._rawImage = flat_data.reshape(self._dimensions)
\ No newline at end of file
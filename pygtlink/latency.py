@@ -0,0 +1,382 @@
+from pygtlink.utils import igtl_nanosec_to_frac, igtl_frac_to_nanosec
+from pygtlink.igtl_message_base import MessageBase, UNPACK_HEADER
+import collections
+import struct
+import time
+import numpy as np
+
+__all__ = ['ClockSyncMessage', 'ClockOffsetEstimator', 'LatencyHistogram', 'LatencyProbe']
+
+CLOCK_SYNC_MESSAGE_TYPE = "CLOCKSYNC"
+IGTL_CLOCK_SYNC_SIZE = 25
+
+CLOCK_SYNC_REQUEST = 0
+CLOCK_SYNC_REPLY = 1
+
+
+def _timestamp_to_uint64(timestamp):
+    # 64-bit OpenIGTLink timestamp: seconds in the upper 32 bits, fraction of second in the lower 32 bits
+    sec = int(timestamp)
+    frac = igtl_nanosec_to_frac(int((timestamp - sec) * 10 ** 9))
+    return (sec << 32) | frac
+
+
+def _uint64_to_timestamp(value):
+    return float(value >> 32) + float(igtl_frac_to_nanosec(value & 0xFFFFFFFF)) / 10 ** 9
+
+
+class ClockSyncMessage(MessageBase):
+    """
+        NTP-style clock synchronization message, used by :class:`~pygtlink.LatencyProbe` to estimate the clock offset
+        and the round trip time between two peers. A request carries the time it was sent (originate), the reply
+        echoes it back together with the time the request was received and the time the reply was sent.
+
+        :ivar int _mode: CLOCK_SYNC_REQUEST or CLOCK_SYNC_REPLY (uint8)
+        :ivar float _originate: Time the request was sent, in the requester clock
+        :ivar float _receive: Time the request was received, in the responder clock
+        :ivar float _transmit: Time the reply was sent, in the responder clock
+    """
+
+    __slots__ = ('_mode', '_originate', '_receive', '_transmit')
+
+    def __init__(self):
+        MessageBase.__init__(self)
+
+        self._messageType = CLOCK_SYNC_MESSAGE_TYPE
+
+        self._mode = CLOCK_SYNC_REQUEST  # uint8
+        self._originate = 0.0  # uint64 igtl timestamp
+        self._receive = 0.0  # uint64 igtl timestamp
+        self._transmit = 0.0  # uint64 igtl timestamp
+
+    def setMode(self, mode):
+        """Sets the message mode
+
+        :param int mode: CLOCK_SYNC_REQUEST or CLOCK_SYNC_REPLY
+        """
+        self._mode = int(mode)
+
+    def getMode(self):
+        """Gets the message mode
+
+        :returns: CLOCK_SYNC_REQUEST or CLOCK_SYNC_REPLY
+        """
+        return self._mode
+
+    def setTimes(self, originate, receive=0.0, transmit=0.0):
+        """Sets the exchange timestamps, in seconds since the epoch
+
+        :param float originate: Time the request was sent, in the requester clock
+        :param float receive: Time the request was received, in the responder clock
+        :param float transmit: Time the reply was sent, in the responder clock
+        """
+        self._originate = float(originate)
+        self._receive = float(receive)
+        self._transmit = float(transmit)
+
+    def getTimes(self):
+        """Gets the exchange timestamps
+
+        :returns: originate, receive, transmit times in seconds since the epoch
+        """
+        return self._originate, self._receive, self._transmit
+
+    def _packContent(self, endian=">"):
+        self._content = struct.pack(endian + 'BQQQ', self._mode,
+                                    _timestamp_to_uint64(self._originate),
+                                    _timestamp_to_uint64(self._receive),
+                                    _timestamp_to_uint64(self._transmit))
+
+    def _unpackContent(self, endian=">"):
+        unpacked_body = struct.unpack(endian + 'BQQQ', self._content[0:IGTL_CLOCK_SYNC_SIZE])
+
+        self._mode = unpacked_body[0]
+        self._originate = _uint64_to_timestamp(unpacked_body[1])
+        self._receive = _uint64_to_timestamp(unpacked_body[2])
+        self._transmit = _uint64_to_timestamp(unpacked_body[3])
+
+
+class ClockOffsetEstimator(object):
+    """
+        Estimates the offset between a remote and the local clock from NTP-style exchanges. Among the most recent
+        samples, the one with the smallest round trip time is used, since it is the least affected by queueing delays.
+
+        :ivar collections.deque _samples: The most recent (offset, round trip time) samples
+    """
+
+    def __init__(self, window=16):
+        self._samples = collections.deque(maxlen=window)
+
+    def addSample(self, t0, t1, t2, t3):
+        """Adds a sample from a ping/echo exchange
+
+        :param float t0: Time the request was sent (local clock)
+        :param float t1: Time the request was received (remote clock)
+        :param float t2: Time the reply was sent (remote clock)
+        :param float t3: Time the reply was received (local clock)
+
+        :returns: The (offset, round trip time) of the sample
+        """
+        offset = ((t1 - t0) + (t2 - t3)) / 2.0
+        rtt = (t3 - t0) - (t2 - t1)
+        self._samples.append((offset, rtt))
+        return offset, rtt
+
+    def getNumberOfSamples(self):
+        """Gets the number of samples in the window
+        """
+        return len(self._samples)
+
+    def getOffset(self):
+        """Gets the estimated clock offset, i.e. remote clock - local clock
+
+        :returns: The clock offset in seconds, 0 if no sample was collected
+        """
+        if not self._samples:
+            return 0.0
+        return min(self._samples, key=lambda sample: sample[1])[0]
+
+    def getRoundTripTime(self):
+        """Gets the round trip time of the sample used for the offset estimation
+
+        :returns: The round trip time in seconds, None if no sample was collected
+        """
+        if not self._samples:
+            return None
+        return min(sample[1] for sample in self._samples)
+
+    def reset(self):
+        self._samples.clear()
+
+
+class LatencyHistogram(object):
+    """
+        Rolling window of latency values (seconds), kept in a preallocated ring buffer
+
+        :ivar np.ndarray _values: The ring buffer
+        :ivar int _count: The total number of values added
+    """
+
+    def __init__(self, capacity=10000):
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._count = 0
+
+    def add(self, latency):
+        """Adds a latency value
+
+        :param float latency: The latency in seconds
+        """
+        self._values[self._count % len(self._values)] = latency
+        self._count += 1
+
+    def getValues(self):
+        """Gets the values in the window (not in insertion order)
+
+        :returns: The latency values in seconds
+        """
+        return self._values[:min(self._count, len(self._values))]
+
+    def getCount(self):
+        """Gets the total number of values added, including the ones that already left the window
+
+        :returns: The number of values
+        """
+        return self._count
+
+    def getHistogram(self, bins=50, range=None):
+        """Gets the histogram of the values in the window
+
+        :param bins: The number of bins or the bin edges, as in numpy.histogram
+        :param range: The lower and upper range of the bins, as in numpy.histogram
+
+        :returns: counts, bin edges
+        """
+        return np.histogram(self.getValues(), bins=bins, range=range)
+
+    def getPercentiles(self, percentiles=(50, 95, 99)):
+        """Gets percentiles of the values in the window
+
+        :param percentiles: The percentiles to compute
+
+        :returns: The percentiles in seconds, or None if the window is empty
+        """
+        values = self.getValues()
+        if len(values) == 0:
+            return None
+        return np.percentile(values, percentiles)
+
+    def getStatistics(self):
+        """Gets summary statistics of the values in the window
+
+        :returns: A dictionary with count, mean, min, max, p50, p95 and p99 (in seconds)
+        """
+        values = self.getValues()
+        if len(values) == 0:
+            return {'count': 0}
+        p50, p95, p99 = np.percentile(values, (50, 95, 99))
+        return {'count': len(values), 'mean': float(values.mean()), 'min': float(values.min()),
+                'max': float(values.max()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+    def reset(self):
+        self._count = 0
+
+
+class LatencyProbe(object):
+    """
+        Measures the end-to-end latency of the messages received over a connection. The clock offset between the peers
+        is estimated with ping/echo exchanges of :class:`~pygtlink.ClockSyncMessage` over the same connection, and is
+        used to correct the header timestamps of the received messages before computing their one-way latency.
+
+        The connection can be any object with send(data) and receive(length) methods, e.g.
+        :class:`~pygtlink.ClientSocket` or :class:`~pygtlink.SocketServer`. Both peers must handle the clock sync
+        messages they receive with :func:`~pygtlink.LatencyProbe.handleMessage`.
+
+        :ivar _connection: The connection used to send the clock sync messages
+        :ivar ClockOffsetEstimator _estimator: The clock offset estimator
+        :ivar dict _histograms: The latency histograms by device name
+        :ivar int _replies: The number of clock sync replies received
+    """
+
+    def __init__(self, connection, deviceName="LatencyProbe", window=16, capacity=10000, clock=time.time):
+        self._connection = connection
+        self._deviceName = deviceName
+        self._estimator = ClockOffsetEstimator(window)
+        self._capacity = capacity
+        self._clock = clock
+        self._histograms = {}
+        self._replies = 0
+
+    def sendPing(self):
+        """Sends a clock sync request to the peer
+        """
+        request = ClockSyncMessage()
+        request.setDeviceName(self._deviceName)
+        now = self._clock()
+        request.setTimeStamp(now)
+        request.setTimes(now)
+        request.pack()
+        self._connection.send(request.header + request.body)
+
+    def handleMessage(self, message, receiveTime=None):
+        """Processes a received message. Clock sync requests are answered, clock sync replies update the clock offset
+        estimation, any other message is recorded in the latency histogram of its device.
+        The message body must already be unpacked.
+
+        :param pygtlink.MessageBase message: The received message
+        :param float receiveTime: The time the message was received (local clock). Defaults to now
+
+        :returns: True if the message was a clock sync message, False otherwise
+        """
+        if receiveTime is None:
+            receiveTime = self._clock()
+
+        if not isinstance(message, ClockSyncMessage):
+            self.record(message, receiveTime)
+            return False
+
+        originate, receive, transmit = message.getTimes()
+        if message.getMode() == CLOCK_SYNC_REPLY:
+            self._estimator.addSample(originate, receive, transmit, receiveTime)
+            self._replies += 1
+            return True
+
+        reply = ClockSyncMessage()
+        reply.setDeviceName(self._deviceName)
+        reply.setMode(CLOCK_SYNC_REPLY)
+        now = self._clock()
+        reply.setTimeStamp(now)
+        reply.setTimes(originate, receiveTime, now)
+        reply.pack()
+        self._connection.send(reply.header + reply.body)
+        return True
+
+    def receiveMessage(self):
+        """Receives a message from the connection and processes it with
+        :func:`~pygtlink.LatencyProbe.handleMessage`. Bodies of messages other than clock sync messages are not
+        unpacked.
+
+        :returns: The received message, or None if the connection was closed
+        """
+        message = MessageBase()
+        message.header = self._connection.receive(message.getHeaderSize())
+        if message.header is None or message.unpack() != UNPACK_HEADER:
+            return None
+        receiveTime = self._clock()
+
+        if message.getMessageType() == CLOCK_SYNC_MESSAGE_TYPE:
+            sync = ClockSyncMessage()
+            sync.copyHeader(message)
+            message = sync
+
+        message.body = self._connection.receive(message.getPackBodySize())
+        if message.body is None:
+            return None
+
+        if isinstance(message, ClockSyncMessage):
+            message.unpack()
+        self.handleMessage(message, receiveTime)
+        return message
+
+    def synchronize(self, samples=8):
+        """Runs a number of blocking ping/echo exchanges. The peer must be answering clock sync requests. Messages
+        received in the meantime are recorded in the latency histograms.
+
+        :param int samples: The number of exchanges
+
+        :returns: The estimated clock offset (remote - local) in seconds
+        """
+        for _ in range(samples):
+            expected = self._replies + 1
+            self.sendPing()
+            while self._replies < expected:
+                if self.receiveMessage() is None:
+                    return self.getClockOffset()
+        return self.getClockOffset()
+
+    def record(self, message, receiveTime=None):
+        """Records the one-way latency of a message, computed from its header timestamp corrected by the clock offset
+
+        :param pygtlink.MessageBase message: The received message (at least its header must be unpacked)
+        :param float receiveTime: The time the message was received (local clock). Defaults to now
+
+        :returns: The latency in seconds
+        """
+        if receiveTime is None:
+            receiveTime = self._clock()
+
+        latency = receiveTime - (message.getTimeStamp() - self._estimator.getOffset())
+        device = message.getDeviceName()
+        histogram = self._histograms.get(device)
+        if histogram is None:
+            histogram = self._histograms[device] = LatencyHistogram(self._capacity)
+        histogram.add(latency)
+        return latency
+
+    def getClockOffset(self):
+        """Gets the estimated clock offset (remote clock - local clock) in seconds
+        """
+        return self._estimator.getOffset()
+
+    def getRoundTripTime(self):
+        """Gets the estimated round trip time in seconds, None before the first exchange
+        """
+        return self._estimator.getRoundTripTime()
+
+    def getClockOffsetEstimator(self):
+        """Gets the underlying :class:`~pygtlink.ClockOffsetEstimator`
+        """
+        return self._estimator
+
+    def getDevices(self):
+        """Gets the names of the devices with recorded latencies
+        """
+        return list(self._histograms.keys())
+
+    def getLatencyHistogram(self, deviceName):
+        """Gets the latency histogram of a device
+
+        :param str deviceName: The device name
+
+        :returns: The :class:`~pygtlink.LatencyHistogram` of the device, None if nothing was recorded
+        """
+        return self._histograms.get(deviceName)
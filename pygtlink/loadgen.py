@@ -0,0 +1,300 @@
+"""
+    Synthetic load generator: N producer connections stream a configurable message mix (IMAGE, POSITION, SENSOR) at
+    given rates, to N consumer connections on localhost or to an external IGTL server, and the sustained throughput,
+    the dropped frames, the CPU time per connection and the latency percentiles are reported. The latency of a frame is
+    its receive time minus its header timestamp.
+
+    Usage: python -m pygtlink.loadgen [--connections N] [--duration S] [--image WxH[xD][:dtype][@rate] ...]
+    [--position RATE] [--sensor LENGTH[@RATE]] [--host HOST --port PORT] [--json]
+
+    e.g. python -m pygtlink.loadgen --connections 4 --image 512x512:uint16@30 --position 200 --sensor 6@100
+"""
+from pygtlink.igtl_header import IGTL_HEADER_DEVICE_NAME, IGTL_HEADER_TIMESTAMP_OFFSET
+from pygtlink.image_message2 import ImageMessage2, np2s
+from pygtlink.message_template import MessageTemplate
+from pygtlink.frame_decoder import iterFrames
+from pygtlink.latency import LatencyHistogram
+from pygtlink.transport import TcpTransport, TcpListener
+import argparse
+import heapq
+import json
+import struct
+import threading
+import time
+import numpy as np
+
+__all__ = ['runLoad']
+
+DEFAULT_IMAGE_RATE = 30.0
+DEFAULT_SENSOR_RATE = 100.0
+
+# Offsets of the device name and of the timestamp in the IGTL header
+_TIMESTAMP = struct.Struct('>II')
+
+# Latency values kept per consumer for the percentiles
+_LATENCY_CAPACITY = 100000
+
+
+class _Stream(object):
+    """A message stream of the mix: the subclasses pack its frames with the time they are sent (createFrame()). A
+    stream reuses its messages or templates between frames, so each producer thread has its own streams"""
+
+    def __init__(self, name, deviceName, rate):
+        self.name = name
+        self.deviceName = deviceName
+        self.rate = rate
+
+
+class _ImageStream(_Stream):
+
+    def __init__(self, shape, dtype, rate, index):
+        _Stream.__init__(self, "IMAGE {} {}".format("x".join(str(s) for s in shape), dtype),
+                         "Image{}".format(index), rate)
+        self._data = np.random.randint(0, 256, size=int(np.prod(shape)) * np.dtype(dtype).itemsize,
+                                       dtype=np.uint8).view(dtype).reshape(shape)
+
+    def createFrame(self, timestamp):
+        # a new message per frame, as an imaging device would send
+        msg = ImageMessage2()
+        msg.setDeviceName(self.deviceName)
+        msg.setTimeStamp(timestamp)
+        msg.setSpacing([1, 1, 1])
+        msg.setData(self._data)
+        msg.pack()
+        return [msg.header, msg.body]
+
+
+class _TemplateStream(_Stream):
+
+    def __init__(self, name, template, values, deviceName, rate):
+        _Stream.__init__(self, name, deviceName, rate)
+        self._template = template
+        self._values = values
+
+    def createFrame(self, timestamp):
+        return [self._template.pack(*self._values, timestamp=timestamp)]
+
+
+def _parseImage(spec):
+    # WxH[xD][:dtype][@rate]
+    rate = DEFAULT_IMAGE_RATE
+    dtype = 'uint8'
+    if '@' in spec:
+        spec, rate = spec.split('@')
+        rate = float(rate)
+    if ':' in spec:
+        spec, dtype = spec.split(':')
+    shape = [int(s) for s in spec.lower().split('x')]
+    if not 2 <= len(shape) <= 3 or np.dtype(dtype).name not in np2s:
+        raise ValueError("invalid image {}".format(spec))
+    return shape, np.dtype(dtype).name, rate
+
+
+def _parseSensor(spec):
+    # LENGTH[@RATE]
+    length, _, rate = spec.partition('@')
+    length = int(length)
+    if not 0 < length <= 255:
+        raise ValueError("the sensor length must be in [1, 255]")
+    return length, float(rate) if rate else DEFAULT_SENSOR_RATE
+
+
+def _createStreams(images=(), positionRate=0.0, sensor=None):
+    streams = [_ImageStream(shape, dtype, rate, i) for i, (shape, dtype, rate) in enumerate(images)]
+    if positionRate > 0:
+        streams.append(_TemplateStream("POSITION", MessageTemplate.forPosition("Position"), (0, 0, 0, 0, 0, 0, 1),
+                                       "Position", positionRate))
+    if sensor is not None:
+        length, rate = sensor
+        streams.append(_TemplateStream("SENSOR {}".format(length), MessageTemplate.forSensor("Sensor", length),
+                                       [0.0] * length, "Sensor", rate))
+    return streams
+
+
+class _ConnectionStatistics(object):
+    """The counters of a producer or consumer connection, one entry per stream"""
+
+    def __init__(self, numStreams):
+        self.frames = [0] * numStreams
+        self.bytes = [0] * numStreams
+        self.dropped = [0] * numStreams
+        self.cpuTime = 0.0
+        self.latency = LatencyHistogram(_LATENCY_CAPACITY)
+        self.error = None
+
+
+def _produce(transport, streams, duration, stats):
+    cpu_start = time.thread_time()
+    start = time.monotonic()
+    end = start + duration
+    due = [(start, i) for i in range(len(streams))]
+    heapq.heapify(due)
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                break
+            next_time, i = due[0]
+            if next_time > now:
+                time.sleep(min(next_time, end) - now)
+                continue
+            stream = streams[i]
+            period = 1.0 / stream.rate
+            # the frames the connection could not send in time are dropped, not sent in a burst
+            late = int((now - next_time) / period)
+            if late:
+                stats.dropped[i] += late
+                next_time += late * period
+            buffers = stream.createFrame(time.time())
+            transport.sendBuffers(buffers)
+            stats.frames[i] += 1
+            stats.bytes[i] += sum(len(b) for b in buffers)
+            heapq.heapreplace(due, (next_time + period, i))
+    except OSError as e:
+        stats.error = e
+    finally:
+        stats.cpuTime = time.thread_time() - cpu_start
+        transport.close()
+
+
+def _consume(transport, devices, stats):
+    cpu_start = time.thread_time()
+    add_latency = stats.latency.add
+    try:
+        for header, body in iterFrames(transport):
+            now = time.time()
+            i = devices.get(bytes(header[IGTL_HEADER_DEVICE_NAME]))
+            if i is None:
+                continue
+            stats.frames[i] += 1
+            stats.bytes[i] += len(header) + len(body)
+            sec, frac = _TIMESTAMP.unpack_from(header, IGTL_HEADER_TIMESTAMP_OFFSET)
+            add_latency(now - (sec + frac / 4294967296.0))
+    except OSError as e:
+        stats.error = e
+    finally:
+        stats.cpuTime = time.thread_time() - cpu_start
+        transport.close()
+
+
+def runLoad(images=(), positionRate=0.0, sensor=None, connections=1, duration=10.0, host=None, port=None):
+    """Runs the producer (and consumer) connections and collects their statistics
+
+    :param images: The IMAGE streams, as (shape, dtype, rate) tuples
+    :param float positionRate: The rate of the POSITION stream, 0 for none
+    :param sensor: The SENSOR stream, as a (length, rate) tuple, None for none
+    :param int connections: The number of producer connections, each sending the whole mix
+    :param float duration: The duration of the load (seconds)
+    :param str host: The address of an external server to send to, None to send to consumer connections on localhost
+    :param int port: The port of the external server
+
+    :returns: A dictionary with the run parameters, the sent, received and dropped frames and the throughput of each
+        stream, the latency statistics (seconds), the CPU load of each connection and the connection errors
+    """
+    # the streams the results are reported for, the producers create their own (see _Stream)
+    streams = _createStreams(images, positionRate, sensor)
+    producers = [_ConnectionStatistics(len(streams)) for _ in range(connections)]
+    consumers = []
+    threads = []
+    if host is None:
+        listener = TcpListener('127.0.0.1', 0, backlog=connections)
+        devices = {s.deviceName.encode().ljust(20, b'\x00'): i for i, s in enumerate(streams)}
+        try:
+            for stats in producers:
+                producer = TcpTransport.connect('127.0.0.1', listener.getPort(), noDelay=True)
+                consumer = listener.accept()
+                consumers.append(_ConnectionStatistics(len(streams)))
+                threads.append(threading.Thread(target=_consume, args=(consumer, devices, consumers[-1]),
+                                                name="loadgen consumer", daemon=True))
+                producer_streams = _createStreams(images, positionRate, sensor)
+                threads.append(threading.Thread(target=_produce, args=(producer, producer_streams, duration, stats),
+                                                name="loadgen producer", daemon=True))
+        finally:
+            listener.close()
+    else:
+        for stats in producers:
+            producer = TcpTransport.connect(host, port, noDelay=True)
+            producer_streams = _createStreams(images, positionRate, sensor)
+            threads.append(threading.Thread(target=_produce, args=(producer, producer_streams, duration, stats),
+                                            name="loadgen producer", daemon=True))
+
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    results = {'connections': connections, 'duration': elapsed, 'streams': []}
+    for i, stream in enumerate(streams):
+        sent = sum(stats.frames[i] for stats in producers)
+        sent_bytes = sum(stats.bytes[i] for stats in producers)
+        received = sum(stats.frames[i] for stats in consumers) if consumers else None
+        results['streams'].append({'name': stream.name, 'rate': stream.rate * connections, 'sent': sent,
+                                   'received': received, 'dropped': sum(stats.dropped[i] for stats in producers),
+                                   'framesPerSecond': sent / elapsed, 'bytesPerSecond': sent_bytes / elapsed})
+
+    latencies = np.concatenate([stats.latency.getValues() for stats in consumers] + [np.zeros(0)])
+    results['latency'] = {'count': len(latencies)}
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+        results['latency'].update({'mean': float(latencies.mean()), 'min': float(latencies.min()),
+                                   'max': float(latencies.max()), 'p50': float(p50), 'p95': float(p95),
+                                   'p99': float(p99)})
+    results['producerCpu'] = [stats.cpuTime / elapsed for stats in producers]
+    results['consumerCpu'] = [stats.cpuTime / elapsed for stats in consumers]
+    results['errors'] = [str(stats.error) for stats in producers + consumers if stats.error is not None]
+    return results
+
+
+def _printResults(results):
+    print("{} connection(s), {:.1f} s".format(results['connections'], results['duration']))
+    print("{:28s} {:>9s} {:>9s} {:>9s} {:>9s} {:>10s} {:>9s}".format("stream", "rate/s", "sent", "received",
+                                                                   "dropped", "frames/s", "MB/s"))
+    for s in results['streams']:
+        print("{:28s} {:9.1f} {:9d} {:>9s} {:9d} {:10.1f} {:9.2f}".format(
+            s['name'], s['rate'], s['sent'], "-" if s['received'] is None else str(s['received']), s['dropped'],
+            s['framesPerSecond'], s['bytesPerSecond'] / 1e6))
+    print("total: {:.1f} frames/s, {:.2f} MB/s".format(sum(s['framesPerSecond'] for s in results['streams']),
+                                                        sum(s['bytesPerSecond'] for s in results['streams']) / 1e6))
+    latency = results['latency']
+    if latency['count']:
+        print("latency (ms): p50 {:.3f}  p95 {:.3f}  p99 {:.3f}  max {:.3f}".format(
+            latency['p50'] * 1e3, latency['p95'] * 1e3, latency['p99'] * 1e3, latency['max'] * 1e3))
+    for name in ('producer', 'consumer'):
+        cpu = results[name + 'Cpu']
+        if cpu:
+            print("{} CPU per connection: mean {:.1f}%  max {:.1f}%".format(name, 100 * sum(cpu) / len(cpu),
+                                                                           100 * max(cpu)))
+    for error in results['errors']:
+        print("connection error: {}".format(error))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pygtlink.loadgen", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=1, help="number of producer (and consumer) connections")
+    parser.add_argument('--duration', type=float, default=10.0, help="load duration in seconds")
+    parser.add_argument('--image', action='append', default=[], type=_parseImage, metavar='WxH[xD][:dtype][@rate]',
+                        help="an IMAGE stream, e.g. 512x512:uint16@30 (can be repeated)")
+    parser.add_argument('--position', type=float, default=0.0, metavar='RATE', help="POSITION rate (0 for none)")
+    parser.add_argument('--sensor', type=_parseSensor, default=None, metavar='LENGTH[@RATE]',
+                        help="a SENSOR stream, e.g. 6@100")
+    parser.add_argument('--host', default=None, help="send to an external server instead of local consumers")
+    parser.add_argument('--port', type=int, default=18944, help="the port of the external server")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.image and args.position <= 0 and args.sensor is None:
+        args.image = [_parseImage("256x256")]
+        args.position = 100.0
+    results = runLoad(args.image, args.position, args.sensor, args.connections, args.duration, args.host, args.port)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _printResults(results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+from pygtlink.igtl_header import IGTL_HEADER_SIZE, IGTL_HEADER_TYPE
+from pygtlink.igtl_message_base import MessageBase
+from pygtlink.image_message2 import ImageMessage2
+from pygtlink.sensor_message import SensorMessage
+from pygtlink.status_message import StatusMessage
+from pygtlink.position_message import PositionMessage
+from pygtlink.ndarray_message import NDArrayMessage
+from pygtlink.polydata_message import PolyDataMessage
+import threading
+
+__all__ = ['MessagePool']
+
+# Message classes used by MessagePool.receive() by message type, MessageBase being used for the other types
+DEFAULT_MESSAGE_CLASSES = {'IMAGE': ImageMessage2,
+                           'SENSOR': SensorMessage,
+                           'STATUS': StatusMessage,
+                           'POSITION': PositionMessage,
+                           'NDARRAY': NDArrayMessage,
+                           'POLYDATA': PolyDataMessage}
+
+
+class _PooledMessage(object):
+    """A message with the buffers its header and body are received into"""
+
+    __slots__ = ('message', 'header', 'body')
+
+    def __init__(self, message):
+        self.message = message
+        self.header = bytearray(IGTL_HEADER_SIZE)
+        self.body = bytearray()
+
+
+class MessagePool(object):
+    """
+        Recycles message objects, so that long running receivers do not construct a new message (and allocate new
+        buffers) per frame. :func:`~pygtlink.MessagePool.receive` also receives the header and body straight into
+        buffers owned by the pooled message, which are reused by the next messages of the same class.
+
+        A message obtained from the pool is only valid until it is released: its data (e.g. the array returned by
+        :func:`~pygtlink.ImageMessage2.getData`) views its body buffer, which is overwritten when the message is
+        reused. Use unpack(into=...) or getData(out=...) to keep a copy.
+
+        :ivar dict _free: The released messages by class
+        :ivar dict _inUse: The acquired messages by id
+        :ivar list _headers: The free header buffers: a header is received into one of them, which the pooled message
+            then takes in exchange for its own, so that threads receiving on other connections never share a buffer
+    """
+
+    def __init__(self, capacity=8, messageClasses=None):
+        self._capacity = capacity
+        self._messageClasses = dict(DEFAULT_MESSAGE_CLASSES if messageClasses is None else messageClasses)
+        self._free = {}
+        self._inUse = {}
+        self._headers = []
+        self._created = 0
+        self._reused = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, messageClass=ImageMessage2):
+        """Gets a message from the pool, creating it if none of its class is free. The message is reset as a new
+        message, except for the image geometry and other content fields, which are overwritten when it is unpacked
+
+        :param messageClass: The message class, e.g. :class:`~pygtlink.ImageMessage2`
+
+        :returns: The message
+        """
+        return self._acquire(messageClass).message
+
+    def release(self, message):
+        """Returns a message to the pool. The message and its data must not be used anymore
+
+        :param pygtlink.MessageBase message: A message obtained from the pool
+        """
+        with self._lock:
+            pooled = self._inUse.pop(id(message), None)
+            if pooled is None:
+                return
+            free = self._free.setdefault(type(message), [])
+            if len(free) < self._capacity:
+                free.append(pooled)
+
+    def receive(self, connection, crccheck=0, into=None):
+        """Receives and unpacks a message into a pooled message of the class given by its type
+
+        :param connection: A :class:`~pygtlink.ClientSocket`, :class:`~pygtlink.SocketServer` or
+            :class:`~pygtlink.Transport`
+        :param int crccheck: If 1, the body crc is checked
+        :param into: A preallocated array the message data is decoded into (see :func:`~pygtlink.MessageBase.unpack`)
+
+        :returns: The unpacked message, which must be released, or None if the connection was closed
+        """
+        transport = connection.getTransport() if hasattr(connection, 'getTransport') else connection
+        with self._lock:
+            header = self._headers.pop() if self._headers else bytearray(IGTL_HEADER_SIZE)
+        if not self._receiveInto(transport, memoryview(header)):
+            with self._lock:
+                self._headers.append(header)
+            return None
+
+        message_type = bytes(header[IGTL_HEADER_TYPE]).rstrip(b'\x00').decode('utf-8', 'replace')
+        pooled = self._acquire(self._messageClasses.get(message_type, MessageBase))
+        message = pooled.message
+        pooled.header, header = header, pooled.header
+        with self._lock:
+            self._headers.append(header)
+        message.header = pooled.header
+        message.unpack()
+
+        body_size = message.getBodySizeToRead()
+        if len(pooled.body) < body_size:
+            # a new buffer, since views of the old one may still be referenced
+            pooled.body = bytearray(body_size)
+        body = memoryview(pooled.body)[:body_size]
+        if not self._receiveInto(transport, body):
+            self.release(message)
+            return None
+
+        message.body = body
+        message.unpack(crccheck, into)
+        return message
+
+    def getStatistics(self):
+        """Gets the number of created and reused messages
+
+        :returns: A dictionary with created, reused, free and in use messages
+        """
+        with self._lock:
+            return {'created': self._created, 'reused': self._reused, 'inUse': len(self._inUse),
+                    'free': sum(len(free) for free in self._free.values())}
+
+    def _acquire(self, messageClass):
+        with self._lock:
+            free = self._free.get(messageClass)
+            if free:
+                pooled = free.pop()
+                self._reused += 1
+            else:
+                pooled = None
+                self._created += 1
+        if pooled is None:
+            pooled = _PooledMessage(messageClass())
+        else:
+            self._reset(pooled.message)
+        with self._lock:
+            self._inUse[id(pooled.message)] = pooled
+        return pooled
+
+    @staticmethod
+    def _reset(message):
+        message.header = None
+        message.body = None
+        message._content = None
+        message._messageId = 0
+        message._metaDataMap = None
+        message._metaDataRaw = None
+        message._isHeaderUnpacked = False
+        message._isBodyUnpacked = False
+        message._isBodyPacked = False
+
+    @staticmethod
+    def _receiveInto(transport, view):
+        received = 0
+        while received < len(view):
+            n = transport.recv_into(view[received:], len(view) - received)
+            if not n:
+                return False
+            received += n
+        return True
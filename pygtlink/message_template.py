@@ -0,0 +1,143 @@
+from pygtlink.utils import IGTL_HEADER_VERSION_1, IGTL_HEADER_VERSION_2, CRC64, igtl_sec_to_frac
+from pygtlink.igtl_header import IGTL_HEADER_SIZE, IGTL_HEADER_TIMESTAMP_OFFSET, IGTL_HEADER_CRC_OFFSET
+from pygtlink.position_message import PositionMessage
+from pygtlink.sensor_message import SensorMessage, IGTL_SENSOR_HEADER_SIZE
+from pygtlink.status_message import StatusMessage
+import struct
+import time
+
+__all__ = ['MessageTemplate']
+
+# Offsets of the patched header fields (H12s20s precede the timestamp)
+_TIMESTAMP = struct.Struct('>II')
+_CRC = struct.Struct('>Q')
+
+# Size of the extended header of header version 2 bodies, which precedes the content
+_EXTENDED_HEADER_SIZE = 12
+
+
+class MessageTemplate(object):
+    """
+        A message packed once, sent many times with new values: only the timestamp, the numeric payload and the crc
+        are patched in place (struct.pack_into) in a reusable frame buffer. The header strings, the body size and the
+        constant parts of the body (e.g. the metadata) are never encoded again.
+
+        The payload is a fixed size range of the message content, described by a struct format, e.g. '7f' for the
+        position and quaternion of a POSITION message. Use the for* constructors for the common message types.
+
+        The frame returned by :func:`~pygtlink.MessageTemplate.pack` is overwritten by the next call: send it (or copy
+        it) before.
+
+        :param pygtlink.MessageBase message: The prototype message, with its device name, header version, metadata and
+            the values of the fields which are not patched
+        :param str payloadFormat: The struct format of the payload, without byte order (the payload is big endian)
+        :param int payloadOffset: The offset of the payload in the message content
+
+        :ivar bytearray _frame: The packed header and body
+        :ivar memoryview _body: The body part of _frame, the crc is computed on
+    """
+
+    def __init__(self, message, payloadFormat, payloadOffset=0):
+        if not message.pack():
+            raise ValueError("the prototype message could not be packed")
+        self._messageType = message.getMessageType()
+        self._frame = bytearray(message.header)
+        self._frame += message.body
+        self._view = memoryview(self._frame)
+        self._body = self._view[IGTL_HEADER_SIZE:]
+
+        self._payload = struct.Struct('>' + payloadFormat)
+        content_offset = _EXTENDED_HEADER_SIZE if message.getHeaderVersion() >= IGTL_HEADER_VERSION_2 else 0
+        self._payloadOffset = IGTL_HEADER_SIZE + content_offset + payloadOffset
+        if self._payloadOffset + self._payload.size > len(self._frame):
+            raise ValueError("payload {} at offset {} exceeds the message body".format(payloadFormat, payloadOffset))
+
+    @classmethod
+    def forPosition(cls, deviceName, headerVersion=IGTL_HEADER_VERSION_1):
+        """Creates the template of a POSITION message, packed with the position and quaternion (7 float32)
+
+        :param str deviceName: The device name
+        :param int headerVersion: The header version
+
+        :returns: The template
+        """
+        msg = PositionMessage()
+        msg.setDeviceName(deviceName)
+        msg.setHeaderVersion(headerVersion)
+        return cls(msg, '7f')
+
+    @classmethod
+    def forSensor(cls, deviceName, length, unit=0, status=0, headerVersion=IGTL_HEADER_VERSION_1):
+        """Creates the template of a SENSOR message, packed with the sensor data (length float64)
+
+        :param str deviceName: The device name
+        :param int length: The number of sensor values
+        :param int unit: The unit (uint64)
+        :param int status: The status (uint8)
+        :param int headerVersion: The header version
+
+        :returns: The template
+        """
+        msg = SensorMessage()
+        msg.setDeviceName(deviceName)
+        msg.setHeaderVersion(headerVersion)
+        msg.setLength(length)
+        msg.setUnit(unit)
+        msg.setStatus(status)
+        msg.setData([0.0] * length)
+        return cls(msg, '{}d'.format(length), IGTL_SENSOR_HEADER_SIZE)
+
+    @classmethod
+    def forStatus(cls, deviceName, errorName="", message="", headerVersion=IGTL_HEADER_VERSION_1):
+        """Creates the template of a STATUS message, packed with the code (uint16) and the sub code (int64). The error
+        name and the message are constant
+
+        :param str deviceName: The device name
+        :param str errorName: The error name
+        :param str message: The status message
+        :param int headerVersion: The header version
+
+        :returns: The template
+        """
+        msg = StatusMessage()
+        msg.setDeviceName(deviceName)
+        msg.setHeaderVersion(headerVersion)
+        msg.setErrorName(errorName)
+        msg.setMessage(message)
+        return cls(msg, 'Hq')
+
+    def getMessageType(self):
+        return self._messageType
+
+    def getSize(self):
+        """Gets the size of the packed frame (header and body)
+        """
+        return len(self._frame)
+
+    def pack(self, *values, timestamp=None):
+        """Patches the timestamp, the payload and the crc of the frame
+
+        :param values: The payload values, e.g. x, y, z, ox, oy, oz, w for a POSITION template
+        :param float timestamp: The timestamp in seconds since the epoch, time.time() if None
+
+        :returns: The frame (a memoryview of the reused buffer), valid until the next call
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        sec = int(timestamp)
+        frame = self._frame
+        # same fraction as MessageBase.setTimeStamp(), so that the template and the message classes agree bit for bit
+        _TIMESTAMP.pack_into(frame, IGTL_HEADER_TIMESTAMP_OFFSET, sec, igtl_sec_to_frac(timestamp - sec))
+        self._payload.pack_into(frame, self._payloadOffset, *values)
+        _CRC.pack_into(frame, IGTL_HEADER_CRC_OFFSET, CRC64(self._body))
+        return self._view
+
+    def send(self, connection, *values, timestamp=None):
+        """Patches the frame (see :func:`~pygtlink.MessageTemplate.pack`) and sends it
+
+        :param connection: A :class:`~pygtlink.ClientSocket`, :class:`~pygtlink.SocketServer` or
+            :class:`~pygtlink.Transport`
+        :param values: The payload values
+        :param float timestamp: The timestamp in seconds since the epoch, time.time() if None
+        """
+        connection.send(self.pack(*values, timestamp=timestamp))
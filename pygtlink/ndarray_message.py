@@ -0,0 +1,100 @@
+from pygtlink.utils import IGTL_HEADER_VERSION_1
+from pygtlink.igtl_message_base import MessageBase
+import struct
+import numpy as np
+
+__all__ = ['NDArrayMessage']
+
+# Scalar types of the NDARRAY message: numpy dtype name by type code, and back
+NDARRAY_TYPES = {2: 'int8', 3: 'uint8', 4: 'int16', 5: 'uint16', 6: 'int32', 7: 'uint32', 10: 'float32',
+                 11: 'float64', 13: 'complex128'}
+_NDARRAY_TYPE_CODES = {v: k for k, v in NDARRAY_TYPES.items()}
+
+# Type (uint8) and dimension (uint8), followed by the size of each dimension (uint16[dim])
+IGTL_NDARRAY_HEADER_SIZE = 2
+
+_EMPTY_ARRAY = np.zeros(0, dtype=np.float64)
+_EMPTY_ARRAY.setflags(write=False)
+
+
+class NDArrayMessage(MessageBase):
+    """
+            The class implements the openIgtLink NDARRAY message: an array of any shape (up to 255 dimensions of up to
+            65535 elements) and any of the NDARRAY scalar types (int8 to uint32, float32, float64 and complex128).
+
+            The array is written to the body with a single conversion to the big endian wire dtype, and decoded as a
+            view over the body (in the wire byte order), with no copy.
+
+            :ivar nd.array _array: The array
+    """
+
+    __slots__ = ('_array',)
+
+    def __init__(self):
+        MessageBase.__init__(self)
+
+        # Setting std header
+        self._messageType = "NDARRAY"
+        self._headerVersion = IGTL_HEADER_VERSION_1
+
+        self._array = _EMPTY_ARRAY
+
+    def setArray(self, array):
+        """Sets the array. It is not copied: it must not be modified until the message is packed
+
+        :param array: The array, whose dtype must be one of the NDARRAY scalar types (any byte order)
+
+        :returns: True if the array was correctly set, False otherwise
+        """
+        array = np.asarray(array)
+        if array.dtype.name not in _NDARRAY_TYPE_CODES or array.ndim > 255 or \
+                any(size > 0xFFFF for size in array.shape):
+            return False
+        self._array = array
+        return True
+
+    def getArray(self, out=None):
+        """Gets the array. After unpacking, the array is a view over the message body (in the wire byte order)
+
+        :param out: A preallocated array the array is copied (and converted) into, with the same shape
+
+        :returns: The array, or out
+        """
+        if out is None:
+            return self._array
+        if out.shape != self._array.shape:
+            raise ValueError("out has shape {}, expected {}".format(out.shape, self._array.shape))
+        np.copyto(out, self._array, casting='unsafe')
+        return out
+
+    def getScalarType(self):
+        """Gets the NDARRAY scalar type code of the array
+
+        :returns: The scalar type code, e.g. 11 for float64
+        """
+        return _NDARRAY_TYPE_CODES[self._array.dtype.name]
+
+    def _unpackInto(self, into):
+        self._array = self.getArray(out=into)
+
+    def _packContent(self, endian=">"):
+        array = self._array
+        header_size = IGTL_NDARRAY_HEADER_SIZE + 2 * array.ndim
+        content = bytearray(header_size + array.nbytes)
+        struct.pack_into(endian + 'BB{}H'.format(array.ndim), content, 0, self.getScalarType(), array.ndim,
+                         *array.shape)
+
+        # the array is converted (byte swapped if needed) straight into the content
+        wire = np.frombuffer(content, dtype=array.dtype.newbyteorder(endian), offset=header_size)
+        np.copyto(wire.reshape(array.shape), array, casting='equiv')
+        self._content = content
+
+    def _unpackContent(self, endian=">"):
+        scalar_type, dim = struct.unpack_from(endian + 'BB', self._content, 0)
+        shape = struct.unpack_from(endian + '{}H'.format(dim), self._content, IGTL_NDARRAY_HEADER_SIZE)
+        dtype = np.dtype(NDARRAY_TYPES[scalar_type]).newbyteorder(endian)
+
+        # decoded as a view over the body
+        count = int(np.prod(shape, dtype=np.int64))
+        self._array = np.frombuffer(self._content, dtype=dtype, count=count,
+                                    offset=IGTL_NDARRAY_HEADER_SIZE + 2 * dim).reshape(shape)
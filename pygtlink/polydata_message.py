@@ -0,0 +1,324 @@
+from pygtlink.utils import IGTL_HEADER_VERSION_1
+from pygtlink.igtl_message_base import MessageBase
+import struct
+import numpy as np
+
+__all__ = ['PolyDataMessage']
+
+# Point count, then the (number of cells, byte size) of the vertices, lines, polygons and triangle strips, then the
+# number of attributes
+_POLYDATA_HEADER = struct.Struct('>10I')
+IGTL_POLYDATA_HEADER_SIZE = _POLYDATA_HEADER.size
+
+# Attribute header: type (uint8), number of components (uint8), number of tuples (uint32)
+_ATTRIBUTE_HEADER_DTYPE = np.dtype([('type', 'u1'), ('components', 'u1'), ('n', '>u4')])
+
+_CELL_KINDS = ('vertices', 'lines', 'polygons', 'triangleStrips')
+
+_POINT_DTYPE = np.dtype('>f4')
+_CELL_DTYPE = np.dtype('>u4')
+_ATTRIBUTE_DTYPE = np.dtype('>f4')
+
+_EMPTY_POINTS = np.zeros((0, 3), dtype=np.float32)
+_EMPTY_POINTS.setflags(write=False)
+_EMPTY_CELLS = np.zeros(0, dtype=np.uint32)
+_EMPTY_CELLS.setflags(write=False)
+
+
+def _toLegacyCells(cells):
+    """Converts cells to the legacy cell array of the wire: the point count of each cell followed by its point ids
+
+    :param cells: A (number of cells, points per cell) array, or a (offsets, connectivity) pair where the ids of cell i
+        are connectivity[offsets[i]:offsets[i + 1]]. The offsets need not start at 0 (e.g. a slice of the offsets of
+        a larger mesh), the ids out of offsets[0]:offsets[-1] are then not sent
+
+    :returns: The number of cells and the cell array (uint32)
+    """
+    if isinstance(cells, tuple):
+        offsets, connectivity = (np.asarray(a) for a in cells)
+        if offsets.ndim != 1 or connectivity.ndim != 1 or len(offsets) == 0:
+            raise ValueError("invalid offsets and connectivity")
+        offsets = offsets.astype(np.int64, copy=False)
+        if offsets[0] < 0 or offsets[-1] > len(connectivity) or np.any(np.diff(offsets) < 0):
+            raise ValueError("invalid offsets and connectivity")
+        # the cell positions in the legacy array are computed from offsets starting at 0
+        connectivity = connectivity[offsets[0]:offsets[-1]]
+        offsets = offsets - offsets[0]
+        count = len(offsets) - 1
+        legacy = np.empty(count + len(connectivity), dtype=np.uint32)
+        positions = offsets[:-1] + np.arange(count)
+        legacy[positions] = np.diff(offsets)
+        ids = np.ones(len(legacy), dtype=bool)
+        ids[positions] = False
+        legacy[ids] = connectivity
+        return count, legacy
+
+    cells = np.asarray(cells)
+    if cells.ndim != 2:
+        raise ValueError("cells must be a 2D array or an (offsets, connectivity) pair")
+    legacy = np.empty((cells.shape[0], cells.shape[1] + 1), dtype=np.uint32)
+    legacy[:, 0] = cells.shape[1]
+    legacy[:, 1:] = cells
+    return cells.shape[0], legacy.reshape(-1)
+
+
+class PolyDataMessage(MessageBase):
+    """
+            The class implements the openIgtLink POLYDATA message: a surface mesh with its points (float32), vertices,
+            lines, polygons and triangle strips (uint32 point ids) and point or cell attributes (float32).
+
+            All the parts are packed and unpacked as whole arrays: a mesh is written to the body with one conversion
+            per array, and decoded as views over the body (in the wire byte order), with no copy. The cells are
+            returned in the legacy cell array format of the wire (the point count of each cell followed by its point
+            ids, as e.g. the faces of a pyvista.PolyData), or as a (number of cells, points per cell) array when all
+            the cells have the same size (see :func:`~pygtlink.PolyDataMessage.getPolygons`).
+
+            :ivar nd.array _points: The points, a (number of points, 3) array
+            :ivar dict _cells: The (number of cells, legacy cell array) of the vertices, lines, polygons and triangle
+                strips
+            :ivar list _attributes: The attributes, as (name, type, array) with one row per point or cell
+    """
+
+    # Attribute types, the cell bit (0x10) is set for cell attributes
+    POINT_SCALAR = 0x00
+    POINT_VECTOR = 0x01
+    POINT_NORMAL = 0x02
+    POINT_TENSOR = 0x03
+    POINT_RGBA = 0x04
+    POINT_TCOORDS = 0x05
+    CELL_SCALAR = 0x10
+    CELL_VECTOR = 0x11
+    CELL_NORMAL = 0x12
+    CELL_TENSOR = 0x13
+    CELL_RGBA = 0x14
+    CELL_TCOORDS = 0x15
+
+    # Number of components of the attribute types (without the cell bit), None if it is given by the data
+    _COMPONENTS = {0x00: None, 0x01: 3, 0x02: 3, 0x03: 9, 0x04: 4, 0x05: None}
+    _MAX_COMPONENTS = {0x00: 127, 0x05: 3}
+
+    __slots__ = ('_points', '_cells', '_attributes')
+
+    def __init__(self):
+        MessageBase.__init__(self)
+
+        # Setting std header
+        self._messageType = "POLYDATA"
+        self._headerVersion = IGTL_HEADER_VERSION_1
+
+        self._points = _EMPTY_POINTS
+        self._cells = {kind: (0, _EMPTY_CELLS) for kind in _CELL_KINDS}
+        self._attributes = []
+
+    def setPoints(self, points):
+        """Sets the points
+
+        :param points: A (number of points, 3) array, converted to float32 when the message is packed
+
+        :returns: True if the points were correctly set, False otherwise
+        """
+        points = np.asarray(points)
+        if points.ndim != 2 or points.shape[1] != 3:
+            return False
+        self._points = points
+        return True
+
+    def getPoints(self):
+        """Gets the points. After unpacking, they are a float32 view over the message body
+
+        :returns: A (number of points, 3) array
+        """
+        return self._points
+
+    def setVertices(self, cells):
+        """Sets the vertices (see :func:`~pygtlink.PolyDataMessage.setPolygons`)
+        """
+        return self._setCells('vertices', cells)
+
+    def getVertices(self, uniform=False):
+        """Gets the vertices (see :func:`~pygtlink.PolyDataMessage.getPolygons`)
+        """
+        return self._getCells('vertices', uniform)
+
+    def setLines(self, cells):
+        """Sets the lines (polylines) (see :func:`~pygtlink.PolyDataMessage.setPolygons`)
+        """
+        return self._setCells('lines', cells)
+
+    def getLines(self, uniform=False):
+        """Gets the lines (see :func:`~pygtlink.PolyDataMessage.getPolygons`)
+        """
+        return self._getCells('lines', uniform)
+
+    def setPolygons(self, cells):
+        """Sets the polygons
+
+        :param cells: A (number of cells, points per cell) array of point ids, e.g. the triangles of a mesh, or an
+            (offsets, connectivity) pair for cells of different sizes, the ids of cell i being
+            connectivity[offsets[i]:offsets[i + 1]]
+
+        :returns: True if the cells were correctly set, False otherwise
+        """
+        return self._setCells('polygons', cells)
+
+    def getPolygons(self, uniform=False):
+        """Gets the polygons. After unpacking, they are a uint32 view over the message body
+
+        :param bool uniform: If True, the cells are returned as a (number of cells, points per cell) array, which
+            requires all the cells to have the same size. Otherwise in the legacy cell array format
+
+        :returns: The cells
+        """
+        return self._getCells('polygons', uniform)
+
+    def setTriangleStrips(self, cells):
+        """Sets the triangle strips (see :func:`~pygtlink.PolyDataMessage.setPolygons`)
+        """
+        return self._setCells('triangleStrips', cells)
+
+    def getTriangleStrips(self, uniform=False):
+        """Gets the triangle strips (see :func:`~pygtlink.PolyDataMessage.getPolygons`)
+        """
+        return self._getCells('triangleStrips', uniform)
+
+    def getNumberOfCells(self):
+        """Gets the number of cells of each kind
+
+        :returns: A dictionary with the number of vertices, lines, polygons and triangleStrips
+        """
+        return {kind: self._cells[kind][0] for kind in _CELL_KINDS}
+
+    def addAttribute(self, name, data, attributeType=POINT_SCALAR):
+        """Adds a point or cell attribute
+
+        :param str name: The attribute name
+        :param data: The attribute data, with one row per point or cell (a 1D array for a single component), converted
+            to float32 when the message is packed
+        :param int attributeType: The attribute type, e.g. PolyDataMessage.POINT_NORMAL or PolyDataMessage.CELL_SCALAR
+
+        :returns: True if the attribute was correctly added, False otherwise
+        """
+        data = np.asarray(data)
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+        kind = attributeType & 0x0F
+        if data.ndim != 2 or attributeType & ~0x1F or kind not in self._COMPONENTS:
+            return False
+        components = self._COMPONENTS[kind]
+        if components is None:
+            if not 0 < data.shape[1] <= self._MAX_COMPONENTS[kind]:
+                return False
+        elif data.shape[1] != components:
+            return False
+        self._attributes.append((name, attributeType, data))
+        return True
+
+    def getAttributes(self):
+        """Gets the attributes. After unpacking, their data are float32 views over the message body
+
+        :returns: A list of (name, type, data) tuples, data having one row per point or cell
+        """
+        return list(self._attributes)
+
+    def getAttribute(self, name):
+        """Gets the data of an attribute
+
+        :param str name: The attribute name
+
+        :returns: The attribute data, None if there is no attribute with this name
+        """
+        for attribute_name, _, data in self._attributes:
+            if attribute_name == name:
+                return data
+        return None
+
+    def clearAttributes(self):
+        self._attributes = []
+
+    def _setCells(self, kind, cells):
+        try:
+            self._cells[kind] = _toLegacyCells(cells)
+        except (ValueError, TypeError):
+            return False
+        return True
+
+    def _getCells(self, kind, uniform):
+        count, legacy = self._cells[kind]
+        if not uniform:
+            return legacy
+        if count == 0:
+            return legacy.reshape(0, 0)
+        size = int(legacy[0])
+        if len(legacy) != count * (size + 1) or np.any(legacy[::size + 1] != size):
+            raise ValueError("the {} do not all have the same size".format(kind))
+        return legacy.reshape(count, size + 1)[:, 1:]
+
+    def _packContent(self, endian=">"):
+        names = b''.join(name.encode('utf-8') + b'\x00' for name, _, _ in self._attributes)
+        if len(names) % 2:
+            names += b'\x00'
+
+        cells = [self._cells[kind] for kind in _CELL_KINDS]
+        header_fields = [len(self._points)]
+        for count, legacy in cells:
+            header_fields += [count, legacy.nbytes]
+        header_fields.append(len(self._attributes))
+
+        points_size = self._points.size * _POINT_DTYPE.itemsize
+        attributes_size = sum(data.size for _, _, data in self._attributes) * _ATTRIBUTE_DTYPE.itemsize
+        attribute_headers_size = len(self._attributes) * _ATTRIBUTE_HEADER_DTYPE.itemsize
+        content = bytearray(IGTL_POLYDATA_HEADER_SIZE + points_size + sum(legacy.nbytes for _, legacy in cells) +
+                            attribute_headers_size + len(names) + attributes_size)
+
+        # each array is converted (byte swapped) straight into the content
+        _POLYDATA_HEADER.pack_into(content, 0, *header_fields)
+        offset = IGTL_POLYDATA_HEADER_SIZE
+        offset = self._write(content, offset, self._points, _POINT_DTYPE)
+        for _, legacy in cells:
+            offset = self._write(content, offset, legacy, _CELL_DTYPE)
+
+        headers = np.frombuffer(content, dtype=_ATTRIBUTE_HEADER_DTYPE, count=len(self._attributes), offset=offset)
+        for i, (_, attribute_type, data) in enumerate(self._attributes):
+            headers[i] = (attribute_type, data.shape[1], data.shape[0])
+        offset += attribute_headers_size
+        content[offset:offset + len(names)] = names
+        offset += len(names)
+        for _, _, data in self._attributes:
+            offset = self._write(content, offset, data, _ATTRIBUTE_DTYPE)
+        self._content = content
+
+    @staticmethod
+    def _write(content, offset, array, dtype):
+        wire = np.frombuffer(content, dtype=dtype, count=array.size, offset=offset)
+        np.copyto(wire.reshape(array.shape), array, casting='unsafe')
+        return offset + wire.nbytes
+
+    def _unpackContent(self, endian=">"):
+        content = self._content
+        header_fields = _POLYDATA_HEADER.unpack_from(content, 0)
+        offset = IGTL_POLYDATA_HEADER_SIZE
+
+        npoints = header_fields[0]
+        self._points = np.frombuffer(content, dtype=_POINT_DTYPE, count=npoints * 3, offset=offset).reshape(npoints, 3)
+        offset += self._points.nbytes
+
+        self._cells = {}
+        for i, kind in enumerate(_CELL_KINDS):
+            count, size = header_fields[1 + 2 * i], header_fields[2 + 2 * i]
+            self._cells[kind] = (count, np.frombuffer(content, dtype=_CELL_DTYPE, count=size // 4, offset=offset))
+            offset += size
+
+        nattributes = header_fields[9]
+        headers = np.frombuffer(content, dtype=_ATTRIBUTE_HEADER_DTYPE, count=nattributes, offset=offset)
+        offset += headers.nbytes
+        attributes = headers.tolist()
+        data_size = sum(n * components for _, components, n in attributes) * _ATTRIBUTE_DTYPE.itemsize
+        names_end = len(content) - data_size
+        names = bytes(content[offset:names_end]).split(b'\x00')[:nattributes]
+        offset = names_end
+
+        self._attributes = []
+        for name, (attribute_type, components, n) in zip(names, attributes):
+            data = np.frombuffer(content, dtype=_ATTRIBUTE_DTYPE, count=n * components, offset=offset)
+            self._attributes.append((name.decode('utf-8'), attribute_type, data.reshape(n, components)))
+            offset += data.nbytes
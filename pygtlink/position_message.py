@@ -1,4 +1,6 @@
-from pygtlink import *
+from pygtlink.utils import IGTL_HEADER_VERSION_1
+from pygtlink.igtl_message_base import MessageBase
+import struct
 
 __all__ = ['PositionMessage']
 
@@ -20,6 +22,8 @@ class PositionMessage(MessageBase):
         :ivar float _w: The fourth component of the orientation quaternion
     """
 
+    __slots__ = ('_x', '_y', '_z', '_ox', '_oy', '_oz', '_w')
+
     def __init__(self):
         MessageBase.__init__(self)
 
@@ -81,20 +85,18 @@ class PositionMessage(MessageBase):
 
         # set the command header
 
-        self.body = struct.pack(endian + '7f',
-                                 self._x,
-                                 self._y,
-                                 self._z,
-                                 self._ox,
-                                 self._oy,
-                                 self._oz,
-                                 self._w)
-
-        self._bodySize = len(self.body)
+        self._content = struct.pack(endian + '7f',
+                                    self._x,
+                                    self._y,
+                                    self._z,
+                                    self._ox,
+                                    self._oy,
+                                    self._oz,
+                                    self._w)
 
     def _unpackContent(self,  endian=">"):
 
-        img_binary_header = self.body[0:IGTL_STATUS_HEADER_SIZE]
+        img_binary_header = self._content[0:IGTL_STATUS_HEADER_SIZE]
         unpacked_header = struct.unpack(endian + '7f', img_binary_header)
 
         self._x = unpacked_header[0]
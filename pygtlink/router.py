@@ -0,0 +1,255 @@
+from pygtlink.utils import CRC64
+from pygtlink.igtl_header import IGTL_HEADER_TYPE, IGTL_HEADER_DEVICE_NAME, IGTL_HEADER_CRC_OFFSET
+from pygtlink.frame_decoder import FrameDecoder
+import asyncio
+import logging
+import struct
+import time
+
+__all__ = ['Router']
+
+# Default limit of the data queued for a destination: frames for a destination above it are dropped
+DEFAULT_WRITE_BUFFER_LIMIT = 4 * 1024 * 1024
+
+# Maximum number of (message type, device name) routing decisions cached: the names are chosen by the peers
+_DECISION_CACHE_SIZE = 4096
+
+_HEADER_CRC = struct.Struct('>Q')
+
+
+class _Route(object):
+    """A routing rule and its statistics"""
+
+    def __init__(self, destination, messageType, deviceName):
+        self.destination = destination
+        self.messageType = messageType
+        self.deviceName = deviceName
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+
+    def matches(self, messageType, deviceName):
+        return (self.messageType is None or self.messageType == messageType) and \
+               (self.deviceName is None or self.deviceName == deviceName)
+
+
+class _PeerProtocol(asyncio.BufferedProtocol):
+    """A connection of the router: frames are received straight into a FrameDecoder buffer and routed as they are"""
+
+    def __init__(self, router, name):
+        self.router = router
+        self.name = name
+        self.decoder = FrameDecoder(maxBodySize=router._maxBodySize)
+        self.transport = None
+        self.closed = asyncio.get_event_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.router._addPeer(self)
+
+    def get_buffer(self, sizehint):
+        return self.decoder.getBuffer()
+
+    def buffer_updated(self, nbytes):
+        self.decoder.bufferUpdated(nbytes)
+        try:
+            frames = self.decoder.frames()
+        except ValueError as e:
+            logging.info("Router peer {} closed: {}".format(self.name, e))
+            self.transport.close()
+            return
+        route = self.router._route
+        for header, body in frames:
+            route(self, header, body)
+
+    def connection_lost(self, exc):
+        self.router._removePeer(self)
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+
+class Router(object):
+    """
+        An asyncio IGTL hub: it reads only the 58 byte header of the frames received from its peers and forwards the
+        untouched header and body to the destinations given by (message type, device name) rules. Frames are not
+        unpacked nor copied: they are received into a :class:`~pygtlink.FrameDecoder` buffer and written from it (the
+        event loop only copies what a destination socket does not accept at once).
+
+        Peers are named: a route forwards to all the connected peers with its destination name (a frame is never sent
+        back to the peer it came from). Any peer can both produce and consume frames, e.g. a tracker connected with
+        :func:`~pygtlink.Router.connect` and the consumers accepted by :func:`~pygtlink.Router.listen`. All the peers
+        are handled on one event loop.
+
+        A destination which does not keep up (more than writeBufferLimit bytes queued) drops frames, so that it does
+        not slow down the producer nor the other destinations.
+
+        Requires Python >= 3.7 (asyncio.BufferedProtocol).
+
+        :param bool crcCheck: If True, the body crc of each frame is checked and the corrupted frames are dropped.
+            Otherwise the crc is passed through unchecked
+        :param int maxBodySize: The maximum accepted body size, None for no limit. A peer sending a larger body is
+            disconnected
+        :param int writeBufferLimit: The maximum size of the data queued for a destination
+
+        :ivar list _routes: The routing rules
+        :ivar dict _peers: The connected peers by name, each name being a set of connections
+        :ivar dict _decisions: The routes matching each (message type, device name) seen, as raw header fields. It is
+            cleared when it reaches _DECISION_CACHE_SIZE entries
+    """
+
+    def __init__(self, crcCheck=False, maxBodySize=None, writeBufferLimit=DEFAULT_WRITE_BUFFER_LIMIT):
+        self._crcCheck = crcCheck
+        self._maxBodySize = maxBodySize
+        self._writeBufferLimit = writeBufferLimit
+        self._routes = []
+        self._peers = {}
+        self._decisions = {}
+        self._servers = []
+        self._receivedFrames = 0
+        self._unroutedFrames = 0
+        self._crcErrors = 0
+        self._startTime = time.monotonic()
+
+    def addRoute(self, destination, messageType=None, deviceName=None):
+        """Adds a routing rule. A frame is forwarded once to each destination of the rules it matches
+
+        :param str destination: The name of the destination peers
+        :param str messageType: The message type, None for any type
+        :param str deviceName: The device name, None for any device
+        """
+        self._routes.append(_Route(destination, messageType, deviceName))
+        self._decisions.clear()
+
+    def removeRoute(self, destination, messageType=None, deviceName=None):
+        """Removes a routing rule
+
+        :param str destination: The name of the destination peers
+        :param str messageType: The message type of the rule
+        :param str deviceName: The device name of the rule
+        """
+        self._routes = [route for route in self._routes if (route.destination, route.messageType, route.deviceName)
+                        != (destination, messageType, deviceName)]
+        self._decisions.clear()
+
+    async def listen(self, host, port, name=None):
+        """Accepts peers on a TCP port
+
+        :param str host: The address to listen on
+        :param int port: The port, 0 for any free port
+        :param str name: The name given to the accepted peers, their address if None
+
+        :returns: The asyncio server
+        """
+        loop = asyncio.get_event_loop()
+
+        def factory():
+            return _PeerProtocol(self, name)
+
+        server = await loop.create_server(factory, host, port)
+        self._servers.append(server)
+        return server
+
+    async def connect(self, name, host, port):
+        """Connects to a peer, e.g. a tracker serving its frames
+
+        :param str name: The peer name
+        :param str host: The peer address
+        :param int port: The peer port
+        """
+        loop = asyncio.get_event_loop()
+        await loop.create_connection(lambda: _PeerProtocol(self, name), host, port)
+
+    def getPeerNames(self):
+        """Gets the names of the connected peers
+        """
+        return [name for name, peers in self._peers.items() if peers]
+
+    def getStatistics(self):
+        """Gets the throughput of each route
+
+        :returns: A dictionary with the received, unrouted and corrupted (crc error) frame counts, and routes: a list
+            with one dictionary per route (destination, messageType, deviceName, frames, bytes, dropped,
+            framesPerSecond, bytesPerSecond)
+        """
+        elapsed = max(time.monotonic() - self._startTime, 1e-9)
+        routes = [{'destination': route.destination, 'messageType': route.messageType,
+                   'deviceName': route.deviceName, 'frames': route.frames, 'bytes': route.bytes,
+                   'dropped': route.dropped, 'framesPerSecond': route.frames / elapsed,
+                   'bytesPerSecond': route.bytes / elapsed} for route in self._routes]
+        return {'received': self._receivedFrames, 'unrouted': self._unroutedFrames, 'crcErrors': self._crcErrors,
+                'routes': routes}
+
+    def resetStatistics(self):
+        """Resets the counters and the time the rates are computed from
+        """
+        for route in self._routes:
+            route.frames = route.bytes = route.dropped = 0
+        self._receivedFrames = self._unroutedFrames = self._crcErrors = 0
+        self._startTime = time.monotonic()
+
+    async def close(self):
+        """Stops listening and closes all the peer connections
+        """
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        peers = [peer for peers in self._peers.values() for peer in peers]
+        for peer in peers:
+            peer.transport.close()
+        for peer in peers:
+            await peer.closed
+
+    def _addPeer(self, peer):
+        if peer.name is None:
+            peer.name = "{}:{}".format(*peer.transport.get_extra_info('peername')[:2])
+        peer.transport.set_write_buffer_limits(high=self._writeBufferLimit)
+        self._peers.setdefault(peer.name, set()).add(peer)
+        logging.info("Router peer {} connected".format(peer.name))
+
+    def _removePeer(self, peer):
+        peers = self._peers.get(peer.name)
+        if peers is not None:
+            peers.discard(peer)
+            if not peers:
+                del self._peers[peer.name]
+        logging.info("Router peer {} disconnected".format(peer.name))
+
+    def _decide(self, key):
+        messageType = key[0].rstrip(b'\x00').decode('utf-8', 'replace')
+        deviceName = key[1].rstrip(b'\x00').decode('utf-8', 'replace')
+        routes = [route for route in self._routes if route.matches(messageType, deviceName)]
+        if len(self._decisions) >= _DECISION_CACHE_SIZE:
+            self._decisions.clear()
+        self._decisions[key] = routes
+        return routes
+
+    def _route(self, source, header, body):
+        self._receivedFrames += 1
+        key = (bytes(header[IGTL_HEADER_TYPE]), bytes(header[IGTL_HEADER_DEVICE_NAME]))
+        routes = self._decisions.get(key)
+        if routes is None:
+            routes = self._decide(key)
+        if not routes:
+            self._unroutedFrames += 1
+            return
+
+        if self._crcCheck and CRC64(body) != _HEADER_CRC.unpack_from(header, IGTL_HEADER_CRC_OFFSET)[0]:
+            self._crcErrors += 1
+            return
+
+        size = len(header) + len(body)
+        sent_to = set()
+        for route in routes:
+            for peer in self._peers.get(route.destination, ()):
+                if peer is source or peer in sent_to:
+                    continue
+                sent_to.add(peer)
+                if peer.transport.get_write_buffer_size() > self._writeBufferLimit:
+                    route.dropped += 1
+                    continue
+                # two writes rather than writelines(), which joins the buffers (a copy) before Python 3.12
+                peer.transport.write(header)
+                peer.transport.write(body)
+                route.frames += 1
+                route.bytes += size
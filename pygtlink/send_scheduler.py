@@ -0,0 +1,248 @@
+from pygtlink.latency import LatencyHistogram
+import collections
+import logging
+import threading
+import time
+
+__all__ = ['SendScheduler', 'PRIORITY_HIGH', 'PRIORITY_NORMAL', 'PRIORITY_LOW']
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+# Default priority classes by message type: small control/tracking messages go before bulk data
+DEFAULT_PRIORITIES = {'STATUS': PRIORITY_HIGH,
+                      'POSITION': PRIORITY_HIGH,
+                      'TRANSFORM': PRIORITY_HIGH,
+                      'IMAGE': PRIORITY_LOW}
+
+
+def _snapshot(buffer):
+    # the queued frames must not change until they are sent: mutable buffers (e.g. the frame of a MessageTemplate, or
+    # a body received into a MessagePool buffer) are copied, bytes are immutable and queued as they are
+    return buffer if isinstance(buffer, bytes) else bytes(buffer)
+
+
+class _QueuedFrame(object):
+    def __init__(self, buffers, priority, enqueueTime):
+        self.buffers = buffers
+        self.priority = priority
+        self.enqueueTime = enqueueTime
+
+
+class SendScheduler(object):
+    """
+        Outgoing message scheduler for a connection. Messages are queued in priority classes and a writer thread always
+        sends the oldest message of the most urgent non-empty class, so small high priority messages (e.g. STATUS,
+        POSITION) are not stuck behind the large frames queued before them.
+
+        A frame already on the wire cannot be interrupted, since the OpenIGTLink stream cannot interleave messages:
+        large bodies are written in bounded chunks, so a single write never blocks the writer for long and the next
+        message is picked as soon as the current one is out.
+
+        The connection can be any object with a send(data) method, e.g. :class:`~pygtlink.ClientSocket` or
+        :class:`~pygtlink.SocketServer`. The connection must not be written to directly while the scheduler runs.
+
+        :ivar _connection: The connection messages are written to
+        :ivar int _chunkSize: The maximum size of a single write
+        :ivar dict _rules: The priority classes by (message type, device name), None being a wildcard
+        :ivar list _queues: One queue of pending frames per priority class
+        :ivar list _delays: One :class:`~pygtlink.LatencyHistogram` of queueing delays per priority class
+    """
+
+    def __init__(self, connection, chunkSize=DEFAULT_CHUNK_SIZE, numPriorities=3, defaultPriority=PRIORITY_NORMAL,
+                 capacity=10000):
+        self._connection = connection
+        self._chunkSize = chunkSize
+        self._defaultPriority = defaultPriority
+        self._rules = {(messageType, None): priority for messageType, priority in DEFAULT_PRIORITIES.items()
+                       if priority < numPriorities}
+        self._queues = [collections.deque() for _ in range(numPriorities)]
+        self._delays = [LatencyHistogram(capacity) for _ in range(numPriorities)]
+        self._sentBytes = [0] * numPriorities
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._error = None
+        self._thread = None
+
+    def setPriority(self, priority, messageType=None, deviceName=None):
+        """Sets the priority class of the messages of a given type and/or device. Rules with both type and device take
+        precedence over device only rules, which take precedence over type only rules.
+
+        :param int priority: The priority class, 0 being the most urgent
+        :param str messageType: The message type, None for any type
+        :param str deviceName: The device name, None for any device
+        """
+        if not 0 <= priority < len(self._queues):
+            raise ValueError("priority must be between 0 and {}".format(len(self._queues) - 1))
+        self._rules[(messageType, deviceName)] = priority
+
+    def getPriority(self, messageType, deviceName):
+        """Gets the priority class of the messages of a given type and device
+
+        :param str messageType: The message type
+        :param str deviceName: The device name
+
+        :returns: The priority class
+        """
+        for key in ((messageType, deviceName), (None, deviceName), (messageType, None)):
+            priority = self._rules.get(key)
+            if priority is not None:
+                return priority
+        return self._defaultPriority
+
+    def start(self):
+        """Starts the writer thread
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._error = None
+        self._thread = threading.Thread(target=self._run, name="SendScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True, timeout=None):
+        """Stops the writer thread
+
+        :param bool flush: If True, waits for the queued messages to be sent before stopping, otherwise they are
+            discarded
+        :param float timeout: The maximum time to wait for the queued messages to be sent
+        """
+        if flush:
+            self.flush(timeout)
+        with self._condition:
+            self._running = False
+            for queue in self._queues:
+                queue.clear()
+            self._pending = 0
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, message, priority=None):
+        """Queues a message
+
+        :param pygtlink.MessageBase message: The message to send. It is packed if needed. Its packed header and body
+            are queued as they are (or copied if they are mutable), so the message can be changed and packed again
+            right away
+        :param int priority: The priority class. Defaults to the class given by the message type and device name
+
+        :returns: True if the message was queued, False if it could not be packed or the scheduler is not running
+        """
+        if not message.pack():
+            return False
+        if priority is None:
+            priority = self.getPriority(message.getMessageType(), message.getDeviceName())
+        return self._enqueue((_snapshot(message.header), _snapshot(message.body)), priority)
+
+    def submitBytes(self, data, messageType=None, deviceName=None, priority=None):
+        """Queues an already packed message (header + body)
+
+        :param data: The packed message. It is copied if it is mutable (e.g. a bytearray or memoryview)
+        :param str messageType: The message type, used to find the priority class
+        :param str deviceName: The device name, used to find the priority class
+        :param int priority: The priority class. Overrides the message type and device name rules
+
+        :returns: True if the message was queued, False if the scheduler is not running
+        """
+        if priority is None:
+            priority = self.getPriority(messageType, deviceName)
+        return self._enqueue((_snapshot(data),), priority)
+
+    def flush(self, timeout=None):
+        """Waits until all the queued messages are sent
+
+        :param float timeout: The maximum time to wait
+
+        :returns: True if all the messages were sent, False on timeout or error
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0 or not self._running, timeout) \
+                   and self._pending == 0
+
+    def getPendingCount(self):
+        """Gets the number of queued messages not completely sent yet
+        """
+        with self._condition:
+            return self._pending
+
+    def getQueueDelayHistogram(self, priority):
+        """Gets the histogram of the queueing delays (time from submission to the start of the write)
+
+        :param int priority: The priority class
+
+        :returns: The :class:`~pygtlink.LatencyHistogram` of the priority class
+        """
+        return self._delays[priority]
+
+    def getStatistics(self):
+        """Gets the queueing delay statistics and the bytes sent per priority class
+
+        :returns: A list with one dictionary per priority class
+        """
+        statistics = []
+        for priority, histogram in enumerate(self._delays):
+            stats = histogram.getStatistics()
+            stats['bytes'] = self._sentBytes[priority]
+            statistics.append(stats)
+        return statistics
+
+    def getError(self):
+        """Gets the error that stopped the writer thread, if any
+        """
+        return self._error
+
+    def _enqueue(self, buffers, priority):
+        with self._condition:
+            if not self._running:
+                return False
+            self._queues[priority].append(_QueuedFrame(buffers, priority, time.monotonic()))
+            self._pending += 1
+            self._condition.notify_all()
+        return True
+
+    def _next(self):
+        with self._condition:
+            while self._running:
+                for queue in self._queues:
+                    if queue:
+                        return queue.popleft()
+                self._condition.wait()
+        return None
+
+    def _run(self):
+        while True:
+            frame = self._next()
+            if frame is None:
+                return
+
+            self._delays[frame.priority].add(time.monotonic() - frame.enqueueTime)
+            try:
+                for data in frame.buffers:
+                    self._write(data)
+            except OSError as e:
+                logging.info("Send scheduler stopped after send error: {}".format(e))
+                with self._condition:
+                    self._error = e
+                    self._running = False
+                    self._condition.notify_all()
+                return
+
+            self._sentBytes[frame.priority] += sum(len(data) for data in frame.buffers)
+            with self._condition:
+                self._pending -= 1
+                self._condition.notify_all()
+
+    def _write(self, data):
+        if len(data) <= self._chunkSize:
+            self._connection.send(data)
+            return
+
+        view = memoryview(data)
+        for offset in range(0, len(view), self._chunkSize):
+            self._connection.send(view[offset:offset + self._chunkSize])
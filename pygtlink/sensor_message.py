@@ -1,4 +1,6 @@
-from pygtlink import *
+from pygtlink.utils import IGTL_HEADER_VERSION_1
+from pygtlink.igtl_message_base import MessageBase
+import struct
 import numpy as np
 
 __all__ = ['SensorMessage']
@@ -11,9 +13,12 @@ class SensorMessage(MessageBase):
             :ivar int _larray: The sensor array len (uint8)
             :ivar int _status: The status (uint8)
             :ivar int _unit: The unit (uint64)
-            :ivar list _data: The sensor data (float64[Larray])
+            :ivar list _data: The sensor data (float64[Larray]), None until getData() converts the received data
+            :ivar _wireData: The received data, a read-only view over the body in the wire byte order
     """
 
+    __slots__ = ('_larray', '_status', '_unit', '_data', '_wireData')
+
     def __init__(self):
         MessageBase.__init__(self)
 
@@ -26,6 +31,7 @@ class SensorMessage(MessageBase):
         self._status = 0  # uint8
         self._unit = 0  # uint64
         self._data = []  # float64[Larray]
+        self._wireData = None
 
     def setLength(self, length):
         """Sets sensor data length (num elements)
@@ -50,13 +56,29 @@ class SensorMessage(MessageBase):
         if isinstance(data, np.ndarray):
             data = data.tolist()
         self._data = data
+        self._wireData = None
+
+    def getData(self, out=None):
+        """Gets sensor data. After unpacking, the data is a writable float64 array in the native byte order. It is
+        converted from the message body on the first call without out: with out, it is copied from the body straight
+        into out
 
-    def getData(self):
-        """Gets sensor data
+        :param out: A preallocated array the data is copied into, with one element per sensor value
 
-        :returns: The sensor data
+        :returns: The sensor data, or out
         """
-        return self._data
+        if out is None:
+            if self._data is None:
+                self._data = self._wireData.astype(np.float64)
+            return self._data
+        data = self._wireData if self._data is None else self._data
+        if out.shape != (len(data),):
+            raise ValueError("out has shape {}, expected {}".format(out.shape, (len(data),)))
+        np.copyto(out, data, casting='unsafe')
+        return out
+
+    def _unpackInto(self, into):
+        self._data = self.getData(out=into)
 
     def setUnit(self, unit):
         """Sets unit
@@ -91,22 +113,20 @@ class SensorMessage(MessageBase):
     def _packContent(self, endian=">"):
 
         b_body_header = struct.pack(endian + 'BBQ', self._larray, self._status, self._unit)
-        b_data = struct.pack(endian + 'd' * len(self._data), *self._data)
-        self.body = b_body_header + b_data
-
-        self._bodySize = len(self.body)
+        data = self.getData()
+        b_data = struct.pack(endian + 'd' * len(data), *data)
+        self._content = b_body_header + b_data
 
     def _unpackContent(self,  endian=">"):
 
-        b_body_header = self.body[0:IGTL_SENSOR_HEADER_SIZE]
+        b_body_header = self._content[0:IGTL_SENSOR_HEADER_SIZE]
         unpacked_body_header = struct.unpack(endian + 'BBQ', b_body_header)
 
         self._larray = unpacked_body_header[0]
         self._status = unpacked_body_header[1]
         self._unit = unpacked_body_header[2]
 
-        b_body = self.body[IGTL_SENSOR_HEADER_SIZE::]
-        unpacked_body = struct.unpack(endian + str(self._larray) + "d", b_body)
-        data_list = list()
-        data_list.append(unpacked_body)
-        self._data = np.array(data_list).flatten()
+        # decoded as a view over the body, with no intermediate list, which getData() converts on the first call
+        self._data = None
+        self._wireData = np.frombuffer(self._content, dtype=endian + 'f8', count=self._larray,
+                                       offset=IGTL_SENSOR_HEADER_SIZE)
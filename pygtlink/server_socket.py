@@ -1,4 +1,5 @@
-import socket
+from pygtlink.transport import TcpListener, UnixListener
+from pygtlink.client_socket import ClientSocket
 import logging
 
 #  very simple server with 2 socket open: one for data stream and the other for commands
@@ -12,19 +13,22 @@ class SocketServer:
     """
         Implementation of IGTL Server
 
-        :ivar socket.socket _serverSocket: The server TCP socket listening for incoming connection
-        :ivar socket.socket _clientSocket: The TCP socket the server opens with the client when a connection request
-            is received over the _serverSocket
+        :ivar _listener: The listener waiting for incoming connections (:class:`~pygtlink.TcpListener`,
+            :class:`~pygtlink.UnixListener` or :class:`~pygtlink.PipeListener`)
+        :ivar pygtlink.Transport _transport: The transport the server opens with the client when a connection request
+            is received by the _listener
         :ivar str _serverAddress: The server address
         :ivar int _serverPort: The server port
+        :ivar str _unixPath: The Unix domain socket path, if the server listens on a Unix domain socket
     """
 
     def __init__(self):
         logging.info("Starting Socket Server ... ")
-        self._serverSocket = None
-        self._clientSocket = None
+        self._listener = None
+        self._transport = None
         self._serverAddress = ""
         self._serverPort = None
+        self._unixPath = None
 
     def setAddress(self, address, port):
         """Sets the Server address and port
@@ -34,39 +38,75 @@ class SocketServer:
         """
         self._serverAddress = address
         self._serverPort = port
+        self._unixPath = None
+
+    def setUnixPath(self, path):
+        """Makes the server listen on a Unix domain socket instead of TCP
+
+            :param str path: The socket path
+        """
+        self._unixPath = path
+
+    def setListener(self, listener):
+        """Sets an already created listener, e.g. a :class:`~pygtlink.PipeListener`. Replaces
+            :func:`~pygtlink.SocketServer.start`
+
+            :param listener: The listener to use
+        """
+        self._listener = listener
+
+    def getListener(self):
+        """Gets the listener waiting for incoming connections
+        """
+        return self._listener
+
+    def getTransport(self):
+        """Gets the transport connected to the client
+
+            :returns: The :class:`~pygtlink.Transport`, None if no client is connected
+        """
+        return self._transport
 
     def setTimeout(self, timeout=0):
         """Sets receive timeout
 
             :param int timeout: The receive timeout to be set
         """
-        if self._clientSocket is not None:
-            self._clientSocket.settimeout(timeout)
+        if self._transport is not None:
+            self._transport.settimeout(timeout)
 
     def start(self):
         """Creates the server socket and binds it with the server address set with
-            :func:`~pygtlink.SocketServer.setAddress`
+            :func:`~pygtlink.SocketServer.setAddress` (or the path set with :func:`~pygtlink.SocketServer.setUnixPath`)
         """
-
-        self._serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._serverSocket.bind((self._serverAddress, self._serverPort))
+        if self._unixPath is not None:
+            self._listener = UnixListener(self._unixPath)
+        else:
+            self._listener = TcpListener(self._serverAddress, self._serverPort)
 
     def waitForConnection(self):
         """Waits for a connection request to be sent from the client
         """
-        self._serverSocket.listen(1)
-        self._clientSocket, client_data_address = self._serverSocket.accept()
-        logging.info("Connection established at ip:{}".format(client_data_address))
+        self._transport = self._listener.accept()
+        logging.info("Connection established at ip:{}".format(self._transport.getPeerName()))
+
+    def accept(self):
+        """Waits for a connection request and returns the new connection, so that a server can handle several clients
+
+            :returns: A :class:`~pygtlink.ClientSocket` connected to the client
+        """
+        transport = self._listener.accept()
+        logging.info("Connection established at ip:{}".format(transport.getPeerName()))
+        return ClientSocket(transport)
 
     def kill(self):
         """Shut down the socket connection with the client and closes the server socket
         """
         logging.info("shutting down connection")
-        self._clientSocket.shutdown(socket.SHUT_RDWR)
-        self._clientSocket.close()
+        if self._transport is not None:
+            self._transport.close()
 
-        self._serverSocket.shutdown(socket.SHUT_RDWR)
-        self._serverSocket.close()
+        self._listener.close()
 
     def receive(self, length):
         """Receives a message of <length> bytes from the IGTL client
@@ -75,25 +115,27 @@ class SocketServer:
 
             :returns: The received message (a byte string)
         """
-        res, recData = self._recvall(self._clientSocket, length)
-        if not res:
-            return None
-        return recData
+        return self._transport.receive(length)
+
+    def receiveFrame(self):
+        """Receives a complete message (header and body) from the IGTL client
+
+            :returns: The binary header and the binary body, (None, None) if the connection was closed
+        """
+        return self._transport.receiveFrame()
 
     def send(self, data):
         """Sends data to the IGTL client
 
             :param data: the message to be sent (as a byte string)
         """
-        self._clientSocket.sendall(data)
-
-    @staticmethod
-    def _recvall(s, n):
-        # Helper function to recv n bytes or return None if EOF is hit
-        raw_data = B''
-        while len(raw_data) < n:
-            packet = s.recv(n - len(raw_data))
-            if not packet:
-                return False, raw_data
-            raw_data += packet
-        return True, raw_data
\ No newline at end of file
+        self._transport.send(data)
+
+    def sendMessage(self, message):
+        """Packs (if needed) and sends a message to the IGTL client, without concatenating header and body
+
+            :param pygtlink.MessageBase message: the message to be sent
+
+            :returns: True if the message was sent, False if it could not be packed
+        """
+        return self._transport.sendMessage(message)
@@ -0,0 +1,413 @@
+from pygtlink.igtl_message_base import MessageBase, UNPACK_HEADER
+from pygtlink.image_message2 import ImageMessage2
+from pygtlink.image_message2 import Endian, IGTL_IMAGE_HEADER_SIZE, _EMPTY_IMAGE
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+__all__ = ['SharedMemoryRing', 'ShmImageMessage', 'SharedMemoryImageSender', 'SharedMemoryImageReceiver']
+
+SHM_IMAGE_MESSAGE_TYPE = "SHMIMAGE"
+
+IGTL_SHM_REFERENCE_SIZE = 44  # ring name (char[32]) + slot (uint32) + sequence (uint64)
+SHM_RING_NAME_SIZE = 32
+
+SHM_RING_MAGIC = b'IGSR'
+SHM_RING_HEADER_SIZE = 64  # magic, number of slots, slot size, padded to a cache line
+SHM_SLOT_RECORD_SIZE = 16  # slot state (uint8) and sequence number (uint64 at offset 8)
+SHM_ALIGNMENT = 64
+
+SLOT_FREE = 0
+SLOT_WRITING = 1
+SLOT_READY = 2
+
+# names of the rings created by this process, which must stay registered with the resource tracker
+_createdRings = set()
+
+
+def _align(size):
+    return (size + SHM_ALIGNMENT - 1) // SHM_ALIGNMENT * SHM_ALIGNMENT
+
+
+def _attachSharedMemory(name):
+    # The resource tracker of the attaching process would unlink the block of the producer when exiting
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        if name not in _createdRings:
+            resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+class SharedMemoryRing(object):
+    """
+        A ring of fixed size slots in a shared memory block, used to exchange image data between processes on the same
+        host. Each slot has a state (free, being written, ready) and a sequence number stored in the block itself, so
+        that the consumer can release a slot without sending anything back to the producer.
+
+        :ivar shared_memory.SharedMemory _block: The shared memory block
+        :ivar int _slots: The number of slots
+        :ivar int _slotSize: The size of each slot in bytes
+        :ivar np.ndarray _states: The slot states (view over the block)
+        :ivar np.ndarray _sequences: The slot sequence numbers (view over the block)
+    """
+
+    def __init__(self, name=None, slots=4, slotSize=0, create=True):
+        if create:
+            slotSize = _align(max(slotSize, 1))
+            data_offset = _align(SHM_RING_HEADER_SIZE + slots * SHM_SLOT_RECORD_SIZE)
+            self._block = shared_memory.SharedMemory(name=name, create=True, size=data_offset + slots * slotSize)
+            _createdRings.add(self._block.name)
+            struct.pack_into('=4sII', self._block.buf, 0, SHM_RING_MAGIC, slots, slotSize)
+        else:
+            self._block = _attachSharedMemory(name)
+            magic, slots, slotSize = struct.unpack_from('=4sII', self._block.buf, 0)
+            if magic != SHM_RING_MAGIC:
+                self._block.close()
+                raise ValueError("{} is not a pygtlink shared memory ring".format(name))
+
+        self._owner = create
+        self._slots = slots
+        self._slotSize = slotSize
+        self._dataOffset = _align(SHM_RING_HEADER_SIZE + slots * SHM_SLOT_RECORD_SIZE)
+        self._states = np.ndarray(slots, dtype=np.uint8, buffer=self._block.buf, offset=SHM_RING_HEADER_SIZE,
+                                  strides=(SHM_SLOT_RECORD_SIZE,))
+        self._sequences = np.ndarray(slots, dtype=np.uint64, buffer=self._block.buf,
+                                     offset=SHM_RING_HEADER_SIZE + 8, strides=(SHM_SLOT_RECORD_SIZE,))
+        self._nextSlot = 0
+        self._nextSequence = 1
+
+    def getName(self):
+        """Gets the name of the shared memory block
+        """
+        return self._block.name
+
+    def getSlotSize(self):
+        """Gets the size of a slot in bytes
+        """
+        return self._slotSize
+
+    def getNumberOfSlots(self):
+        """Gets the number of slots
+        """
+        return self._slots
+
+    def getNumberOfFreeSlots(self):
+        """Gets the number of free slots
+        """
+        return int(np.count_nonzero(self._states == SLOT_FREE))
+
+    def acquire(self, timeout=0.0):
+        """Acquires a free slot for writing (producer side). Slots are used in round robin order.
+
+        :param float timeout: The maximum time to wait for a slot to be released by the consumer
+
+        :returns: The slot index, None if no slot is free
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            for i in range(self._slots):
+                slot = (self._nextSlot + i) % self._slots
+                if self._states[slot] == SLOT_FREE:
+                    self._states[slot] = SLOT_WRITING
+                    self._nextSlot = (slot + 1) % self._slots
+                    return slot
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.0005)
+
+    def getSlotArray(self, slot, shape, dtype):
+        """Gets a NumPy array mapped on a slot
+
+        :param int slot: The slot index
+        :param shape: The array shape
+        :param dtype: The array dtype
+
+        :returns: The array, a view over the shared memory
+        """
+        return np.ndarray(shape, dtype=dtype, buffer=self._block.buf, offset=self._dataOffset + slot * self._slotSize)
+
+    def commit(self, slot):
+        """Marks a slot written by the producer as ready
+
+        :param int slot: The slot index
+
+        :returns: The sequence number identifying the slot content
+        """
+        sequence = self._nextSequence
+        self._nextSequence += 1
+        self._sequences[slot] = sequence
+        self._states[slot] = SLOT_READY
+        return sequence
+
+    def isReady(self, slot, sequence):
+        """Checks (consumer side) that a slot still holds the content with the given sequence number
+        """
+        return 0 <= slot < self._slots and self._states[slot] == SLOT_READY and self._sequences[slot] == sequence
+
+    def release(self, slot, sequence):
+        """Releases a slot read by the consumer, so that the producer can reuse it
+
+        :param int slot: The slot index
+        :param int sequence: The sequence number of the content that was read
+
+        :returns: True if the slot was released, False if it did not hold that content anymore
+        """
+        if not self.isReady(slot, sequence):
+            return False
+        self._states[slot] = SLOT_FREE
+        return True
+
+    def close(self):
+        """Closes the ring. The producer also destroys the shared memory block
+        """
+        if self._block is None:
+            return
+        del self._states, self._sequences
+        try:
+            self._block.close()
+        except BufferError:
+            # slot arrays are still referenced: the mapping goes away with the last of them
+            pass
+        if self._owner:
+            self._block.unlink()
+            _createdRings.discard(self._block.name)
+        self._block = None
+
+
+class ShmImageMessage(ImageMessage2):
+    """
+        Image message whose pixels are in a :class:`~pygtlink.SharedMemoryRing` slot. The body only holds the image
+        header and a reference to the slot (ring name, slot index and sequence number). Once unpacked,
+        :func:`~pygtlink.ImageMessage2.getData` returns a view over the slot, valid until
+        :func:`~pygtlink.ShmImageMessage.release` is called, or None if the slot could not be mapped.
+
+        :ivar str _ringName: The name of the ring holding the pixels
+        :ivar int _slot: The slot index (uint32)
+        :ivar int _sequence: The sequence number of the slot content (uint64)
+        :ivar _ringResolver: Callable returning the :class:`~pygtlink.SharedMemoryRing` with a given name, used on
+            unpack
+    """
+
+    __slots__ = ('_ringName', '_slot', '_sequence', '_ring', '_ringResolver')
+
+    def __init__(self):
+        ImageMessage2.__init__(self)
+
+        self._messageType = SHM_IMAGE_MESSAGE_TYPE
+        self._ringName = ""
+        self._slot = 0
+        self._sequence = 0
+        self._ring = None
+        self._ringResolver = None
+
+    def getSlotReference(self):
+        """Gets the reference to the slot holding the pixels
+
+        :returns: ring name, slot index, sequence number
+        """
+        return self._ringName, self._slot, self._sequence
+
+    def release(self):
+        """Releases the slot holding the pixels. The array returned by getData() must not be used anymore.
+
+        :returns: True if the slot was released
+        """
+        self._rawImage = _EMPTY_IMAGE
+        if self._ring is None:
+            return False
+        ring, self._ring = self._ring, None
+        return ring.release(self._slot, self._sequence)
+
+    def _packContent(self, endian=">"):
+        self._content = self._packImageHeader(endian) + struct.pack(endian + '32sIQ', self._ringName.encode('ascii'),
+                                                                    self._slot, self._sequence)
+
+    def _unpackContent(self, endian=">"):
+        self._unpackImageHeader(endian)
+
+        b_reference = self._content[IGTL_IMAGE_HEADER_SIZE:IGTL_IMAGE_HEADER_SIZE + IGTL_SHM_REFERENCE_SIZE]
+        name, self._slot, self._sequence = struct.unpack(endian + '32sIQ', b_reference)
+        self._ringName = name.decode('ascii').strip('\x00')
+
+        self._ring = None if self._ringResolver is None else self._ringResolver(self._ringName)
+        if self._ring is None or not self._ring.isReady(self._slot, self._sequence):
+            self._ring = None
+            self._rawImage = None
+            return
+        self._rawImage = self._ring.getSlotArray(self._slot, self.getDataShape(), self._getWireDtype())
+
+
+def _isLocalConnection(connection):
+    transport = connection.getTransport() if hasattr(connection, 'getTransport') else None
+    return transport is not None and transport.isLocal()
+
+
+class SharedMemoryImageSender(object):
+    """
+        Sends :class:`~pygtlink.ImageMessage2` messages to a peer on the same host through a
+        :class:`~pygtlink.SharedMemoryRing`: the pixels are copied once into a free slot and only a
+        :class:`~pygtlink.ShmImageMessage` (header + slot reference) is sent over the connection. If the peer is not
+        local, the image is sent as a regular IMAGE message.
+
+        :ivar _connection: The control connection, any object with a send(data) method
+        :ivar bool _local: Whether the peer is on the same host
+        :ivar SharedMemoryRing _ring: The ring, created with the first frame and recreated if a larger frame is sent
+    """
+
+    def __init__(self, connection, slots=4, local=None):
+        self._connection = connection
+        self._slots = slots
+        self._local = _isLocalConnection(connection) if local is None else local
+        self._ring = None
+        self._dropped = 0
+
+    def isLocal(self):
+        """Gets whether images are sent through shared memory
+        """
+        return self._local
+
+    def getNumberOfDroppedFrames(self):
+        """Gets the number of frames dropped because no slot was free
+        """
+        return self._dropped
+
+    def send(self, message, timeout=0.0):
+        """Sends an image message
+
+        :param pygtlink.ImageMessage2 message: The message to send
+        :param float timeout: The maximum time to wait for the consumer to release a slot
+
+        :returns: True if the message was sent, False if it was dropped because no slot was free
+        """
+        if not self._local:
+            message.pack()
+            self._connection.send(message.header + message.body)
+            return True
+
+        shm_msg = ShmImageMessage()
+        self._copyGeometry(message, shm_msg)
+        data = message.getData()
+        dtype = shm_msg._getWireDtype()
+        size = data.size * dtype.itemsize
+
+        if self._ring is None or self._ring.getSlotSize() < size:
+            if self._ring is not None:
+                self._ring.close()
+            self._ring = SharedMemoryRing(slots=self._slots, slotSize=size)
+
+        slot = self._ring.acquire(timeout)
+        if slot is None:
+            self._dropped += 1
+            return False
+
+        np.copyto(self._ring.getSlotArray(slot, data.shape, dtype), data, casting='unsafe')
+        shm_msg._ringName = self._ring.getName()
+        shm_msg._slot = slot
+        shm_msg._sequence = self._ring.commit(slot)
+
+        shm_msg.pack()
+        self._connection.send(shm_msg.header + shm_msg.body)
+        return True
+
+    def close(self):
+        """Destroys the ring. The consumer must have released all the frames
+        """
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+    @staticmethod
+    def _copyGeometry(message, shm_msg):
+        shm_msg.setDeviceName(message.getDeviceName())
+        shm_msg._timeStampSec, shm_msg._timeStampFraction = message.getTimeStampSecFrac()
+        shm_msg.setHeaderVersion(message.getHeaderVersion())
+        shm_msg.setMessageID(message.getMessageID())
+        message._decodeMetaData()
+        shm_msg._metaDataMap = None if message._metaDataMap is None else dict(message._metaDataMap)
+
+        shm_msg._dimensions = list(message._dimensions)
+        shm_msg._spacing = list(message._spacing)
+        shm_msg._subDimensions = list(message._subDimensions)
+        shm_msg._subOffset = list(message._subOffset)
+        shm_msg._matrix = None if message._matrix is None else message._matrix.copy()
+        shm_msg._numComponents = message._numComponents
+        shm_msg._scalarType = message._scalarType
+        shm_msg._coordinate = message._coordinate
+        # same host: pixels stay in the host byte order, so no byte swap is needed on either side
+        shm_msg._endian = Endian.endianLittle if sys.byteorder == 'little' else Endian.endianBig
+
+
+class SharedMemoryImageReceiver(object):
+    """
+        Receives image messages sent by a :class:`~pygtlink.SharedMemoryImageSender`. Shared memory images are mapped
+        as NumPy arrays without copies and must be released with :func:`~pygtlink.SharedMemoryImageReceiver.release`
+        once consumed; regular IMAGE messages are also accepted.
+
+        :ivar dict _rings: The attached rings by name
+    """
+
+    def __init__(self):
+        self._rings = {}
+
+    def receive(self, connection):
+        """Receives a message from the connection
+
+        :param connection: Any object with a receive(length) method, e.g. :class:`~pygtlink.ClientSocket`
+
+        :returns: The unpacked message (:class:`~pygtlink.ShmImageMessage`, :class:`~pygtlink.ImageMessage2` or, for
+            other types, :class:`~pygtlink.MessageBase` with the raw body), None if the connection was closed
+        """
+        header = MessageBase()
+        header.header = connection.receive(header.getHeaderSize())
+        if header.header is None or header.unpack() != UNPACK_HEADER:
+            return None
+
+        messageType = header.getMessageType()
+        if messageType == SHM_IMAGE_MESSAGE_TYPE:
+            message = ShmImageMessage()
+            message._ringResolver = self._getRing
+        elif messageType == "IMAGE":
+            message = ImageMessage2()
+        else:
+            message = header
+
+        if message is not header:
+            message.copyHeader(header)
+        message.body = connection.receive(message.getPackBodySize())
+        if message.body is None:
+            return None
+        message.unpack()
+        return message
+
+    @staticmethod
+    def release(message):
+        """Releases the slot of a shared memory image. Does nothing for other messages
+
+        :param pygtlink.MessageBase message: A message returned by :func:`~pygtlink.SharedMemoryImageReceiver.receive`
+
+        :returns: True if a slot was released
+        """
+        if isinstance(message, ShmImageMessage):
+            return message.release()
+        return False
+
+    def close(self):
+        """Detaches from all the rings
+        """
+        for ring in self._rings.values():
+            ring.close()
+        self._rings = {}
+
+    def _getRing(self, name):
+        ring = self._rings.get(name)
+        if ring is None:
+            try:
+                ring = SharedMemoryRing(name, create=False)
+            except (OSError, ValueError):
+                return None
+            self._rings[name] = ring
+        return ring
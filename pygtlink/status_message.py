@@ -1,5 +1,6 @@
-from pygtlink import *
-import numpy as np
+from pygtlink.utils import IGTL_HEADER_VERSION_1
+from pygtlink.igtl_message_base import MessageBase
+import struct
 
 
 __all__ = ['StatusMessage']
@@ -15,6 +16,8 @@ class StatusMessage(MessageBase):
             :ivar str _message: The error message (char[BODY_SIZE - 30])
     """
 
+    __slots__ = ('_code', '_subCode', '_errorName', '_message')
+
     def __init__(self):
         MessageBase.__init__(self)
 
@@ -111,19 +114,18 @@ class StatusMessage(MessageBase):
         s = bytes(self._message, 'ascii')  # Or other appropriate encoding
         binary_cmd += struct.pack(endian + "%ds" % (len(s),), s)
 
-        self.body = binary_cmd
-        self._bodySize = len(self.body)
+        self._content = binary_cmd
 
     def _unpackContent(self,  endian=">"):
 
-        img_binary_header = self.body[0:IGTL_STATUS_HEADER_SIZE]
+        img_binary_header = self._content[0:IGTL_STATUS_HEADER_SIZE]
         unpacked_header = struct.unpack(endian + 'Hq20s', img_binary_header)
 
         self._code = unpacked_header[0]
         self._subCode = unpacked_header[1]
         self._errorName = unpacked_header[2].decode('ascii').rstrip()
 
-        b_body = self.body[IGTL_STATUS_HEADER_SIZE::]
+        b_body = self._content[IGTL_STATUS_HEADER_SIZE::]
         lbody = len(b_body)
         unpacked_body = struct.unpack(endian + str(lbody) + "s", b_body)[0].decode('ascii')
         self._message = unpacked_body
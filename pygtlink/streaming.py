@@ -0,0 +1,383 @@
+from pygtlink.igtl_message_base import MessageBase
+import logging
+import struct
+import threading
+import time
+
+__all__ = ['StartStreamMessage', 'StopStreamMessage', 'RtsStreamMessage', 'StreamScheduler']
+
+IGTL_STT_RESOLUTION_SIZE = 4
+IGTL_STT_COORDINATE_NAME_SIZE = 32
+
+RTS_SUCCESS = 0
+RTS_ERROR = 1
+
+
+class StartStreamMessage(MessageBase):
+    """
+        The class implements the openIgtLink STT_ message, used by a client to request a stream of messages of a given
+        type (e.g. STT_IMAGE, STT_TDATA) at a given rate
+
+        :ivar str _streamType: The type of the requested messages (e.g. IMAGE)
+        :ivar int _resolution: The minimum interval between messages in milliseconds (uint32), 0 for no limit
+        :ivar str _coordinateName: The coordinate system name (char[32]), only sent for STT_TDATA
+    """
+
+    __slots__ = ('_streamType', '_resolution', '_coordinateName')
+
+    def __init__(self):
+        MessageBase.__init__(self)
+
+        self._streamType = ""
+        self._resolution = 0  # uint32
+        self._coordinateName = ""  # char[32]
+
+    def setStreamType(self, streamType):
+        """Sets the type of the requested messages
+
+        :param str streamType: The message type, e.g. IMAGE
+        """
+        self._streamType = str(streamType)
+        self._messageType = "STT_" + self._streamType
+
+    def getStreamType(self):
+        """Gets the type of the requested messages
+
+        :returns: The message type, e.g. IMAGE
+        """
+        return self._streamType
+
+    def setResolution(self, resolution):
+        """Sets the minimum interval between two messages of the stream
+
+        :param int resolution: The interval in milliseconds, 0 for no limit
+        """
+        self._resolution = int(resolution)
+
+    def getResolution(self):
+        """Gets the minimum interval between two messages of the stream
+
+        :returns: The interval in milliseconds
+        """
+        return self._resolution
+
+    def setCoordinateName(self, coordinateName):
+        """Sets the coordinate system name (only used for STT_TDATA)
+
+        :param str coordinateName: The coordinate system name
+        """
+        self._coordinateName = str(coordinateName)
+
+    def getCoordinateName(self):
+        """Gets the coordinate system name
+
+        :returns: The coordinate system name
+        """
+        return self._coordinateName
+
+    def _packContent(self, endian=">"):
+        self._content = struct.pack(endian + 'I', self._resolution)
+        if self._streamType == "TDATA":
+            self._content += struct.pack(endian + '32s', self._coordinateName.encode('ascii'))
+
+    def _unpackContent(self, endian=">"):
+        self._streamType = self._messageType[4:]
+        self._resolution = struct.unpack(endian + 'I', self._content[0:IGTL_STT_RESOLUTION_SIZE])[0]
+
+        b_name = self._content[IGTL_STT_RESOLUTION_SIZE:IGTL_STT_RESOLUTION_SIZE + IGTL_STT_COORDINATE_NAME_SIZE]
+        self._coordinateName = bytes(b_name).decode('ascii').strip('\x00')
+
+
+class StopStreamMessage(MessageBase):
+    """
+        The class implements the openIgtLink STP_ message, used by a client to stop a stream. The message has no body.
+
+        :ivar str _streamType: The type of the stream to stop (e.g. IMAGE)
+    """
+
+    __slots__ = ('_streamType',)
+
+    def __init__(self):
+        MessageBase.__init__(self)
+
+        self._streamType = ""
+
+    def setStreamType(self, streamType):
+        """Sets the type of the stream to stop
+
+        :param str streamType: The message type, e.g. IMAGE
+        """
+        self._streamType = str(streamType)
+        self._messageType = "STP_" + self._streamType
+
+    def getStreamType(self):
+        """Gets the type of the stream to stop
+
+        :returns: The message type, e.g. IMAGE
+        """
+        return self._streamType
+
+    def _packContent(self, endian=">"):
+        self._content = b''
+
+    def _unpackContent(self, endian=">"):
+        self._streamType = self._messageType[4:]
+
+
+class RtsStreamMessage(MessageBase):
+    """
+        The class implements the openIgtLink RTS_ message, sent by the server to answer STT_ and STP_ requests
+
+        :ivar str _streamType: The type of the stream (e.g. IMAGE)
+        :ivar int _status: RTS_SUCCESS or RTS_ERROR (uint8)
+    """
+
+    __slots__ = ('_streamType', '_status')
+
+    def __init__(self):
+        MessageBase.__init__(self)
+
+        self._streamType = ""
+        self._status = RTS_SUCCESS  # uint8
+
+    def setStreamType(self, streamType):
+        """Sets the type of the stream the reply refers to
+
+        :param str streamType: The message type, e.g. IMAGE
+        """
+        self._streamType = str(streamType)
+        self._messageType = "RTS_" + self._streamType
+
+    def getStreamType(self):
+        """Gets the type of the stream the reply refers to
+
+        :returns: The message type, e.g. IMAGE
+        """
+        return self._streamType
+
+    def setStatus(self, status):
+        """Sets the reply status
+
+        :param int status: RTS_SUCCESS or RTS_ERROR
+        """
+        self._status = int(status)
+
+    def getStatus(self):
+        """Gets the reply status
+
+        :returns: RTS_SUCCESS or RTS_ERROR
+        """
+        return self._status
+
+    def _packContent(self, endian=">"):
+        self._content = struct.pack(endian + 'B', self._status)
+
+    def _unpackContent(self, endian=">"):
+        self._streamType = self._messageType[4:]
+        self._status = struct.unpack(endian + 'B', self._content[0:1])[0]
+
+
+class _Subscription(object):
+    def __init__(self, client, interval, now):
+        self.client = client
+        self.interval = interval
+        self.nextDue = now
+
+
+class StreamScheduler(object):
+    """
+        Server side streaming. Producers register device sources, clients subscribe to them with their own rate (e.g.
+        by sending STT_ messages handled by :func:`~pygtlink.StreamScheduler.handleMessage`). On each
+        :func:`~pygtlink.StreamScheduler.tick` a source is only polled when at least one of its subscribers is due;
+        the frame is then packed once and sent to the due subscribers only.
+
+        A client can be any object with a send(data) method, e.g. :class:`~pygtlink.SocketServer`.
+
+        :ivar dict _sources: The registered sources by (message type, device name)
+        :ivar dict _subscriptions: The subscriptions by (message type, device name). An empty device name subscribes
+            to all the devices of the given type
+        :ivar threading.RLock _lock: Lock protecting sources and subscriptions
+    """
+
+    def __init__(self, deviceName="StreamScheduler", clock=time.monotonic):
+        self._deviceName = deviceName
+        self._clock = clock
+        self._sources = {}
+        self._subscriptions = {}
+        self._lock = threading.RLock()
+
+    def registerSource(self, messageType, deviceName, source):
+        """Registers a device source
+
+        :param str messageType: The type of the messages produced by the source, e.g. IMAGE
+        :param str deviceName: The device name of the messages produced by the source
+        :param source: A callable returning the latest message (MessageBase) or None if no new message is available
+        """
+        with self._lock:
+            self._sources[(messageType, deviceName)] = source
+
+    def unregisterSource(self, messageType, deviceName):
+        """Removes a device source
+
+        :param str messageType: The type of the messages produced by the source
+        :param str deviceName: The device name of the messages produced by the source
+        """
+        with self._lock:
+            self._sources.pop((messageType, deviceName), None)
+
+    def subscribe(self, client, messageType, deviceName="", resolution=0):
+        """Subscribes a client to a stream. Subscribing again changes the rate of an existing subscription.
+
+        :param client: The client the messages are sent to
+        :param str messageType: The requested message type, e.g. IMAGE
+        :param str deviceName: The requested device name, an empty string for all the devices of the type
+        :param int resolution: The minimum interval between two messages in milliseconds, 0 for no limit
+        """
+        with self._lock:
+            subscriptions = self._subscriptions.setdefault((messageType, deviceName), {})
+            subscription = subscriptions.get(id(client))
+            if subscription is None:
+                subscriptions[id(client)] = _Subscription(client, resolution / 1000.0, self._clock())
+            else:
+                subscription.interval = resolution / 1000.0
+
+    def unsubscribe(self, client, messageType, deviceName=""):
+        """Stops a stream for a client
+
+        :param client: The subscribed client
+        :param str messageType: The message type of the stream
+        :param str deviceName: The device name of the stream, an empty string for all the devices of the type
+        """
+        with self._lock:
+            subscriptions = self._subscriptions.get((messageType, deviceName))
+            if subscriptions is not None:
+                subscriptions.pop(id(client), None)
+                if not subscriptions:
+                    del self._subscriptions[(messageType, deviceName)]
+
+    def removeClient(self, client):
+        """Removes all the subscriptions of a client
+
+        :param client: The client to remove
+        """
+        with self._lock:
+            for key in list(self._subscriptions.keys()):
+                self.unsubscribe(client, *key)
+
+    def getNumberOfSubscriptions(self):
+        """Gets the total number of subscriptions
+        """
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def handleMessage(self, client, message):
+        """Handles STT_ and STP_ messages received from a client, replying with a RTS_ message.
+        The message header must be unpacked and the body received.
+
+        :param client: The client that sent the message
+        :param pygtlink.MessageBase message: The received message
+
+        :returns: True if the message was a stream control message, False otherwise
+        """
+        messageType = message.getMessageType()
+        if messageType.startswith("STT_"):
+            request = StartStreamMessage()
+        elif messageType.startswith("STP_"):
+            request = StopStreamMessage()
+        else:
+            return False
+
+        if not isinstance(message, type(request)):
+            request.copyHeader(message)
+            request.body = message.body
+            request.unpack()
+        else:
+            request = message
+
+        # the stream type is in the message type: a STP_ body is empty, so it is never unpacked from a MessageBase
+        streamType = messageType[4:]
+        if isinstance(request, StartStreamMessage):
+            self.subscribe(client, streamType, request.getDeviceName(), request.getResolution())
+        else:
+            self.unsubscribe(client, streamType, request.getDeviceName())
+
+        reply = RtsStreamMessage()
+        reply.setStreamType(streamType)
+        reply.setDeviceName(self._deviceName)
+        reply.setTimeStamp(time.time())
+        reply.pack()
+        self._send(client, reply.header + reply.body)
+        return True
+
+    def tick(self, now=None):
+        """Sends a new frame of each source to the subscribers that are due
+
+        :param float now: The current monotonic time. Defaults to the scheduler clock
+
+        :returns: The number of messages sent
+        """
+        if now is None:
+            now = self._clock()
+
+        sent = 0
+        with self._lock:
+            sources = list(self._sources.items())
+
+        for (messageType, deviceName), source in sources:
+            due = {}
+            with self._lock:
+                for key in ((messageType, deviceName), (messageType, "")):
+                    for clientId, subscription in self._subscriptions.get(key, {}).items():
+                        if subscription.nextDue <= now and clientId not in due:
+                            due[clientId] = subscription
+            if not due:
+                continue
+
+            message = source()
+            if message is None:
+                continue
+
+            if not message.pack():
+                continue
+            frame = message.header + message.body
+
+            for subscription in due.values():
+                subscription.nextDue = max(subscription.nextDue + subscription.interval, now)
+                if self._send(subscription.client, frame):
+                    sent += 1
+        return sent
+
+    def getNextDeadline(self):
+        """Gets the monotonic time at which the next subscriber is due
+
+        :returns: The time of the next deadline, None if there are no subscriptions
+        """
+        with self._lock:
+            deadlines = [subscription.nextDue for subscriptions in self._subscriptions.values()
+                         for subscription in subscriptions.values()]
+        return min(deadlines) if deadlines else None
+
+    def run(self, stopEvent, idleInterval=0.01):
+        """Runs the scheduler until stopEvent is set, sleeping until the next subscriber is due
+
+        :param threading.Event stopEvent: The event stopping the loop
+        :param float idleInterval: The maximum sleep time, also used when there are no subscriptions
+        """
+        while not stopEvent.is_set():
+            sent = self.tick()
+            deadline = self.getNextDeadline()
+            timeout = idleInterval if deadline is None else min(max(deadline - self._clock(), 0), idleInterval)
+            if timeout == 0 and sent == 0:
+                # subscribers are due but the sources have no new frame: poll again shortly
+                timeout = idleInterval / 10
+            if timeout > 0:
+                stopEvent.wait(timeout)
+
+    def _send(self, client, data):
+        try:
+            client.send(data)
+        except OSError as e:
+            logging.info("Removing stream client after send error: {}".format(e))
+            self.removeClient(client)
+            return False
+        return True
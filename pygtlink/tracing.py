@@ -0,0 +1,173 @@
+import contextlib
+import itertools
+import os
+import threading
+import time
+
+__all__ = ['Tracer', 'startTracing', 'stopTracing', 'getTracer']
+
+DEFAULT_TRACE_CAPACITY = 65536
+
+# The tracer spans are recorded into, None when tracing is off. The instrumented functions only check it against None
+_tracer = None
+
+
+class Tracer(object):
+    """
+        Records timestamped spans (stage, start, end, message type, device name, size, thread) in a preallocated ring
+        buffer: when it is full, the oldest spans are overwritten. The spans can be exported as a Chrome trace
+        (chrome://tracing, https://ui.perfetto.dev) to view the stages of each message on a timeline.
+
+        While the tracer is active (see :func:`~pygtlink.startTracing`), the library records these stages:
+
+        ============== ===========================================================================================
+        Stage            Span
+        ============== ===========================================================================================
+        packContent     MessageBase.pack(): serialization of the content and of the body
+        crc64           MessageBase.pack() and unpack(crccheck=1): the body crc
+        send            Transport.sendMessage(): sending the header and the body (sendall / sendmsg)
+        sendall         Transport.send(): sending raw bytes, e.g. a message given to ClientSocket.send()
+        recv            Transport.receive(): receiving a fixed size (header or body), i.e. the _recvall loop
+        receiveFrame    Transport.receiveFrame(): receiving a header and its body
+        unpackContent   MessageBase.unpack(): deserialization of the content
+        ============== ===========================================================================================
+
+        The sendall and recv spans of raw bytes are tagged with the message type and device name when the bytes are
+        an IGTL header or a complete message; the recv spans of Transport.receiveFrame() always are.
+
+        Application stages can be added with :func:`~pygtlink.Tracer.span`.
+
+        :param int capacity: The number of spans kept
+        :param clock: The clock the spans are timed with, in seconds
+
+        :ivar list _spans: The ring buffer
+        :ivar _counter: Counts the recorded spans, the index of a span in the ring buffer being its count modulo the
+            capacity. next() on it is atomic, so that threads can record concurrently
+    """
+
+    def __init__(self, capacity=DEFAULT_TRACE_CAPACITY, clock=time.perf_counter):
+        self._capacity = capacity
+        self._spans = [None] * capacity
+        self._counter = itertools.count()
+        self._recorded = 0
+        self.clock = clock
+        self._origin = clock()
+        self._wallOrigin = time.time()
+
+    def record(self, stage, start, end, messageType="", deviceName="", size=0):
+        """Records a span
+
+        :param str stage: The stage name
+        :param float start: The start time, from the tracer clock
+        :param float end: The end time, from the tracer clock
+        :param str messageType: The message type
+        :param str deviceName: The device name
+        :param int size: The size of the processed data (e.g. the body size)
+        """
+        i = next(self._counter)
+        self._spans[i % self._capacity] = (stage, start, end, messageType, deviceName, size, threading.get_ident())
+        self._recorded = i + 1
+
+    @contextlib.contextmanager
+    def span(self, stage, messageType="", deviceName="", size=0):
+        """Records the span of a with block, e.g. the processing of a received image
+
+        :param str stage: The stage name
+        :param str messageType: The message type
+        :param str deviceName: The device name
+        :param int size: The size of the processed data
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(stage, start, self.clock(), messageType, deviceName, size)
+
+    def getCapacity(self):
+        return self._capacity
+
+    def getSpans(self):
+        """Gets the recorded spans, from the oldest one
+
+        :returns: A list of (stage, start, end, message type, device name, size, thread id) tuples
+        """
+        recorded = self._recorded
+        if recorded <= self._capacity:
+            spans = self._spans[:recorded]
+        else:
+            i = recorded % self._capacity
+            spans = self._spans[i:] + self._spans[:i]
+        return [span for span in spans if span is not None]
+
+    def getDroppedCount(self):
+        """Gets the number of spans overwritten because the ring buffer was full
+        """
+        return max(self._recorded - self._capacity, 0)
+
+    def clear(self):
+        """Drops all the recorded spans
+        """
+        self._counter = itertools.count()
+        self._recorded = 0
+        self._spans = [None] * self._capacity
+
+    def toChromeTrace(self):
+        """Converts the spans to the Chrome trace event format: one complete ('X') event per span, in microseconds
+        since the tracer was created, with the message type, device name and size as arguments
+
+        :returns: A dictionary, which can be serialized with json
+        """
+        pid = os.getpid()
+        events = []
+        for stage, start, end, messageType, deviceName, size, tid in self.getSpans():
+            events.append({'name': stage, 'cat': messageType or 'pygtlink', 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6,
+                           'args': {'type': messageType, 'device': deviceName, 'size': size}})
+        for thread in threading.enumerate():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread.ident,
+                           'args': {'name': thread.name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'startTime': self._wallOrigin, 'droppedSpans': self.getDroppedCount()}}
+
+    def exportChromeTrace(self, file):
+        """Writes the spans as a Chrome trace JSON file (see :func:`~pygtlink.Tracer.toChromeTrace`)
+
+        :param file: The file path, or a text file object
+        """
+        import json  # only needed for the export
+        if hasattr(file, 'write'):
+            json.dump(self.toChromeTrace(), file)
+        else:
+            with open(file, 'w') as f:
+                json.dump(self.toChromeTrace(), f)
+
+
+def startTracing(capacity=DEFAULT_TRACE_CAPACITY, tracer=None):
+    """Starts recording the library stages (see :class:`~pygtlink.Tracer`) for all the messages and connections
+
+    :param int capacity: The ring buffer capacity of the new tracer
+    :param pygtlink.Tracer tracer: The tracer to record into, None for a new one
+
+    :returns: The active tracer
+    """
+    global _tracer
+    _tracer = tracer if tracer is not None else Tracer(capacity)
+    return _tracer
+
+
+def stopTracing():
+    """Stops recording. Tracing off costs one comparison per instrumented function
+
+    :returns: The tracer that was active, None if tracing was off
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def getTracer():
+    """Gets the active tracer
+
+    :returns: The tracer, None if tracing is off
+    """
+    return _tracer
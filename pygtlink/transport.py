@@ -0,0 +1,534 @@
+from pygtlink import tracing
+from pygtlink.igtl_header import IGTL_HEADER_SIZE, IGTL_HEADER_TYPE, IGTL_HEADER_DEVICE_NAME, \
+    IGTL_HEADER_BODY_SIZE_OFFSET
+import abc
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+
+__all__ = ['Transport', 'SocketTransport', 'TcpTransport', 'UnixTransport', 'PipeTransport', 'TcpListener',
+           'UnixListener', 'PipeListener']
+
+
+DEFAULT_PIPE_CAPACITY = 4 * 1024 * 1024
+
+# Size of the chunks a file is read in by Transport.sendfile() when the transport cannot send it directly
+DEFAULT_SENDFILE_CHUNK_SIZE = 1024 * 1024
+
+
+def _frameTags(data):
+    """Gets the message type and device name of data holding an IGTL header alone or a complete message, for the
+    tracing spans of raw sends and receives. Other data (e.g. a body alone) is not tagged
+
+        :returns: The message type and the device name, empty strings if data is not a header or a message
+    """
+    if len(data) < IGTL_HEADER_SIZE:
+        return "", ""
+    data = memoryview(data).cast('B')
+    if len(data) != IGTL_HEADER_SIZE and \
+            len(data) != IGTL_HEADER_SIZE + struct.unpack_from('>Q', data, IGTL_HEADER_BODY_SIZE_OFFSET)[0]:
+        return "", ""
+    # the names are not validated yet: a malformed one must not make tracing raise
+    return (bytes(data[IGTL_HEADER_TYPE]).rstrip(b'\x00').decode('utf-8', 'replace'),
+            bytes(data[IGTL_HEADER_DEVICE_NAME]).rstrip(b'\x00').decode('utf-8', 'replace'))
+
+
+class Transport(abc.ABC):
+    """
+        Base class of the byte stream transports used by :class:`~pygtlink.ClientSocket` and
+        :class:`~pygtlink.SocketServer`. Child classes implement the abstract send(), recv_into(), settimeout() and
+        close(); the IGTL message framing is implemented here once for all of them.
+    """
+
+    @abc.abstractmethod
+    def send(self, data):
+        """Sends all the data
+
+            :param data: The bytes-like object to send
+        """
+
+    def sendBuffers(self, buffers):
+        """Sends several buffers in order, as with a single send of their concatenation
+
+            :param buffers: A list of bytes-like objects
+        """
+        for data in buffers:
+            self.send(data)
+
+    def sendfile(self, file, offset, count):
+        """Sends count bytes of a file starting at offset. The base implementation reads and sends the file in chunks
+        of bounded size
+
+            :param file: A file object opened in binary mode
+            :param int offset: The offset of the first byte to send
+            :param int count: The number of bytes to send
+        """
+        buffer = memoryview(bytearray(min(count, DEFAULT_SENDFILE_CHUNK_SIZE)))
+        file.seek(offset)
+        while count > 0:
+            n = file.readinto(buffer[:min(count, len(buffer))])
+            if not n:
+                raise EOFError("file ended {} bytes before the end of the sent range".format(count))
+            self.send(buffer[:n])
+            count -= n
+
+    @abc.abstractmethod
+    def recv_into(self, buffer, nbytes=0):
+        """Receives up to nbytes bytes into buffer
+
+            :returns: The number of bytes received, 0 if the peer closed the connection
+        """
+
+    @abc.abstractmethod
+    def settimeout(self, timeout):
+        """Sets the timeout of the blocking operations
+
+            :param timeout: The timeout in seconds, None to block without timeout
+        """
+
+    @abc.abstractmethod
+    def close(self):
+        """Closes the connection
+        """
+
+    def isLocal(self):
+        """Gets whether the peer runs on the same host
+        """
+        return False
+
+    def getPeerName(self):
+        """Gets a description of the peer address
+        """
+        return ""
+
+    def isAlive(self):
+        """Checks, without blocking and without consuming data, that the connection was not closed
+        """
+        return True
+
+    def receive(self, length):
+        """Receives exactly length bytes
+
+            :param int length: The number of bytes to receive
+
+            :returns: The received bytes (a bytearray), None if the connection was closed before
+        """
+        tracer = tracing._tracer
+        if tracer is None:
+            return self._receive(length)
+        start = tracer.clock()
+        data = self._receive(length)
+        if data is not None:
+            tracer.record('recv', start, tracer.clock(), *_frameTags(data), size=length)
+        return data
+
+    def _receive(self, length):
+        data = bytearray(length)
+        view = memoryview(data)
+        received = 0
+        while received < length:
+            n = self.recv_into(view[received:], length - received)
+            if not n:
+                return None
+            received += n
+        return data
+
+    def receiveFrame(self):
+        """Receives a complete IGTL message
+
+            :returns: The binary header and the binary body, (None, None) if the connection was closed before
+        """
+        tracer = tracing._tracer
+        if tracer is not None:
+            headerStart = tracer.clock()
+        header = self._receive(IGTL_HEADER_SIZE)
+        if header is None:
+            return None, None
+        if tracer is not None:
+            start = tracer.clock()
+        body_size = struct.unpack_from('>Q', header, IGTL_HEADER_BODY_SIZE_OFFSET)[0]
+        body = self._receive(body_size)
+        if body is None:
+            return None, None
+        if tracer is not None:
+            end = tracer.clock()
+            messageType, deviceName = _frameTags(header)
+            tracer.record('recv', headerStart, start, messageType, deviceName, IGTL_HEADER_SIZE)
+            tracer.record('recv', start, end, messageType, deviceName, body_size)
+            # from the end of the header to the end of the body: the wait for the header may be idle time
+            tracer.record('receiveFrame', start, end, messageType, deviceName, body_size)
+        return header, body
+
+    def sendMessage(self, message):
+        """Packs (if needed) and sends a message
+
+            :param pygtlink.MessageBase message: The message to send
+
+            :returns: True if the message was sent, False if it could not be packed
+        """
+        if not message.pack():
+            return False
+        tracer = tracing._tracer
+        if tracer is not None:
+            start = tracer.clock()
+        self.sendBuffers([message.header, message.body])
+        if tracer is not None:
+            tracer.record('send', start, tracer.clock(), message.getMessageType(), message.getDeviceName(),
+                          message.getPackBodySize())
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SocketTransport(Transport):
+    """
+        Transport over a connected stream socket
+
+        :ivar socket.socket _socket: The connected socket
+    """
+
+    def __init__(self, sock):
+        self._socket = sock
+
+    def getSocket(self):
+        """Gets the underlying socket
+        """
+        return self._socket
+
+    def send(self, data):
+        tracer = tracing._tracer
+        if tracer is None:
+            self._socket.sendall(data)
+            return
+        start = tracer.clock()
+        self._socket.sendall(data)
+        tracer.record('sendall', start, tracer.clock(), *_frameTags(data), size=len(data))
+
+    def sendBuffers(self, buffers):
+        if not hasattr(self._socket, 'sendmsg'):
+            self._socket.sendall(b''.join(buffers))
+            return
+
+        views = [memoryview(b).cast('B') for b in buffers if len(b) > 0]
+        while views:
+            sent = self._socket.sendmsg(views)
+            # drop the buffers (or part of them) that were completely sent
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if views and sent:
+                views[0] = views[0][sent:]
+
+    def sendfile(self, file, offset, count):
+        if count <= 0:
+            return  # socket.sendfile() sends the whole file for count 0
+        # os.sendfile() where available: the file pages go to the socket without being copied to user space
+        sent = self._socket.sendfile(file, offset, count)
+        if sent != count:
+            raise EOFError("file ended {} bytes before the end of the sent range".format(count - sent))
+
+    def recv_into(self, buffer, nbytes=0):
+        return self._socket.recv_into(buffer, nbytes)
+
+    def settimeout(self, timeout):
+        self._socket.settimeout(timeout)
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+    def fileno(self):
+        return self._socket.fileno()
+
+    def isLocal(self):
+        if self._socket.family == getattr(socket, 'AF_UNIX', None):
+            return True
+        try:
+            peer, local = self._socket.getpeername()[0], self._socket.getsockname()[0]
+        except OSError:
+            return False
+        return peer == local or peer.startswith("127.") or peer == "::1"
+
+    def getPeerName(self):
+        try:
+            return str(self._socket.getpeername())
+        except OSError:
+            return ""
+
+    def isAlive(self):
+        if self._socket.fileno() < 0:
+            return False
+        try:
+            readable, _, _ = select.select([self._socket], [], [], 0)
+            if not readable:
+                return True
+            # readable with no pending data means the peer closed the connection
+            return len(self._socket.recv(1, socket.MSG_PEEK | getattr(socket, 'MSG_DONTWAIT', 0))) > 0
+        except BlockingIOError:
+            return True
+        except (OSError, ValueError):
+            return False
+
+
+class TcpTransport(SocketTransport):
+    """
+        TCP transport
+    """
+
+    @classmethod
+    def connect(cls, address, port, noDelay=False, timeout=None):
+        """Connects to a TCP server
+
+            :param str address: The server address
+            :param int port: The server port
+            :param bool noDelay: If True, disables the Nagle algorithm (TCP_NODELAY)
+            :param float timeout: The connection timeout in seconds (socket.timeout is raised), None to wait for the
+                operating system one. The connected transport is blocking
+
+            :returns: The connected transport
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        _connectSocket(sock, (address, port), timeout)
+        if noDelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(sock)
+
+
+class UnixTransport(SocketTransport):
+    """
+        Unix domain socket transport, for peers on the same host
+    """
+
+    @classmethod
+    def connect(cls, path, timeout=None):
+        """Connects to a Unix domain socket server
+
+            :param str path: The socket path
+            :param float timeout: The connection timeout in seconds, None to block
+
+            :returns: The connected transport
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        _connectSocket(sock, path, timeout)
+        return cls(sock)
+
+
+def _connectSocket(sock, address, timeout):
+    # connects within the timeout, then leaves the socket blocking (closed on failure)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        sock.settimeout(None)
+    except OSError:
+        sock.close()
+        raise
+
+
+class _PipeChannel(object):
+    """One direction of a pipe: a bounded byte buffer shared by a writer and a reader thread"""
+
+    def __init__(self, capacity):
+        self.buffer = bytearray()
+        self.offset = 0
+        self.capacity = capacity
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def write(self, data, timeout):
+        view = memoryview(data).cast('B')
+        with self.condition:
+            while len(view):
+                if not self.condition.wait_for(lambda: self.closed or self._available() < self.capacity, timeout):
+                    raise socket.timeout("timed out")
+                if self.closed:
+                    raise BrokenPipeError("pipe closed")
+                n = min(len(view), self.capacity - self._available())
+                self.buffer += view[:n]
+                view = view[n:]
+                self.condition.notify_all()
+
+    def read_into(self, buffer, nbytes, timeout):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.closed or self._available() > 0, timeout):
+                raise socket.timeout("timed out")
+            n = min(nbytes, self._available())
+            buffer[:n] = self.buffer[self.offset:self.offset + n]
+            self.offset += n
+            if self.offset > len(self.buffer) // 2:
+                del self.buffer[:self.offset]
+                self.offset = 0
+            self.condition.notify_all()
+            return n
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _available(self):
+        return len(self.buffer) - self.offset
+
+
+class PipeTransport(Transport):
+    """
+        In-process transport, for tests and benchmarks. Use :func:`~pygtlink.PipeTransport.pair` to create two
+        connected ends.
+    """
+
+    def __init__(self, incoming, outgoing):
+        self._incoming = incoming
+        self._outgoing = outgoing
+        self._timeout = None
+
+    @classmethod
+    def pair(cls, capacity=DEFAULT_PIPE_CAPACITY):
+        """Creates two connected ends
+
+            :param int capacity: The maximum number of bytes buffered in each direction
+
+            :returns: The two transports
+        """
+        a_to_b, b_to_a = _PipeChannel(capacity), _PipeChannel(capacity)
+        return cls(b_to_a, a_to_b), cls(a_to_b, b_to_a)
+
+    def send(self, data):
+        tracer = tracing._tracer
+        if tracer is None:
+            self._outgoing.write(data, self._timeout)
+            return
+        start = tracer.clock()
+        self._outgoing.write(data, self._timeout)
+        tracer.record('sendall', start, tracer.clock(), *_frameTags(data), size=len(data))
+
+    def recv_into(self, buffer, nbytes=0):
+        if nbytes <= 0:
+            nbytes = len(buffer)
+        return self._incoming.read_into(memoryview(buffer).cast('B'), nbytes, self._timeout)
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def close(self):
+        self._incoming.close()
+        self._outgoing.close()
+
+    def isLocal(self):
+        return True
+
+    def getPeerName(self):
+        return "pipe"
+
+    def isAlive(self):
+        return not (self._incoming.closed or self._outgoing.closed)
+
+
+class TcpListener(object):
+    """
+        Listening TCP socket creating a :class:`~pygtlink.TcpTransport` for each accepted connection
+    """
+
+    def __init__(self, address, port, backlog=1):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # a restarted server can bind its port again while old connections are in TIME_WAIT
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((address, port))
+        self._socket.listen(backlog)
+
+    def getPort(self):
+        """Gets the port the listener is bound to
+        """
+        return self._socket.getsockname()[1]
+
+    def accept(self):
+        """Waits for a connection
+
+            :returns: The transport of the accepted connection
+        """
+        sock, address = self._socket.accept()
+        return TcpTransport(sock)
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+class UnixListener(object):
+    """
+        Listening Unix domain socket creating a :class:`~pygtlink.UnixTransport` for each accepted connection
+    """
+
+    def __init__(self, path, backlog=1):
+        self._path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(path)
+        self._socket.listen(backlog)
+
+    def accept(self):
+        """Waits for a connection
+
+            :returns: The transport of the accepted connection
+        """
+        sock, address = self._socket.accept()
+        return UnixTransport(sock)
+
+    def close(self):
+        self._socket.close()
+        try:
+            os.unlink(self._path)
+        except OSError:
+            logging.info("Could not remove socket file {}".format(self._path))
+
+
+class PipeListener(object):
+    """
+        In-process listener: :func:`~pygtlink.PipeListener.connect` creates a pipe, returns one end and queues the
+        other one for :func:`~pygtlink.PipeListener.accept`
+    """
+
+    def __init__(self, capacity=DEFAULT_PIPE_CAPACITY):
+        self._capacity = capacity
+        self._pending = []
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def connect(self):
+        """Connects to the listener
+
+            :returns: The client end of the pipe
+        """
+        client, server = PipeTransport.pair(self._capacity)
+        with self._condition:
+            if self._closed:
+                raise ConnectionRefusedError("listener closed")
+            self._pending.append(server)
+            self._condition.notify_all()
+        return client
+
+    def accept(self):
+        """Waits for a connection
+
+            :returns: The server end of the pipe
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self._closed)
+            if not self._pending:
+                raise ConnectionAbortedError("listener closed")
+            return self._pending.pop(0)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
@@ -1,12 +1,30 @@
 import struct
-import crcmod
-import numpy as np
+
+__all__ = ['IGTL_HEADER_VERSION_1', 'IGTL_HEADER_VERSION_2', 'CRC64', 'igtl_nanosec_to_frac', 'igtl_frac_to_nanosec',
+           'igtl_sec_to_frac']
 
 IGTL_HEADER_VERSION_1 = 1
 IGTL_HEADER_VERSION_2 = 2
 
-# http://slicer-devel.65872.n3.nabble.com/OpenIGTLinkIF-and-CRC-td4031360.html
-CRC64 = crcmod.mkCrcFun(0x142F0E1EBA9EA3693, rev=False, initCrc=0x0000000000000000, xorOut=0x0000000000000000)
+_crc64 = None
+
+
+def CRC64(data, crc=0):
+    """Computes the CRC64 (ECMA-182) of data, continuing from crc. The crcmod backend is only loaded (and the table
+    built) on the first call, so that importing pygtlink stays cheap
+
+    :param data: The bytes-like object
+    :param int crc: The crc of the preceding data, 0 to start a new one
+
+    :returns: The crc (int)
+    """
+    global _crc64
+    if _crc64 is None:
+        import crcmod
+        # http://slicer-devel.65872.n3.nabble.com/OpenIGTLinkIF-and-CRC-td4031360.html
+        _crc64 = crcmod.mkCrcFun(0x142F0E1EBA9EA3693, rev=False, initCrc=0x0000000000000000,
+                                 xorOut=0x0000000000000000)
+    return _crc64(data, crc)
 
 
 # https://github.com/openigtlink/OpenIGTLink/blob/cf9619e2fece63be0d30d039f57b1eb4d43b1a75/Source/igtlutil/igtl_util.c#L168
@@ -24,6 +42,19 @@ def igtl_nanosec_to_frac(nanosec):
     return r
 
 
+def igtl_sec_to_frac(fraction):
+    """Converts a fraction of second to the fraction field of a timestamp (units of 2^-32 s), in closed form. It
+    truncates like igtl_nanosec_to_frac(), whose bit by bit loop is about 10 times slower, and differs from it by
+    less than 10 ns (the loop halves rounded powers of ten)
+
+    :param float fraction: The fraction of second, in [0, 1)
+
+    :returns: The fraction field (int)
+    """
+    frac = int(fraction * 4294967296.0)
+    return frac if frac <= 0xFFFFFFFF else 0xFFFFFFFF
+
+
 def igtl_frac_to_nanosec(frac):
     base = 1000000000  # 10^9
 
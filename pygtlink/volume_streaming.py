@@ -0,0 +1,221 @@
+from pygtlink.igtl_message_base import UNPACK_BODY
+from pygtlink.image_message2 import ImageMessage2, PixelType, np2s
+import time
+import numpy as np
+
+__all__ = ['generateSlabs', 'sendVolume', 'VolumeAssembler', 'receiveVolume']
+
+# Default maximum size of the data of a slab (bytes)
+DEFAULT_SLAB_SIZE = 16 * 1024 * 1024
+
+# The image dimensions are sent as uint16
+_MAX_DIMENSION = 0xFFFF
+
+
+def generateSlabs(volume, spacing=(1, 1, 1), matrix=None, deviceName="", slabSize=DEFAULT_SLAB_SIZE, axis=0):
+    """Splits a volume into slabs along one axis and yields one :class:`~pygtlink.ImageMessage2` per slab. Each message
+    has the dimensions of the entire volume and carries one subvolume (see
+    :func:`~pygtlink.ImageMessage2.setSubVolume`), so that the receiver can place it. The slab data are views of the
+    volume: with an np.memmap volume, only one slab is read into memory at a time, when its message is packed.
+
+    All the slabs of a volume have the same timestamp.
+
+    :param numpy.ndarray volume: The volume, with 3 axes (and a 4th one for multi component voxels). Its dtype must be
+        one of the IMAGE scalar types
+    :param spacing: The voxel spacing along the 3 axes
+    :param matrix: The 4x4 image matrix of the entire volume, identity by default
+    :param str deviceName: The device name of the messages
+    :param int slabSize: The maximum size of the data of a slab in bytes. A slab is at least one voxel thick
+    :param int axis: The axis the volume is split along. Axis 0 gives contiguous slabs for a C-ordered volume
+
+    :returns: A generator of messages, to be packed and sent in order
+    """
+    if volume.ndim not in (3, 4):
+        raise ValueError("volume must have 3 or 4 axes, got shape {}".format(volume.shape))
+    if volume.dtype.name not in np2s:
+        raise ValueError("unsupported volume dtype {}".format(volume.dtype))
+    if max(volume.shape[:3]) > _MAX_DIMENSION:
+        raise ValueError("volume dimensions {} exceed {}".format(volume.shape[:3], _MAX_DIMENSION))
+
+    dimensions = list(volume.shape[:3])
+    plane_size = volume.nbytes // max(dimensions[axis], 1)
+    thickness = max(1, slabSize // max(plane_size, 1))
+    timestamp = time.time()
+
+    for start in range(0, dimensions[axis], thickness):
+        stop = min(start + thickness, dimensions[axis])
+        index = [slice(None)] * volume.ndim
+        index[axis] = slice(start, stop)
+        offset = [0, 0, 0]
+        offset[axis] = start
+
+        msg = ImageMessage2()
+        msg.setDeviceName(deviceName)
+        msg.setTimeStamp(timestamp)
+        msg.setScalarType(PixelType(np2s[volume.dtype.name]))
+        msg.setNumComponents(volume.shape[3] if volume.ndim == 4 else 1)
+        msg.setData(volume[tuple(index)])
+        msg.setDimensions(dimensions)
+        msg.setSubVolume(msg.getData().shape[:3], offset)
+        msg.setSpacing(spacing)
+        if matrix is not None:
+            msg.setMatrix(matrix)
+        yield msg
+
+
+def sendVolume(connection, volume, spacing=(1, 1, 1), matrix=None, deviceName="", slabSize=DEFAULT_SLAB_SIZE,
+               axis=0, progress=None):
+    """Sends a volume slab by slab (see :func:`generateSlabs`). The memory used is bounded by the slab size, not the
+    volume size
+
+    :param connection: A :class:`~pygtlink.ClientSocket`, :class:`~pygtlink.SocketServer` or
+        :class:`~pygtlink.Transport`
+    :param numpy.ndarray volume: The volume
+    :param spacing: The voxel spacing along the 3 axes
+    :param matrix: The 4x4 image matrix, identity by default
+    :param str deviceName: The device name of the messages
+    :param int slabSize: The maximum size of the data of a slab in bytes
+    :param int axis: The axis the volume is split along
+    :param progress: A function called after each slab with the fraction of the volume sent
+
+    :returns: The number of sent slabs
+    """
+    total = max(volume.nbytes, 1)
+    sent = 0
+    slabs = 0
+    for msg in generateSlabs(volume, spacing, matrix, deviceName, slabSize, axis):
+        connection.sendMessage(msg)
+        sent += msg.getData().nbytes
+        slabs += 1
+        if progress is not None:
+            progress(sent / total)
+    return slabs
+
+
+class VolumeAssembler(object):
+    """
+        Assembles the subvolume messages of a volume (e.g. the slabs sent by :func:`sendVolume`) into one array. The
+        array is allocated when the first subvolume is added, with the volume dimensions and the scalar type of the
+        messages, either in memory or as a .npy file mapped in memory. Subvolumes are copied into it as they are added,
+        so that the received messages can be released right away.
+
+        An assembler assembles a single volume; use :func:`~pygtlink.VolumeAssembler.reset` to assemble the next one.
+
+        :param numpy.ndarray out: A preallocated array the volume is assembled into, with the volume dimensions
+        :param str path: The path of a .npy file the volume is assembled into (np.memmap), if out is None
+        :param progress: A function called after each added subvolume with the fraction of the volume received
+
+        :ivar numpy.ndarray _volume: The assembled volume, None until the first subvolume is added
+        :ivar set _received: The offsets of the received subvolumes, so that a repeated subvolume is counted once
+    """
+
+    def __init__(self, out=None, path=None, progress=None):
+        self._out = out
+        self._path = path
+        self._progress = progress
+        self.reset()
+
+    def reset(self):
+        """Forgets the received subvolumes, to assemble a new volume (in the same array, if out was given)
+        """
+        self._volume = self._out
+        self._received = set()
+        self._receivedVoxels = 0
+        self._totalVoxels = 0
+        self._spacing = None
+        self._matrix = None
+
+    def add(self, message):
+        """Copies the subvolume of a message into the volume
+
+        :param pygtlink.ImageMessage2 message: An unpacked message
+
+        :returns: True if the volume is complete
+        """
+        dimensions = [int(n) for n in message.getDimensions()]
+        sub_dimensions, sub_offset = message.getSubVolume()
+        data = message.getData()
+        if self._volume is None:
+            self._volume = self._allocate(dimensions, data)
+        elif list(self._volume.shape[:3]) != dimensions:
+            raise ValueError("subvolume of a volume with dimensions {}, expected {}".format(dimensions,
+                                                                                          list(self._volume.shape[:3])))
+        if self._spacing is None:
+            self._spacing = message.getSpacing()
+            self._matrix = np.array(message.getMatrix())
+            self._totalVoxels = dimensions[0] * dimensions[1] * dimensions[2]
+
+        index = tuple(slice(o, o + n) for o, n in zip(sub_offset, sub_dimensions))
+        self._volume[index] = data
+
+        key = tuple(sub_offset)
+        if key not in self._received:
+            self._received.add(key)
+            self._receivedVoxels += int(sub_dimensions[0]) * int(sub_dimensions[1]) * int(sub_dimensions[2])
+        if self._progress is not None:
+            self._progress(self.getProgress())
+        return self.isComplete()
+
+    def getProgress(self):
+        """Gets the fraction of the volume received
+
+        :returns: The fraction, between 0 and 1
+        """
+        return min(self._receivedVoxels / self._totalVoxels, 1.0) if self._totalVoxels else 0.0
+
+    def isComplete(self):
+        return self._totalVoxels > 0 and self._receivedVoxels >= self._totalVoxels
+
+    def getVolume(self):
+        """Gets the assembled volume, complete or not
+
+        :returns: The volume, None if no subvolume was added
+        """
+        return self._volume
+
+    def getSpacing(self):
+        return self._spacing
+
+    def getMatrix(self):
+        return self._matrix
+
+    def _allocate(self, dimensions, data):
+        shape = tuple(dimensions) + tuple(data.shape[3:])
+        dtype = data.dtype.newbyteorder('=')
+        if self._path is not None:
+            return np.lib.format.open_memmap(self._path, mode='w+', dtype=dtype, shape=shape)
+        return np.empty(shape, dtype=dtype)
+
+
+def receiveVolume(connection, out=None, path=None, progress=None, crccheck=0, deviceName=None):
+    """Receives the slabs of a volume until it is complete (see :class:`VolumeAssembler`). Messages which are not
+    IMAGE messages, images of other devices and slabs failing the crc check are skipped
+
+    :param connection: A :class:`~pygtlink.ClientSocket`, :class:`~pygtlink.SocketServer` or
+        :class:`~pygtlink.Transport`
+    :param numpy.ndarray out: A preallocated array the volume is assembled into
+    :param str path: The path of a .npy file the volume is assembled into, if out is None
+    :param progress: A function called after each slab with the fraction of the volume received
+    :param int crccheck: If 1, the body crc of each slab is checked
+    :param str deviceName: The device name of the slabs. By default, the device name of the first slab received: the
+        images of other devices (e.g. a live image stream on the same connection) are not mixed into the volume
+
+    :returns: The :class:`VolumeAssembler`, holding the volume and its geometry, or None if the connection was closed
+        before the volume was complete
+    """
+    assembler = VolumeAssembler(out, path, progress)
+    while True:
+        header, body = connection.receiveFrame()
+        if header is None:
+            return None
+        msg = ImageMessage2()
+        msg.header = header
+        msg.unpack()
+        if msg.getMessageType() != "IMAGE" or (deviceName is not None and msg.getDeviceName() != deviceName):
+            continue
+        msg.body = body
+        if msg.unpack(crccheck) != UNPACK_BODY:
+            continue  # corrupted slab
+        deviceName = msg.getDeviceName()
+        if assembler.add(msg):
+            return assembler
@@ -1,4 +1,6 @@
 import unittest
+import struct
+import numpy as np
 from pygtlink import *
 
 
@@ -93,7 +95,7 @@ class TestImageMessage2(unittest.TestCase):
         img_msg.setData(raw_img)
         img_msg.setSpacing([1, 2, 3])
 
-        mat = np.array([ [1, 0, 0, 4], [0, 1, 0, 2], [0, 0, 1, 6], [0, 0, 0, 1] ], dtype=np.float)
+        mat = np.array([ [1, 0, 0, 4], [0, 1, 0, 2], [0, 0, 1, 6], [0, 0, 0, 1] ], dtype=float)
         img_msg.setMatrix(mat)
 
         img_msg.pack()
@@ -167,5 +169,132 @@ class TestPositionMessage(unittest.TestCase):
         self.assertAlmostEqual(rcv_msg.getQuaternion()[3], quat[3])
 
 
+class TestNDArrayMessage(unittest.TestCase):
+
+    def _roundTrip(self, msg):
+        msg.pack()
+        rcv_msg = NDArrayMessage()
+        rcv_msg.header = msg.header
+        self.assertEqual(rcv_msg.unpack(), UNPACK_HEADER)
+        rcv_msg.body = msg.body
+        self.assertEqual(rcv_msg.unpack(crccheck=1), UNPACK_BODY)
+        return rcv_msg
+
+    def test_pack_unpack(self):
+        for dtype in ('<i2', '>u4', '<f4', 'float64', 'complex128', 'int8'):
+            array = (np.arange(2 * 3 * 4) - 5).astype(dtype).reshape(2, 3, 4)
+            msg = NDArrayMessage()
+            self.assertTrue(msg.setArray(array))
+            rcv_msg = self._roundTrip(msg)
+            self.assertTrue(np.array_equal(rcv_msg.getArray(), array), dtype)
+            self.assertEqual(rcv_msg.getArray().dtype.name, np.dtype(dtype).name)
+
+    def test_wire_format(self):
+        msg = NDArrayMessage()
+        msg.setArray(np.array([[1, 2, 3]], dtype='<u2'))
+        msg.pack()
+        self.assertEqual(bytes(msg.body), b'\x05\x02\x00\x01\x00\x03\x00\x01\x00\x02\x00\x03')
+
+    def test_zero_copy_unpack(self):
+        array = np.random.rand(64, 1000).astype(np.float32)
+        msg = NDArrayMessage()
+        msg.setArray(array)
+        rcv_msg = self._roundTrip(msg)
+        data = rcv_msg.getArray()
+        self.assertFalse(data.flags.owndata)
+        self.assertTrue(np.shares_memory(data, np.frombuffer(rcv_msg.body, dtype=np.uint8)))
+
+        out = np.empty((64, 1000), dtype=np.float32)
+        self.assertIs(rcv_msg.getArray(out=out), out)
+        self.assertTrue(np.array_equal(out, array))
+
+    def test_invalid_array(self):
+        msg = NDArrayMessage()
+        self.assertFalse(msg.setArray(np.zeros(3, dtype=np.int64)))
+        self.assertFalse(msg.setArray(np.zeros(70000, dtype=np.uint8)))
+        self.assertTrue(msg.setArray(np.zeros(3, dtype=np.uint8)))
+
+
+class TestPolyDataMessage(unittest.TestCase):
+
+    def _roundTrip(self, msg):
+        msg.pack()
+        rcv_msg = PolyDataMessage()
+        rcv_msg.header = msg.header
+        self.assertEqual(rcv_msg.unpack(), UNPACK_HEADER)
+        rcv_msg.body = msg.body
+        self.assertEqual(rcv_msg.unpack(crccheck=1), UNPACK_BODY)
+        return rcv_msg
+
+    def test_pack_unpack(self):
+        points = np.random.rand(100, 3)
+        triangles = np.random.randint(0, 100, size=(150, 3))
+        normals = np.random.rand(100, 3).astype(np.float32)
+        labels = np.arange(150, dtype=np.float32)
+
+        msg = PolyDataMessage()
+        self.assertTrue(msg.setPoints(points))
+        self.assertTrue(msg.setPolygons(triangles))
+        self.assertTrue(msg.setLines((np.array([0, 2, 5]), np.array([0, 1, 2, 3, 4]))))
+        self.assertTrue(msg.addAttribute("Normals", normals, PolyDataMessage.POINT_NORMAL))
+        self.assertTrue(msg.addAttribute("Label", labels, PolyDataMessage.CELL_SCALAR))
+        rcv_msg = self._roundTrip(msg)
+
+        self.assertTrue(np.array_equal(rcv_msg.getPoints(), points.astype(np.float32)))
+        self.assertTrue(np.array_equal(rcv_msg.getPolygons(uniform=True), triangles))
+        self.assertEqual(list(rcv_msg.getLines()), [2, 0, 1, 3, 2, 3, 4])
+        self.assertEqual(rcv_msg.getNumberOfCells(), {'vertices': 0, 'lines': 2, 'polygons': 150,
+                                                      'triangleStrips': 0})
+        with self.assertRaises(ValueError):
+            rcv_msg.getLines(uniform=True)
+
+        attributes = rcv_msg.getAttributes()
+        self.assertEqual([(name, t) for name, t, _ in attributes],
+                         [("Normals", PolyDataMessage.POINT_NORMAL), ("Label", PolyDataMessage.CELL_SCALAR)])
+        self.assertTrue(np.array_equal(rcv_msg.getAttribute("Normals"), normals))
+        self.assertTrue(np.array_equal(rcv_msg.getAttribute("Label")[:, 0], labels))
+        self.assertIsNone(rcv_msg.getAttribute("Missing"))
+
+        # the arrays view the body
+        body = np.frombuffer(rcv_msg.body, dtype=np.uint8)
+        self.assertTrue(np.shares_memory(rcv_msg.getPoints(), body))
+        self.assertTrue(np.shares_memory(rcv_msg.getPolygons(), body))
+
+    def test_wire_format(self):
+        msg = PolyDataMessage()
+        msg.setPoints([[1, 2, 3]])
+        msg.setVertices([[0]])
+        msg.addAttribute("ab", [5.0])
+        msg.pack()
+        body = bytes(msg.body)
+        self.assertEqual(body[:40], struct.pack('>10I', 1, 1, 8, 0, 0, 0, 0, 0, 0, 1))
+        self.assertEqual(body[40:52], struct.pack('>3f', 1, 2, 3))
+        self.assertEqual(body[52:60], struct.pack('>2I', 1, 0))
+        self.assertEqual(body[60:66], struct.pack('>BBI', 0, 1, 1))
+        self.assertEqual(body[66:70], b'ab\x00\x00')
+        self.assertEqual(body[70:], struct.pack('>f', 5))
+
+    def test_invalid(self):
+        msg = PolyDataMessage()
+        self.assertFalse(msg.setPoints(np.zeros((4, 2))))
+        self.assertFalse(msg.setPolygons(np.zeros(4, dtype=int)))
+        self.assertFalse(msg.addAttribute("Normals", np.zeros((4, 2)), PolyDataMessage.POINT_NORMAL))
+        self.assertFalse(msg.addAttribute("Scalars", np.zeros((4, 2)), 0x07))
+        self.assertFalse(msg.setLines((np.array([0, 3, 2, 4]), np.arange(4))))
+        self.assertFalse(msg.setLines((np.array([0, 2, 5]), np.arange(4))))
+
+    def test_offsets_not_starting_at_zero(self):
+        # mixed size cells taken from the middle of a larger connectivity array
+        connectivity = np.arange(12)
+        msg = PolyDataMessage()
+        msg.setPoints(np.random.rand(12, 3))
+        self.assertTrue(msg.setPolygons((np.array([3, 6, 10]), connectivity)))
+        self.assertTrue(msg.setLines((np.array([2, 4, 7, 9]), connectivity[:9])))
+        rcv_msg = self._roundTrip(msg)
+        self.assertEqual(list(rcv_msg.getPolygons()), [3, 3, 4, 5, 4, 6, 7, 8, 9])
+        self.assertEqual(list(rcv_msg.getLines()), [2, 2, 3, 3, 4, 5, 6, 2, 7, 8])
+        self.assertEqual(rcv_msg.getNumberOfCells()['polygons'], 2)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
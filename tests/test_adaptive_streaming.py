@@ -0,0 +1,135 @@
+import threading
+import time
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class _Connection(object):
+    """Collects the sent frames, draining at a limited rate if bytesPerSecond is given"""
+
+    def __init__(self, bytesPerSecond=None):
+        self.bytesPerSecond = bytesPerSecond
+        self.frames = []
+        self.lock = threading.Lock()
+
+    def send(self, data):
+        if self.bytesPerSecond:
+            time.sleep(len(data) / self.bytesPerSecond)
+        with self.lock:
+            self.frames.append(bytes(data))
+
+
+def _unpack(data):
+    msg = ImageMessage2()
+    msg.header = data[:58]
+    msg.unpack()
+    msg.body = data[58:]
+    msg.unpack()
+    return msg
+
+
+def _voxelPosition(msg, index):
+    # the position of a voxel, the matrix translation being the image center
+    size = np.array(msg.getData().shape[:3], dtype=np.float64)
+    offset = (np.array(index, dtype=np.float64) - (size - 1) / 2) * np.array(msg.getSpacing())
+    matrix = msg.getMatrix()
+    return matrix[0:3, 3] + matrix[0:3, 0:3].dot(offset)
+
+
+class TestAdaptiveImageStreamer(unittest.TestCase):
+
+    def test_downsample(self):
+        data = np.arange(4 * 6, dtype=np.uint8).reshape([4, 6, 1])
+        np.testing.assert_array_equal(downsampleImage(data, 2)[:, :, 0], [[4, 6, 8], [16, 18, 20]])
+        np.testing.assert_array_equal(downsampleImage(data, 2, 'stride')[:, :, 0], [[0, 2, 4], [12, 14, 16]])
+        self.assertEqual(downsampleImage(data[:3, :5], 2).shape, (1, 2, 1))
+
+    def test_geometry_and_shared_encoding(self):
+        img_msg = ImageMessage2()
+        img_msg.setDeviceName("US")
+        img_msg.setSpacing([0.5, 0.25, 1])
+        img_msg.setData(np.arange(8 * 8, dtype=np.uint8).reshape([8, 8]))
+
+        # a frozen clock: no frame rate is measured, so the levels do not adapt
+        streamer = AdaptiveImageStreamer(levels=3, clock=lambda: 0.0)
+        connections = [_Connection() for _ in range(3)]
+        for connection in connections:
+            streamer.addClient(connection)
+        streamer.setLevel(connections[1], 1)
+        streamer.setLevel(connections[2], 1)
+        self.assertEqual(streamer.publish(img_msg), 2)
+        streamer.setRegionOfInterest(connections[2], ([2, 4, 0], [4, 4, 1]))
+        self.assertEqual(streamer.publish(img_msg), 3)
+        streamer.close()
+
+        full = _unpack(connections[0].frames[-1])
+        half = _unpack(connections[1].frames[-1])
+        roi = _unpack(connections[2].frames[-1])
+        self.assertEqual(full.getData().shape, (8, 8, 1))
+        self.assertEqual(half.getData().shape, (4, 4, 1))
+        self.assertEqual(roi.getData().shape, (2, 2, 1))
+        np.testing.assert_allclose(half.getSpacing(), [1, 0.5, 1], rtol=1e-6)
+        # the matrix translation is the image center: the whole image keeps its center, the ROI (voxels 2-5, 4-7)
+        # is centered on voxel (3.5, 5.5) of the 8x8 image, whose center is voxel (3.5, 3.5)
+        np.testing.assert_allclose(full.getMatrix()[0:3, 3], [0, 0, 0], atol=1e-6)
+        np.testing.assert_allclose(half.getMatrix()[0:3, 3], [0, 0, 0], atol=1e-6)
+        np.testing.assert_allclose(roi.getMatrix()[0:3, 3], [0, 0.5, 0], atol=1e-6)
+        # the first voxel of a level is the center of the first block of full resolution voxels
+        np.testing.assert_allclose(_voxelPosition(half, [0, 0, 0]), _voxelPosition(full, [0.5, 0.5, 0]), atol=1e-6)
+        np.testing.assert_allclose(_voxelPosition(roi, [0, 0, 0]), _voxelPosition(full, [2.5, 4.5, 0]), atol=1e-6)
+        self.assertEqual(roi.getData()[0, 0, 0], np.rint(np.mean([20, 21, 28, 29])))
+
+    def test_metadata_encoding(self):
+        from pygtlink.adaptive_streaming import _deriveImage
+        img_msg = ImageMessage2()
+        img_msg.setHeaderVersion(2)
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setData(np.zeros([8, 8], dtype=np.uint8))
+        img_msg.setMetaDataElement("Patient", "M\u00fcller", IANA_TYPE_UTF_8)
+        img_msg.setMetaDataElement("Probe", "C5-2")
+
+        derived = _deriveImage(img_msg, 2, None, 'stride')
+        self.assertEqual(derived.getRawMetaData(), img_msg.getRawMetaData())
+        self.assertEqual(derived.getMetaDataElement("Patient"), "M\u00fcller")
+        self.assertTrue(derived.pack())
+
+    def test_geometry_with_cropped_voxels(self):
+        from pygtlink.adaptive_streaming import _deriveImage
+        img_msg = ImageMessage2()
+        img_msg.setSpacing([1, 2, 1])
+        img_msg.setData(np.zeros([9, 7], dtype=np.uint8))
+        matrix = np.identity(4)
+        matrix[0:3, 3] = [10, 20, 30]
+        img_msg.setMatrix(matrix)
+
+        # the last voxel of each axis is dropped by the downsampling
+        for method, first in (('mean', [0.5, 0.5, 0]), ('stride', [0, 0, 0])):
+            derived = _deriveImage(img_msg, 2, None, method)
+            self.assertEqual(derived.getData().shape, (4, 3, 1))
+            np.testing.assert_allclose(_voxelPosition(derived, [0, 0, 0]), _voxelPosition(img_msg, first),
+                                       atol=1e-6)
+            np.testing.assert_allclose(_voxelPosition(derived, [3, 2, 0]),
+                                       _voxelPosition(img_msg, np.add(first, [6, 4, 0])), atol=1e-6)
+
+    def test_slow_client_gets_lower_resolution(self):
+        img_msg = ImageMessage2()
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setData(np.zeros([64, 64], dtype=np.uint8))
+
+        streamer = AdaptiveImageStreamer(levels=3)
+        fast, slow = _Connection(), _Connection(bytesPerSecond=100000)
+        streamer.addClient(fast)
+        streamer.addClient(slow)
+        for _ in range(40):
+            streamer.publish(img_msg)
+            time.sleep(0.01)
+        streamer.close()
+
+        self.assertEqual(streamer.getNumberOfClients(), 0)
+        self.assertEqual(_unpack(fast.frames[-1]).getData().shape, (64, 64, 1))
+        self.assertLess(_unpack(slow.frames[-1]).getData().shape[0], 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import socket
+import threading
+import time
+import unittest
+from pygtlink import *
+
+
+class _RecordingTransport(Transport):
+    """Records the batches given to sendBuffers"""
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def sendBuffers(self, buffers):
+        with self.lock:
+            self.batches.append((time.monotonic(), b''.join(buffers)))
+
+    def send(self, data):
+        pass
+
+    def recv_into(self, buffer, nbytes=0):
+        return 0
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestBatchingWriter(unittest.TestCase):
+
+    def test_batches(self):
+        transport = _RecordingTransport()
+        writer = BatchingWriter(transport, maxDelay=0.2, maxBytes=4000)
+        template = MessageTemplate.forPosition("Tracker")
+        for i in range(100):
+            # the template buffer is reused: the writer must copy it
+            template.send(writer, i, 0, 0, 0, 0, 0, 1, timestamp=0)
+        writer.flush()
+        self.assertEqual(len(transport.batches), 3)  # 2 full batches (47 frames of 86 bytes) + flush
+        self.assertEqual(b''.join(data for _, data in transport.batches),
+                         b''.join(bytes(template.pack(i, 0, 0, 0, 0, 0, 1, timestamp=0)) for i in range(100)))
+        self.assertEqual(writer.getStatistics()['frames'], 100)
+        self.assertEqual(writer.getPendingSize(), 0)
+        writer.close()
+
+    def test_latency_cap(self):
+        transport = _RecordingTransport()
+        writer = BatchingWriter(transport, maxDelay=0.02)
+        start = time.monotonic()
+        status = StatusMessage()
+        status.setDeviceName("Robot")
+        writer.writeMessage(status)
+        writer.write(b'x' * 10)
+        deadline = time.monotonic() + 2
+        while not transport.batches and time.monotonic() < deadline:
+            time.sleep(0.001)
+        self.assertEqual(len(transport.batches), 1)
+        self.assertGreaterEqual(transport.batches[0][0] - start, 0.02)
+        self.assertLess(transport.batches[0][0] - start, 0.5)
+        writer.close()
+
+    def test_flush_error(self):
+        transport = _RecordingTransport()
+        error = BrokenPipeError("peer gone")
+
+        def fail(buffers):
+            raise error
+        transport.sendBuffers = fail
+        writer = BatchingWriter(transport, maxDelay=10, maxBuffers=2)
+        writer.write(b'x')
+        # the batch is full: this thread flushes it and gets the error
+        with self.assertRaises(BrokenPipeError):
+            writer.write(b'y')
+        self.assertIs(writer.getError(), error)
+        with self.assertRaises(BrokenPipeError):
+            writer.write(b'z')
+        writer._thread.join(2)
+        self.assertFalse(writer._thread.is_alive())
+
+    def test_socket(self):
+        sock_a, sock_b = socket.socketpair()
+        writer = BatchingWriter(SocketTransport(sock_a), maxDelay=0.01)
+        received = []
+
+        def receive():
+            for header, body in iterFrames(SocketTransport(sock_b)):
+                msg = PositionMessage()
+                msg.header = header
+                msg.unpack()
+                msg.body = body
+                msg.unpack(crccheck=1)
+                received.append(msg.getPosition()[0])
+
+        thread = threading.Thread(target=receive)
+        thread.start()
+        for i in range(1000):
+            msg = PositionMessage()
+            msg.setPosition([i, 0, 0])
+            writer.writeMessage(msg)
+        writer.close()
+        sock_a.shutdown(socket.SHUT_WR)
+        thread.join()
+        sock_a.close()
+        sock_b.close()
+        self.assertEqual(received, list(range(1000)))
+        self.assertLess(writer.getStatistics()['batches'], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
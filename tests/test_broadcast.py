@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+from pygtlink import *
+
+
+class _RecordingTransport(Transport):
+    """Records the sent buffers, blocking until released if gate is given"""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.sent = []
+        self.started = threading.Event()
+
+    def sendBuffers(self, buffers):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait()
+        self.sent.append(buffers)
+
+    def send(self, data):
+        pass
+
+    def recv_into(self, buffer, nbytes=0):
+        return 0
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+
+def _position(i, device="Tracker"):
+    msg = PositionMessage()
+    msg.setDeviceName(device)
+    msg.setPosition([i, 0, 0])
+    return msg
+
+
+def _positions(transport):
+    positions = []
+    for header, body in transport.sent:
+        msg = PositionMessage()
+        msg.header = header
+        msg.unpack()
+        msg.body = body
+        msg.unpack(crccheck=1)
+        positions.append(msg.getPosition()[0])
+    return positions
+
+
+class TestBroadcaster(unittest.TestCase):
+
+    def test_encode_once(self):
+        broadcaster = Broadcaster()
+        transports = [_RecordingTransport() for _ in range(5)]
+        for transport in transports[:4]:
+            broadcaster.addClient(transport)
+        broadcaster.addClient(transports[4], subscriptions=[("STATUS", None)])
+        for i in range(3):
+            self.assertEqual(broadcaster.broadcast(_position(i)), 4)
+        self.assertTrue(broadcaster.flush(timeout=5))
+        self.assertEqual(broadcaster.getEncodedFrameCount(), 3)
+        for transport in transports[:4]:
+            self.assertEqual(_positions(transport), [0, 1, 2])
+            # the very same buffers were sent to all the clients
+            self.assertIs(transport.sent[2][1], transports[0].sent[2][1])
+        self.assertEqual(transports[4].sent, [])
+
+        released = []
+        frame = SharedFrame([b'frame'], "POSITION", "Tracker", release=lambda: released.append(True))
+        self.assertEqual(broadcaster.broadcastFrame(frame), 4)
+        broadcaster.flush(timeout=5)
+        self.assertEqual(released, [True])
+        broadcaster.close()
+        self.assertEqual(broadcaster.getNumberOfClients(), 0)
+
+    def test_backpressure(self):
+        for policy, expected in ((DROP_OLDEST, [0, 8, 9]), (DROP_NEWEST, [0, 1, 2]), (DISCONNECT, [0])):
+            broadcaster = Broadcaster(queueSize=2, policy=policy)
+            gate = threading.Event()
+            fast, slow = _RecordingTransport(), _RecordingTransport(gate)
+            broadcaster.addClient(fast)
+            broadcaster.addClient(slow)
+
+            broadcaster.broadcast(_position(0))
+            self.assertTrue(slow.started.wait(5))  # the first frame is being sent
+            for i in range(1, 10):
+                broadcaster.broadcast(_position(i))
+                # the fast client keeps up
+                while len(fast.sent) < i + 1:
+                    time.sleep(0.001)
+            if policy != DISCONNECT:
+                self.assertEqual(broadcaster.getClientStatistics(slow)['droppedFrames'], 7)
+            else:
+                self.assertEqual(broadcaster.getNumberOfClients(), 1)
+            gate.set()
+            broadcaster.flush(timeout=5)
+            broadcaster.close()
+            deadline = time.monotonic() + 5
+            while len(slow.sent) < len(expected) and time.monotonic() < deadline:
+                time.sleep(0.001)  # a removed client still completes the frame it was sending
+            self.assertEqual(_positions(fast), list(range(10)))
+            self.assertEqual(_positions(slow), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
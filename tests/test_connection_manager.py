@@ -0,0 +1,149 @@
+import socket
+import threading
+import time
+import unittest
+from pygtlink import *
+
+
+class TestConnectionManager(unittest.TestCase):
+
+    def _serve(self, listener, count, received):
+        # accepts one connection and collects the device names of <count> messages
+        transport = listener.accept()
+        for _ in range(count):
+            header, body = transport.receiveFrame()
+            if header is None:
+                break
+            msg = MessageBase()
+            msg.header = header
+            msg.unpack()
+            received.append((msg.getMessageType(), msg.getDeviceName()))
+        return transport
+
+    def test_reconnect_replays_subscriptions_and_buffer(self):
+        listener = TcpListener("127.0.0.1", 0)
+        port = listener.getPort()
+        manager = ConnectionManager(minBackoff=0.01, maxBackoff=0.05)
+        received = []
+
+        thread = threading.Thread(target=lambda: self._serve(listener, 2, received).close())
+        thread.start()
+        connection = manager.getConnection("127.0.0.1", port)
+        self.assertTrue(connection.isConnected())
+        self.assertIs(manager.getConnection("127.0.0.1", port), connection)
+
+        subscription = StartStreamMessage()
+        subscription.setStreamType("IMAGE")
+        subscription.setDeviceName("US")
+        connection.subscribe(subscription)
+        status = StatusMessage()
+        status.setDeviceName("before")
+        self.assertTrue(connection.sendMessage(status))
+        thread.join()
+        self.assertEqual(received, [("STT_IMAGE", "US"), ("STATUS", "before")])
+
+        # the server went away: the health check notices it and messages are buffered
+        listener.close()
+        deadline = time.monotonic() + 2
+        while connection.checkHealth() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(connection.isConnected())
+        for name in ("down1", "down2"):
+            status.setDeviceName(name)
+            self.assertFalse(connection.sendMessage(status))
+        self.assertEqual(connection.getStatistics()['buffered'], 2)
+
+        # the server restarts: the subscription is replayed before the buffered messages
+        listener = TcpListener("127.0.0.1", port)
+        received = []
+        thread = threading.Thread(target=lambda: self._serve(listener, 3, received).close())
+        thread.start()
+        manager.start(0.01)
+        thread.join(5)
+        manager.close()
+        listener.close()
+        self.assertEqual(received, [("STT_IMAGE", "US"), ("STATUS", "down1"), ("STATUS", "down2")])
+        self.assertEqual(connection.getStatistics()['reconnects'], 1)
+
+    def test_buffer_budget(self):
+        def refuse():
+            raise ConnectionRefusedError("down")
+
+        manager = ConnectionManager(minBackoff=10, bufferBudget=200)
+        connection = manager.getCustomConnection("down", refuse)
+        self.assertFalse(connection.isConnected())
+        status = StatusMessage()
+        for i in range(5):
+            status.setDeviceName("msg{}".format(i))
+            connection.sendMessage(status)
+        stats = connection.getStatistics()
+        self.assertLessEqual(stats['bufferedBytes'], 200)
+        self.assertEqual(stats['buffered'] + stats['dropped'], 5)
+        manager.close()
+
+    def test_slow_connect_does_not_block_senders(self):
+        listener = PipeListener()
+        started = threading.Event()
+        release = threading.Event()
+
+        def connect():
+            started.set()
+            release.wait(5)
+            return listener.connect()
+
+        connection = ManagedConnection("slow", connect)
+        thread = threading.Thread(target=connection.ensureConnected)
+        thread.start()
+        self.assertTrue(started.wait(5))
+
+        # while the connection is being made, sending buffers instead of waiting for it
+        status = StatusMessage()
+        status.setDeviceName("pending")
+        start = time.monotonic()
+        self.assertFalse(connection.sendMessage(status))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(connection.ensureConnected(force=True))
+        release.set()
+        thread.join(5)
+
+        self.assertTrue(connection.isConnected())
+        server = listener.accept()
+        header, _ = server.receiveFrame()
+        msg = MessageBase()
+        msg.header = header
+        msg.unpack()
+        self.assertEqual(msg.getDeviceName(), "pending")
+        connection.close()
+        listener.close()
+
+    def test_receive_timeout_keeps_connection(self):
+        listener = PipeListener()
+        connection = ManagedConnection("idle", listener.connect)
+        self.assertTrue(connection.ensureConnected())
+        server = listener.accept()
+        connection.setTimeout(0.1)
+        with self.assertRaises(socket.timeout):
+            connection.receive(10)
+        with self.assertRaises(socket.timeout):
+            connection.receiveFrame()
+        self.assertTrue(connection.isConnected())
+
+        status = StatusMessage()
+        status.setDeviceName("after")
+        server.sendMessage(status)
+        header, _ = connection.receiveFrame()
+        self.assertIsNotNone(header)
+        connection.close()
+        listener.close()
+
+    def test_connect_timeout(self):
+        listener = TcpListener("127.0.0.1", 0)
+        transport = TcpTransport.connect("127.0.0.1", listener.getPort(), timeout=1.0)
+        # the timeout only applies to the connection, the transport is blocking
+        self.assertIsNone(transport.getSocket().gettimeout())
+        transport.close()
+        listener.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+def _make_messages():
+    messages = []
+    for i in range(4):
+        img_msg = ImageMessage2()
+        img_msg.setDeviceName("US%d" % i)
+        img_msg.setScalarTypeToUint16()
+        img_msg.setData(np.arange(64 * 48, dtype=np.float32).reshape([64, 48]) + i)
+        if i % 2:
+            img_msg.setHeaderVersion(IGTL_HEADER_VERSION_2)
+            img_msg.setMetaDataElement("Frame", str(i))
+        messages.append(img_msg)
+
+        sensor_msg = SensorMessage()
+        sensor_msg.setDeviceName("Force%d" % i)
+        sensor_msg.setData([i, 2.0, 3.0])
+        messages.append(sensor_msg)
+    return messages
+
+
+class TestEncodingPipeline(unittest.TestCase):
+
+    def _check(self, useProcesses):
+        expected = []
+        for message in _make_messages():
+            message.pack()
+            expected.append(message.header + message.body)
+
+        with EncodingPipeline(workers=2, useProcesses=useProcesses) as pipeline:
+            for message in _make_messages():
+                pipeline.submit(message)
+
+            frames = list(pipeline.frames())
+            self.assertEqual(len(frames), len(expected))
+            for frame, packed in zip(frames, expected):
+                self.assertEqual(frame.tobytes(), packed)
+                frame.release()
+
+    def test_threads(self):
+        print("Testing encoding pipeline with threads")
+        self._check(useProcesses=False)
+
+    def test_processes(self):
+        print("Testing encoding pipeline with processes")
+        self._check(useProcesses=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
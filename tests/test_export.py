@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from pygtlink import *
+from pygtlink.image_message2 import IGTL_IMAGE_HEADER_SIZE
+
+
+class TestRecordingExporter(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._tmp.name, "recording.igtl")
+        with open(self._path, 'wb') as f:
+            for i in range(20):
+                pos_msg = PositionMessage()
+                pos_msg.setDeviceName("Tracker")
+                pos_msg.setPosition([i, 2, 3])
+                pos_msg.setQuaternion([0, 0, 0, 1])
+                pos_msg.setTimeStamp(100 + i)
+                pos_msg.setHeaderVersion(2 if i % 2 else 1)
+
+                sensor_msg = SensorMessage()
+                sensor_msg.setDeviceName("Force")
+                sensor_msg.setLength(3)
+                sensor_msg.setData([i, i + 0.5, -i])
+                sensor_msg.setUnit(7)
+                sensor_msg.setTimeStamp(100 + i)
+
+                img_msg = ImageMessage2()
+                img_msg.setDeviceName("US")
+                img_msg.setSpacing([0.5, 0.5, 1])
+                img_msg.setScalarTypeToUint16()
+                img_msg.setData(np.full([8, 6], i, dtype=np.uint16))
+                img_msg.setTimeStamp(100 + i)
+
+                for msg in (pos_msg, sensor_msg, img_msg):
+                    msg.pack()
+                    f.write(msg.header + msg.body)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _check(self, exported, first, count):
+        positions = exported[('POSITION', 'Tracker')]
+        np.testing.assert_array_equal(positions['position'][:, 0], np.arange(first, first + count))
+        np.testing.assert_array_equal(positions['quaternion'][:, 3], np.ones(count))
+        np.testing.assert_allclose(positions['timestamp'], 100 + np.arange(first, first + count))
+
+        sensors = exported[('SENSOR', 'Force')]
+        np.testing.assert_array_equal(sensors['data'][:, 1], np.arange(first, first + count) + 0.5)
+        np.testing.assert_array_equal(sensors['unit'], np.full(count, 7))
+
+        images = exported[('IMAGE', 'US')]
+        self.assertEqual(images['images'].shape, (count, 8, 6, 1))
+        self.assertEqual(images['images'].dtype, np.uint16)
+        np.testing.assert_array_equal(images['images'][:, 0, 0, 0], np.arange(first, first + count))
+        np.testing.assert_allclose(images['spacing'][0], [0.5, 0.5, 1])
+
+    def test_export_threads(self):
+        exporter = RecordingExporter(self._path, workers=2, useProcesses=False, partitionSize=500)
+        self.assertEqual(sorted(s[:3] for s in exporter.getStreams()),
+                         [('IMAGE', 'US', 20), ('POSITION', 'Tracker', 20), ('SENSOR', 'Force', 20)])
+        self._check(exporter.export(), 0, 20)
+        exported = exporter.export(devices=["Tracker", "Force", "US"], startTime=105, stopTime=110)
+        self._check(exported, 5, 5)
+
+    def test_export_processes_in_memory(self):
+        # the default worker processes cannot write into in-memory image stacks, threads are used instead
+        exporter = RecordingExporter(self._path, workers=2, partitionSize=1000)
+        self._check(exporter.export(), 0, 20)
+
+    def test_image_shape(self):
+        path = os.path.join(self._tmp.name, "images.igtl")
+        with open(path, 'wb') as f:
+            for i in range(4):
+                rgb_msg = ImageMessage2()
+                rgb_msg.setDeviceName("Camera")
+                rgb_msg.setSpacing([1, 1, 1])
+                rgb_msg.setData(np.full([4, 5, 1, 3], i, dtype=np.uint8))
+                rgb_msg.setNumComponents(3)
+
+                slab_msg = ImageMessage2()
+                slab_msg.setDeviceName("Volume")
+                slab_msg.setScalarTypeToUint16()
+                slab_msg.setSpacing([1, 1, 1])
+                slab_msg.setData(np.full([4, 3, 2], i, dtype=np.uint16))
+                slab_msg.setDimensions([8, 6, 5])
+                slab_msg.setSubVolume([4, 3, 2], [2, 1, 3])
+
+                for msg in (rgb_msg, slab_msg):
+                    msg.pack()
+                    f.write(msg.header + msg.body)
+
+        exported = RecordingExporter(path, useProcesses=False).export()
+        rgb = exported[('IMAGE', 'Camera')]['images']
+        self.assertEqual(rgb.shape, (4, 4, 5, 1, 3))
+        np.testing.assert_array_equal(rgb[:, 3, 4, 0, 2], np.arange(4))
+        slabs = exported[('IMAGE', 'Volume')]['images']
+        self.assertEqual(slabs.shape, (4, 4, 3, 2))
+        np.testing.assert_array_equal(slabs[:, 3, 2, 1], np.arange(4))
+
+    def test_decode_content(self):
+        msg = ImageMessage2()
+        msg.setDeviceName("Volume")
+        msg.setScalarTypeToUint16()
+        msg.setSpacing([2, 1, 1])
+        msg.setData(np.arange(24, dtype=np.uint16).reshape([4, 3, 2]))
+        msg.pack()
+        content = bytes(msg.body)
+
+        header_msg = ImageMessage2()
+        self.assertIsNone(header_msg.decodeContent(content[:IGTL_IMAGE_HEADER_SIZE]))
+        self.assertEqual(header_msg.getDataShape(), [4, 3, 2])
+        self.assertEqual(header_msg.getSpacing()[0], 2)
+
+        out = np.zeros([4, 3, 2], dtype=np.uint16)
+        rcv_msg = ImageMessage2()
+        self.assertIs(rcv_msg.decodeContent(content, out=out), out)
+        np.testing.assert_array_equal(out, msg.getData())
+        # the message keeps no view over the content
+        self.assertIsNone(rcv_msg.getData())
+        with self.assertRaises(ValueError):
+            rcv_msg.decodeContent(content[:10])
+        with self.assertRaises(ValueError):
+            rcv_msg.decodeContent(content, out=np.zeros([2, 3, 4]))
+
+    def test_export_processes_to_files(self):
+        exporter = RecordingExporter(self._path, workers=2, partitionSize=1000)
+        self._check(exporter.export(outputDir=self._tmp.name), 0, 20)
+        with np.load(os.path.join(self._tmp.name, "POSITION_Tracker.npz")) as columns:
+            np.testing.assert_array_equal(columns['position'][:, 0], np.arange(20))
+        images = np.load(os.path.join(self._tmp.name, "IMAGE_US_images.npy"))
+        np.testing.assert_array_equal(images[:, 0, 0, 0], np.arange(20))
+
+        exported = exporter.export(devices=["Force"], messageTypes=["SENSOR"])
+        self.assertEqual(list(exported), [('SENSOR', 'Force')])
+
+
+if __name__ == '__main__':
+    unittest.main()
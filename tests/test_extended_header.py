@@ -0,0 +1,68 @@
+import unittest
+from pygtlink import *
+
+
+class TestExtendedHeader(unittest.TestCase):
+
+    def test_pack_unpack(self):
+        print("Testing extended header and metadata")
+        pos_msg = PositionMessage()
+        pos_msg.setHeaderVersion(IGTL_HEADER_VERSION_2)
+        pos_msg.setMessageID(42)
+        pos_msg.setPosition([1, 2, 3])
+        pos_msg.setMetaDataElement("Status", "OK")
+        pos_msg.setMetaDataElement("Name", "Stylus é", IANA_TYPE_UTF_8)
+        pos_msg.pack()
+
+        # 12 bytes extended header + 28 bytes content + metadata header and metadata
+        self.assertEqual(pos_msg.getPackBodySize(), len(pos_msg.body))
+        self.assertGreater(pos_msg.getPackBodySize(), 12 + 28)
+
+        rcv_msg = PositionMessage()
+        rcv_msg.header = pos_msg.header
+        self.assertEqual(rcv_msg.unpack(), UNPACK_HEADER)
+        self.assertEqual(rcv_msg.getHeaderVersion(), IGTL_HEADER_VERSION_2)
+
+        rcv_msg.body = pos_msg.body
+        self.assertEqual(rcv_msg.unpack(1), UNPACK_BODY)
+        self.assertEqual(rcv_msg.getMessageID(), 42)
+        self.assertEqual(rcv_msg.getPosition(), [1, 2, 3])
+
+        # metadata is only decoded on access
+        self.assertIsNotNone(rcv_msg._metaDataRaw)
+        self.assertEqual(rcv_msg.getMetaDataElement("Status"), "OK")
+        self.assertIsNone(rcv_msg._metaDataRaw)
+        self.assertEqual(rcv_msg.getMetaData(), {"Status": "OK", "Name": "Stylus é"})
+        self.assertIsNone(rcv_msg.getMetaDataElement("Missing"))
+
+    def test_no_metadata(self):
+        print("Testing extended header without metadata")
+        status_msg = StatusMessage()
+        status_msg.setHeaderVersion(IGTL_HEADER_VERSION_2)
+        status_msg.setErrorName("error")
+        status_msg.setMessage("message")
+        status_msg.pack()
+
+        rcv_msg = StatusMessage()
+        rcv_msg.header = status_msg.header
+        rcv_msg.unpack()
+        rcv_msg.body = status_msg.body
+        self.assertEqual(rcv_msg.unpack(), UNPACK_BODY)
+        self.assertEqual(rcv_msg.getMessage(), "message")
+        self.assertEqual(rcv_msg.getMetaData(), {})
+
+    def test_truncated_body(self):
+        print("Testing extended header with a truncated body")
+        header = IgtlHeader()
+        header.version = IGTL_HEADER_VERSION_2
+        header.type = "POSITION"
+        header.body_size = 4
+        message = PositionMessage()
+        message.header = header.pack()
+        message.unpack()
+        message.body = b'\x00\x0c\x00\x00'
+        self.assertNotEqual(message.unpack(), UNPACK_BODY)
+
+
+if __name__ == '__main__':
+    unittest.main()
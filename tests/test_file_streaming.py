@@ -0,0 +1,92 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class _CaptureTransport(Transport):
+    """Collects the sent bytes, sending files with the base (chunked read) implementation"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.sendfileCalls = 0
+
+    def send(self, data):
+        self.data += data
+
+    def sendfile(self, file, offset, count):
+        self.sendfileCalls += 1
+        Transport.sendfile(self, file, offset, count)
+
+    def recv_into(self, buffer, nbytes=0):
+        return 0
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestFileStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "volume.raw")
+        self.volume = np.random.RandomState(0).randint(0, 60000, size=[12, 10, 8]).astype('>u2')
+        with open(self.path, 'wb') as f:
+            f.write(b'HEADER')
+            f.write(self.volume.tobytes())
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_same_bytes_as_pack(self):
+        for version, dtype in ((1, '>u2'), (2, '<u2'), (2, 'float32')):
+            img_msg = ImageMessage2()
+            img_msg.setDeviceName("CT")
+            img_msg.setHeaderVersion(version)
+            img_msg.setMetaDataElement("Patient", "Anonymous")
+            img_msg.setSpacing([0.5, 0.5, 1])
+            if dtype == 'float32':
+                img_msg.setScalarType(10)
+                self.assertTrue(img_msg.setData(self.volume.astype(np.float32)[:, ::2]))
+            else:
+                self.assertTrue(img_msg.setDataFromFile(self.path, self.volume.shape, dtype, offset=6))
+            transport = _CaptureTransport()
+            sent = sendImageMessage(transport, img_msg, chunkSize=100)
+
+            img_msg.pack()
+            expected = img_msg.header + img_msg.body
+            self.assertEqual(sent, len(expected))
+            self.assertEqual(bytes(transport.data), bytes(expected))
+            # the file is sent as it is, since the message endian follows the file byte order
+            self.assertEqual(transport.sendfileCalls, 0 if dtype == 'float32' else 1)
+
+    def test_sendfile_over_socket(self):
+        img_msg = ImageMessage2()
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setDataFromFile(self.path, self.volume.shape, '>u2', offset=6)
+
+        sock_a, sock_b = socket.socketpair()
+        sender, receiver = SocketTransport(sock_a), SocketTransport(sock_b)
+        thread = threading.Thread(target=sendImageMessage, args=(sender, img_msg))
+        thread.start()
+        header, body = receiver.receiveFrame()
+        thread.join()
+        sender.close()
+        receiver.close()
+
+        rcv_msg = ImageMessage2()
+        rcv_msg.header = header
+        rcv_msg.unpack()
+        rcv_msg.body = body
+        self.assertEqual(rcv_msg.unpack(crccheck=1), UNPACK_BODY)
+        np.testing.assert_array_equal(rcv_msg.getData(), self.volume)
+
+
+if __name__ == '__main__':
+    unittest.main()
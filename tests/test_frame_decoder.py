@@ -0,0 +1,76 @@
+import io
+import random
+import socket
+import threading
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+def _frames():
+    frames = []
+    for i in range(50):
+        msg = PositionMessage()
+        msg.setDeviceName("Tracker{}".format(i))
+        msg.setPosition([i, 0, 0])
+        msg.pack()
+        frames.append(bytes(msg.header + msg.body))
+        if i % 10 == 0:
+            img_msg = ImageMessage2()
+            img_msg.setSpacing([1, 1, 1])
+            img_msg.setData(np.full([40, 30], i, dtype=np.uint8))
+            img_msg.pack()
+            frames.append(bytes(img_msg.header + img_msg.body))
+    return frames
+
+
+class TestFrameDecoder(unittest.TestCase):
+
+    def test_split_chunks(self):
+        frames = _frames()
+        stream = b''.join(frames)
+        rng = random.Random(0)
+        decoder = FrameDecoder(bufferSize=512)
+        received = []
+        offset = 0
+        while offset < len(stream):
+            size = rng.randint(1, 300)
+            decoder.feed(stream[offset:offset + size])
+            offset += size
+            received.extend(decoder.frames())
+        self.assertEqual(decoder.getBufferedSize(), 0)
+        # the frames returned first are still valid, the buffer was never overwritten
+        self.assertEqual([bytes(header) + bytes(body) for header, body in received], frames)
+
+        decoder = FrameDecoder(bufferSize=64)
+        decoder.feed(stream)
+        self.assertEqual(len(decoder.frames()), len(frames))
+
+    def test_sources(self):
+        frames = _frames()
+        stream = b''.join(frames)
+        received = [bytes(header) + bytes(body) for header, body in iterFrames(io.BytesIO(stream), bufferSize=1024)]
+        self.assertEqual(received, frames)
+
+        sock_a, sock_b = socket.socketpair()
+        thread = threading.Thread(target=lambda: (sock_a.sendall(stream), sock_a.close()))
+        thread.start()
+        received = []
+        for header, body in iterFrames(SocketTransport(sock_b)):
+            msg = PositionMessage()
+            msg.header = header
+            msg.unpack()
+            msg.body = body
+            if msg.getMessageType() == "POSITION":
+                self.assertEqual(msg.unpack(crccheck=1), UNPACK_BODY)
+                received.append(msg.getPosition()[0])
+        thread.join()
+        sock_b.close()
+        self.assertEqual(received, list(range(50)))
+
+        with self.assertRaises(ValueError):
+            list(iterFrames(io.BytesIO(stream), maxBodySize=100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class TestHeaderScan(unittest.TestCase):
+
+    def _recording(self):
+        messages = []
+        for i in range(5):
+            pos_msg = PositionMessage()
+            pos_msg.setDeviceName("Tracker")
+            pos_msg.setPosition([i, 2, 3])
+            pos_msg.setTimeStamp(1000 + i * 0.25)
+            messages.append(pos_msg)
+
+            img_msg = ImageMessage2()
+            img_msg.setDeviceName("US")
+            img_msg.setSpacing([1, 1, 1])
+            img_msg.setData(np.full([10, 20], i, dtype=np.uint8))
+            img_msg.setHeaderVersion(2)
+            img_msg.setMetaDataElement("probe", "linear")
+            messages.append(img_msg)
+
+        for msg in messages:
+            msg.pack()
+        return messages, b''.join(msg.header + msg.body for msg in messages)
+
+    def test_scan_matches_header_unpack(self):
+        messages, data = self._recording()
+        headers, stop = scanHeaders(data)
+        self.assertEqual(len(headers), len(messages))
+        self.assertEqual(stop, len(data))
+
+        offset = 0
+        for msg, scanned in zip(messages, headers):
+            header = IgtlHeader()
+            self.assertTrue(header.unpack(bytes(msg.header)))
+            self.assertEqual(scanned['offset'], offset)
+            self.assertEqual(scanned['version'], header.version)
+            self.assertEqual(scanned['type'].decode(), header.type)
+            self.assertEqual(scanned['device'].decode(), header.devicename)
+            self.assertEqual(scanned['timestamp_sec'], header.timestamp_sec)
+            self.assertEqual(scanned['timestamp_frac'], header.timestamp_frac)
+            self.assertEqual(scanned['body_size'], header.body_size)
+            self.assertEqual(scanned['crc'], header.crc)
+            offset += len(msg.header) + len(msg.body)
+
+        positions = headers[headers['type'] == b'POSITION']
+        np.testing.assert_allclose(getTimestamps(positions), 1000 + np.arange(5) * 0.25, atol=1e-6)
+
+    def test_truncated_file(self):
+        messages, data = self._recording()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "recording.igtl")
+            with open(path, 'wb') as f:
+                f.write(data[:-10])
+            headers, stop = scanFile(path)
+            self.assertEqual(len(headers), len(messages) - 1)
+            self.assertEqual(stop, headers[-1]['offset'] + 58 + headers[-1]['body_size'])
+
+            open(path, 'wb').close()
+            headers, stop = scanFile(path)
+            self.assertEqual((len(headers), stop), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+import numpy as np
+from pygtlink import *
+from pygtlink.image_message2 import Endian, PixelType, IGTL_IMAGE_HEADER_SIZE, np2s
+
+
+class TestImageByteOrder(unittest.TestCase):
+
+    def test_big_endian_pixels(self):
+        for dtype in (np.uint16, np.int32, np.float32, np.float64):
+            data = np.arange(24, dtype=dtype).reshape([2, 3, 4])
+            msg = ImageMessage2()
+            msg.setDeviceName("Image")
+            msg.setSpacing([1, 1, 1])
+            msg.setScalarType(PixelType(np2s[np.dtype(dtype).name]))
+            msg.setData(data)
+            msg.pack()
+            # the default endian field is big endian, the pixels must be packed accordingly
+            self.assertEqual(msg.body[4], Endian.endianBig)
+            wire = data.astype(np.dtype(dtype).newbyteorder('>'))
+            self.assertEqual(bytes(msg.body[IGTL_IMAGE_HEADER_SIZE:]), wire.tobytes())
+
+            rcv_msg = ImageMessage2()
+            rcv_msg.header = msg.header
+            rcv_msg.unpack()
+            rcv_msg.body = msg.body
+            self.assertEqual(rcv_msg.unpack(crccheck=1), UNPACK_BODY)
+            np.testing.assert_array_equal(rcv_msg.getData(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import socket
+import threading
+import unittest
+from pygtlink import *
+
+
+class TestLatencyProbe(unittest.TestCase):
+
+    def test_clock_offset(self):
+        print("Testing clock offset estimation")
+        local_end, remote_end = socket.socketpair()
+        local, remote = ClientSocket(SocketTransport(local_end)), ClientSocket(SocketTransport(remote_end))
+
+        # frozen clocks, the remote one 5 seconds ahead of the local one: the exchanges take no time, so that the
+        # estimations are exact whatever the scheduling
+        local_clock = lambda: 1000.0
+        remote_clock = lambda: 1005.0
+        local_probe = LatencyProbe(local, clock=local_clock)
+        remote_probe = LatencyProbe(remote, clock=remote_clock)
+
+        def answer():
+            while remote_probe.receiveMessage() is not None:
+                pass
+
+        responder = threading.Thread(target=answer)
+        responder.start()
+
+        offset = local_probe.synchronize(samples=4)
+        self.assertEqual(offset, 5.0)
+        self.assertEqual(local_probe.getRoundTripTime(), 0.0)
+
+        # a message stamped by the remote peer, received 250 ms later (exact in the header timestamp format)
+        pos_msg = PositionMessage()
+        pos_msg.setDeviceName("Tracker")
+        pos_msg.setTimeStamp(remote_clock() - 0.25)
+        latency = local_probe.record(pos_msg, local_clock())
+        self.assertEqual(latency, 0.25)
+        self.assertEqual(local_probe.getDevices(), ["Tracker"])
+        self.assertEqual(local_probe.getLatencyHistogram("Tracker").getCount(), 1)
+
+        local_end.shutdown(socket.SHUT_RDWR)
+        responder.join()
+        local_end.close()
+        remote_end.close()
+
+    def test_histogram(self):
+        print("Testing latency histogram")
+        histogram = LatencyHistogram(capacity=100)
+        for i in range(150):
+            histogram.add(i / 1000.0)
+
+        self.assertEqual(histogram.getCount(), 150)
+        self.assertEqual(len(histogram.getValues()), 100)
+        stats = histogram.getStatistics()
+        self.assertAlmostEqual(stats['min'], 0.05)
+        self.assertAlmostEqual(stats['max'], 0.149)
+        counts, edges = histogram.getHistogram(bins=10)
+        self.assertEqual(counts.sum(), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
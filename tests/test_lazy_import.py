@@ -0,0 +1,41 @@
+import importlib
+import os
+import subprocess
+import sys
+import unittest
+import pygtlink
+
+
+class TestLazyImport(unittest.TestCase):
+
+    def test_exports_match_modules(self):
+        names = []
+        for module in pygtlink._MODULES:
+            names += importlib.import_module('pygtlink.' + module).__all__
+        self.assertEqual(pygtlink.__all__, names)
+        for name, module in pygtlink._getExports().items():
+            self.assertIn(name, importlib.import_module('pygtlink.' + module).__all__)
+        # every module is listed
+        modules = [f[:-3] for f in os.listdir(os.path.dirname(pygtlink.__file__))
+                   if f.endswith('.py') and f != '__init__.py']
+        self.assertEqual(sorted(pygtlink._MODULES), sorted(modules))
+
+    def test_import_is_lazy(self):
+        code = "import sys, pygtlink; print(sorted(m for m in sys.modules if m.split('.')[0] in " \
+               "('numpy', 'crcmod') or m.startswith('pygtlink.')))"
+        out = subprocess.check_output([sys.executable, "-c", code], text=True)
+        self.assertEqual(out.strip(), "[]")
+
+        code = "import sys; from pygtlink import PositionMessage; print('numpy' in sys.modules)"
+        out = subprocess.check_output([sys.executable, "-c", code], text=True)
+        self.assertEqual(out.strip(), "False")
+
+    def test_attribute_access(self):
+        self.assertIs(pygtlink.StatusMessage, importlib.import_module('pygtlink.status_message').StatusMessage)
+        self.assertIn('ImageMessage2', dir(pygtlink))
+        with self.assertRaises(AttributeError):
+            pygtlink.NotAMessage
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import contextlib
+import io
+import json
+import unittest
+from pygtlink import loadgen, runLoad
+
+
+class TestLoadGenerator(unittest.TestCase):
+
+    def test_parse_specs(self):
+        self.assertEqual(loadgen._parseImage("512x256x3:uint16@15"), ([512, 256, 3], 'uint16', 15.0))
+        self.assertEqual(loadgen._parseImage("64x64"), ([64, 64], 'uint8', loadgen.DEFAULT_IMAGE_RATE))
+        self.assertEqual(loadgen._parseSensor("6@50"), (6, 50.0))
+        for spec in ("64", "64x64:int64"):
+            with self.assertRaises(ValueError):
+                loadgen._parseImage(spec)
+        with self.assertRaises(ValueError):
+            loadgen._parseSensor("300")
+
+    def test_local_load(self):
+        results = runLoad(images=[([64, 64], 'uint16', 50.0)], positionRate=200.0, sensor=(6, 100.0),
+                          connections=2, duration=0.5)
+        self.assertEqual([s['name'] for s in results['streams']], ["IMAGE 64x64 uint16", "POSITION", "SENSOR 6"])
+        for stream in results['streams']:
+            self.assertGreater(stream['sent'], 0)
+            self.assertEqual(stream['sent'], stream['received'])
+            self.assertGreater(stream['bytesPerSecond'], 0)
+        self.assertEqual(results['latency']['count'], sum(s['received'] for s in results['streams']))
+        self.assertGreaterEqual(results['latency']['p99'], results['latency']['p50'])
+        self.assertEqual(len(results['producerCpu']), 2)
+        self.assertEqual(len(results['consumerCpu']), 2)
+        self.assertEqual(results['errors'], [])
+
+    def test_streams_per_producer(self):
+        produced = []
+        produce = loadgen._produce
+        loadgen._produce = lambda transport, streams, duration, stats: (produced.append(streams), transport.close())
+        try:
+            runLoad(positionRate=100.0, sensor=(6, 100.0), connections=3, duration=0.1)
+        finally:
+            loadgen._produce = produce
+        self.assertEqual(len(produced), 3)
+        templates = [stream._template for streams in produced for stream in streams]
+        self.assertEqual(len(set(map(id, templates))), 6)
+
+    def test_main_json(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            loadgen.main(["--duration", "0.2", "--position", "100", "--json"])
+        results = json.loads(out.getvalue())
+        self.assertEqual(results['connections'], 1)
+        self.assertEqual(results['streams'][0]['name'], "POSITION")
+
+
+if __name__ == '__main__':
+    unittest.main()
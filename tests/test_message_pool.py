@@ -0,0 +1,136 @@
+import threading
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class _PausingTransport(object):
+    """Delivers the first <pauseAfter> bytes, then waits for resume before receiving the rest"""
+
+    def __init__(self, transport, pauseAfter):
+        self._transport = transport
+        self._pauseAfter = pauseAfter
+        self._received = 0
+        self.paused = threading.Event()
+        self.resume = threading.Event()
+
+    def recv_into(self, buffer, nbytes=0):
+        nbytes = nbytes or len(buffer)
+        if not self.resume.is_set():
+            if self._received >= self._pauseAfter:
+                self.paused.set()
+                self.resume.wait(5)
+            else:
+                nbytes = min(nbytes, self._pauseAfter - self._received)
+        n = self._transport.recv_into(buffer, nbytes)
+        self._received += n
+        return n
+
+
+class TestMessagePool(unittest.TestCase):
+
+    def test_getdata_out(self):
+        img_msg = ImageMessage2()
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setScalarTypeToUint16()
+        img_msg.setData(np.arange(12, dtype=np.uint16).reshape([3, 4]))
+        img_msg.pack()
+
+        rcv_msg = ImageMessage2()
+        rcv_msg.header = img_msg.header
+        rcv_msg.unpack()
+        rcv_msg.body = img_msg.body
+        out = np.zeros([3, 4, 1], dtype=np.uint16)
+        rcv_msg.unpack(into=out)
+        self.assertIs(rcv_msg.getData(), out)
+        np.testing.assert_array_equal(out[:, :, 0], np.arange(12).reshape([3, 4]))
+        with self.assertRaises(ValueError):
+            rcv_msg.getData(out=np.zeros([4, 3, 1], dtype=np.uint16))
+
+        sensor_msg = SensorMessage()
+        sensor_msg.setData([1.5, 2.5, 3.5])
+        sensor_msg.pack()
+        rcv_sensor = SensorMessage()
+        rcv_sensor.header = sensor_msg.header
+        rcv_sensor.unpack()
+        rcv_sensor.body = sensor_msg.body
+        rcv_sensor.unpack()
+        np.testing.assert_array_equal(rcv_sensor.getData(out=np.empty(3)), [1.5, 2.5, 3.5])
+        # without out, the data is a writable native array, as before the zero-copy decoding
+        data = rcv_sensor.getData()
+        np.testing.assert_array_equal(data, [1.5, 2.5, 3.5])
+        self.assertTrue(data.dtype.isnative and data.flags.writeable)
+        data[0] = 7
+        self.assertIs(rcv_sensor.getData(), data)
+        self.assertEqual(rcv_sensor.getData()[0], 7)
+
+    def test_receive_recycles_messages(self):
+        client, server = PipeTransport.pair()
+
+        def send():
+            for i in range(10):
+                img_msg = ImageMessage2()
+                img_msg.setDeviceName("US")
+                img_msg.setSpacing([1, 1, 1])
+                img_msg.setData(np.full([20, 30], i, dtype=np.uint8))
+                server.sendMessage(img_msg)
+                status = StatusMessage()
+                status.setDeviceName("Status{}".format(i))
+                server.sendMessage(status)
+            server.close()
+
+        thread = threading.Thread(target=send)
+        thread.start()
+
+        pool = MessagePool()
+        out = np.empty([20, 30, 1], dtype=np.uint8)
+        buffers = set()
+        for i in range(10):
+            img_msg = pool.receive(client, crccheck=1, into=out)
+            self.assertIsInstance(img_msg, ImageMessage2)
+            self.assertEqual(img_msg.getDeviceName(), "US")
+            self.assertTrue(np.all(out == i))
+            buffers.add(id(img_msg.body.obj))
+            pool.release(img_msg)
+
+            status = pool.receive(client)
+            self.assertIsInstance(status, StatusMessage)
+            self.assertEqual(status.getDeviceName(), "Status{}".format(i))
+            pool.release(status)
+        self.assertIsNone(pool.receive(client))
+        thread.join()
+
+        self.assertEqual(len(buffers), 1)
+        stats = pool.getStatistics()
+        self.assertEqual((stats['created'], stats['reused'], stats['inUse']), (2, 18, 0))
+
+    def test_concurrent_receive(self):
+        # a header half received on a connection must not be overwritten by a header received on another one
+        slow_client, slow_server = PipeTransport.pair()
+        client, server = PipeTransport.pair()
+        status = StatusMessage()
+        status.setDeviceName("Slow")
+        slow_server.sendMessage(status)
+        position = PositionMessage()
+        position.setDeviceName("Fast")
+        server.sendMessage(position)
+
+        pool = MessagePool()
+        slow = _PausingTransport(slow_client, 20)
+        received = []
+        thread = threading.Thread(target=lambda: received.append(pool.receive(slow)))
+        thread.start()
+        self.assertTrue(slow.paused.wait(5))
+
+        msg = pool.receive(client)
+        self.assertIsInstance(msg, PositionMessage)
+        self.assertEqual(msg.getDeviceName(), "Fast")
+        slow.resume.set()
+        thread.join(5)
+        self.assertIsInstance(received[0], StatusMessage)
+        self.assertEqual(received[0].getDeviceName(), "Slow")
+        self.assertEqual(msg.getDeviceName(), "Fast")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from pygtlink import *
+
+
+class TestMessageTemplate(unittest.TestCase):
+
+    def assertSamePacking(self, template, msg, *values, timestamp=1000.5):
+        msg.setTimeStamp(timestamp)
+        msg.pack()
+        self.assertEqual(bytes(template.pack(*values, timestamp=timestamp)), bytes(msg.header + msg.body))
+        self.assertEqual(template.getSize(), len(msg.header) + len(msg.body))
+
+    def test_position(self):
+        template = MessageTemplate.forPosition("Tracker")
+        for i in range(3):
+            msg = PositionMessage()
+            msg.setDeviceName("Tracker")
+            msg.setPosition([i, 2, 3])
+            msg.setQuaternion([0, 0, 0.5, 1])
+            self.assertSamePacking(template, msg, i, 2, 3, 0, 0, 0.5, 1)
+
+    def test_timestamps(self):
+        template = MessageTemplate.forPosition("Tracker")
+        for timestamp in (1000.1, 1000.123456789, 1700000000.3, 1700000000.999999, 1234.000001, 0.7, 5.9999999999):
+            msg = PositionMessage()
+            msg.setDeviceName("Tracker")
+            msg.setPosition([1, 2, 3])
+            self.assertSamePacking(template, msg, 1, 2, 3, 0, 0, 0, 0, timestamp=timestamp)
+
+    def test_timestamp_fraction(self):
+        # the closed form fraction stays within 10 ns of the reference bit by bit conversion
+        for fraction in (0.0, 0.1, 0.5, 0.123456789, 0.999999999, 0.9999999999):
+            frac = igtl_sec_to_frac(fraction)
+            self.assertLessEqual(frac, 0xFFFFFFFF)
+            self.assertLess(abs(frac - igtl_nanosec_to_frac(int(fraction * 10 ** 9))), 43)
+            msg = PositionMessage()
+            msg.setTimeStamp(1000 + fraction)
+            self.assertEqual(msg.getTimeStampSecFrac(), (1000, frac))
+
+    def test_header_version_2(self):
+        msg = PositionMessage()
+        msg.setDeviceName("Tracker")
+        msg.setHeaderVersion(IGTL_HEADER_VERSION_2)
+        msg.setMetaDataElement("Tool", "Stylus")
+        template = MessageTemplate(msg, '7f')
+        msg = PositionMessage()
+        msg.setDeviceName("Tracker")
+        msg.setHeaderVersion(IGTL_HEADER_VERSION_2)
+        msg.setMetaDataElement("Tool", "Stylus")
+        msg.setPosition([4, 5, 6])
+        self.assertSamePacking(template, msg, 4, 5, 6, 0, 0, 0, 0)
+
+        rcv_msg = PositionMessage()
+        frame = bytes(template.pack(7, 8, 9, 0, 0, 0, 1))
+        rcv_msg.header = frame[:IGTL_HEADER_SIZE]
+        rcv_msg.unpack()
+        rcv_msg.body = frame[IGTL_HEADER_SIZE:]
+        self.assertEqual(rcv_msg.unpack(crccheck=1), UNPACK_BODY)
+        self.assertEqual(rcv_msg.getPosition(), [7, 8, 9])
+        self.assertEqual(rcv_msg.getMetaDataElement("Tool"), "Stylus")
+
+    def test_sensor_and_status(self):
+        msg = SensorMessage()
+        msg.setDeviceName("Force")
+        msg.setLength(3)
+        msg.setUnit(7)
+        msg.setData([1.5, 2.5, 3.5])
+        self.assertSamePacking(MessageTemplate.forSensor("Force", 3, unit=7), msg, 1.5, 2.5, 3.5)
+
+        msg = StatusMessage()
+        msg.setDeviceName("Robot")
+        msg.setCode(3)
+        msg.setSubCode(-2)
+        msg.setErrorName("Busy")
+        msg.setMessage("moving")
+        self.assertSamePacking(MessageTemplate.forStatus("Robot", "Busy", "moving"), msg, 3, -2)
+
+        with self.assertRaises(ValueError):
+            MessageTemplate(PositionMessage(), '8f')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import asyncio
+import struct
+import unittest
+from pygtlink import *
+from pygtlink import router as router_module
+
+
+def _frame(device, i, messageType=PositionMessage):
+    msg = messageType()
+    msg.setDeviceName(device)
+    if messageType is PositionMessage:
+        msg.setPosition([i, 0, 0])
+    msg.pack()
+    return bytes(msg.header) + bytes(msg.body)
+
+
+async def _readFrames(reader, count):
+    frames = []
+    for _ in range(count):
+        header = await reader.readexactly(IGTL_HEADER_SIZE)
+        body_size = struct.unpack_from('>Q', header, 42)[0]
+        frames.append(header + await reader.readexactly(body_size))
+    return frames
+
+
+class RouterTest(unittest.TestCase):
+
+    def _run(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, 20))
+
+    def test_routes_by_device(self):
+        async def run():
+            router = Router()
+            router.addRoute("viewers", deviceName="Tracker")
+            router.addRoute("recorder")
+            router.addRoute("viewers", messageType="STATUS")
+            producers = await router.listen("127.0.0.1", 0, "producers")
+            consumers = await router.listen("127.0.0.1", 0, "viewers")
+            recorders = await router.listen("127.0.0.1", 0, "recorder")
+            port = [s.sockets[0].getsockname()[1] for s in (producers, consumers, recorders)]
+
+            viewer_reader, viewer_writer = await asyncio.open_connection("127.0.0.1", port[1])
+            recorder_reader, recorder_writer = await asyncio.open_connection("127.0.0.1", port[2])
+            _, producer_writer = await asyncio.open_connection("127.0.0.1", port[0])
+            while len(router.getPeerNames()) < 3:
+                await asyncio.sleep(0.01)
+
+            tracker = [_frame("Tracker", i) for i in range(50)]
+            other = [_frame("Probe", i) for i in range(50)]
+            # written as one stream: the frames are split at arbitrary points
+            producer_writer.write(b"".join(f for pair in zip(tracker, other) for f in pair))
+            await producer_writer.drain()
+
+            viewed = await _readFrames(viewer_reader, 50)
+            recorded = await _readFrames(recorder_reader, 100)
+            self.assertEqual(tracker, viewed)
+            self.assertEqual([f for pair in zip(tracker, other) for f in pair], recorded)
+
+            stats = router.getStatistics()
+            self.assertEqual(100, stats['received'])
+            self.assertEqual(0, stats['unrouted'])
+            self.assertEqual([50, 100, 0], [r['frames'] for r in stats['routes']])
+            self.assertEqual(sum(len(f) for f in tracker), stats['routes'][0]['bytes'])
+            self.assertGreater(stats['routes'][1]['framesPerSecond'], 0)
+
+            for writer in (viewer_writer, recorder_writer, producer_writer):
+                writer.close()
+            await router.close()
+            self.assertEqual([], router.getPeerNames())
+
+        self._run(run())
+
+    def test_crc_check(self):
+        async def run():
+            router = Router(crcCheck=True)
+            router.addRoute("viewers")
+            producers = await router.listen("127.0.0.1", 0, "producers")
+            consumers = await router.listen("127.0.0.1", 0, "viewers")
+            viewer_reader, viewer_writer = await asyncio.open_connection(
+                "127.0.0.1", consumers.sockets[0].getsockname()[1])
+            _, producer_writer = await asyncio.open_connection("127.0.0.1", producers.sockets[0].getsockname()[1])
+            while len(router.getPeerNames()) < 2:
+                await asyncio.sleep(0.01)
+
+            corrupted = bytearray(_frame("Tracker", 1))
+            corrupted[-1] ^= 0xFF
+            good = _frame("Tracker", 2)
+            producer_writer.write(bytes(corrupted) + good)
+            await producer_writer.drain()
+
+            self.assertEqual([good], await _readFrames(viewer_reader, 1))
+            stats = router.getStatistics()
+            self.assertEqual(2, stats['received'])
+            self.assertEqual(1, stats['crcErrors'])
+
+            viewer_writer.close()
+            producer_writer.close()
+            await router.close()
+
+        self._run(run())
+
+    def test_unrouted_and_not_sent_back(self):
+        async def run():
+            router = Router()
+            router.addRoute("peers", messageType="POSITION")
+            server = await router.listen("127.0.0.1", 0, "peers")
+            port = server.sockets[0].getsockname()[1]
+            reader_a, writer_a = await asyncio.open_connection("127.0.0.1", port)
+            reader_b, writer_b = await asyncio.open_connection("127.0.0.1", port)
+            while len(router._peers.get("peers", ())) < 2:
+                await asyncio.sleep(0.01)
+
+            frame = _frame("Tracker", 1)
+            writer_a.write(_frame("Status", 0, StatusMessage) + frame)
+            await writer_a.drain()
+            self.assertEqual([frame], await _readFrames(reader_b, 1))
+            stats = router.getStatistics()
+            self.assertEqual(1, stats['unrouted'])
+            self.assertEqual(1, stats['routes'][0]['frames'])
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(reader_a.readexactly(1), 0.2)
+
+            router.resetStatistics()
+            self.assertEqual(0, router.getStatistics()['routes'][0]['frames'])
+            writer_a.close()
+            writer_b.close()
+            await router.close()
+
+        self._run(run())
+
+    def test_decision_cache_bounded(self):
+        # the device names are chosen by the peers: the cached routing decisions must not grow without bound
+        router = Router()
+        router.addRoute("consumers", messageType="POSITION")
+        for i in range(router_module._DECISION_CACHE_SIZE + 10):
+            frame = _frame("Device{}".format(i), i)
+            router._route(None, frame[:IGTL_HEADER_SIZE], frame[IGTL_HEADER_SIZE:])
+        self.assertLessEqual(len(router._decisions), router_module._DECISION_CACHE_SIZE)
+        self.assertEqual(router.getStatistics()['received'], router_module._DECISION_CACHE_SIZE + 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
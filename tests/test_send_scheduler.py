@@ -0,0 +1,98 @@
+import threading
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class _BlockingConnection(object):
+    """Records the writes, blocking the first one until released"""
+
+    def __init__(self):
+        self.writes = []
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def send(self, data):
+        self.writing.set()
+        self.release.wait()
+        self.writes.append(bytes(data))
+
+
+class TestSendScheduler(unittest.TestCase):
+
+    def test_priorities(self):
+        print("Testing send scheduler priorities")
+        connection = _BlockingConnection()
+        scheduler = SendScheduler(connection, chunkSize=1024)
+        scheduler.start()
+
+        images = []
+        for i in range(3):
+            img_msg = ImageMessage2()
+            img_msg.setDeviceName("US%d" % i)
+            img_msg.setData(np.zeros([64, 64], dtype=np.uint8))
+            images.append(img_msg)
+            self.assertTrue(scheduler.submit(img_msg))
+            connection.writing.wait(timeout=5)
+
+        pos_msg = PositionMessage()
+        pos_msg.setDeviceName("Tracker")
+        self.assertTrue(scheduler.submit(pos_msg))
+
+        connection.release.set()
+        self.assertTrue(scheduler.flush(timeout=5))
+        scheduler.stop()
+
+        headers = [w for w in connection.writes if len(w) == IGTL_HEADER_SIZE]
+        devices = [h[14:34].strip(b'\x00') for h in headers]
+        # the first image was already being written, the position message goes before the other two
+        self.assertEqual(devices, [b'US0', b'Tracker', b'US1', b'US2'])
+        # image bodies are written in chunks of at most 1024 bytes
+        self.assertTrue(all(len(w) <= 1024 for w in connection.writes))
+
+        stats = scheduler.getStatistics()
+        self.assertEqual(stats[PRIORITY_HIGH]['count'], 1)
+        self.assertEqual(stats[PRIORITY_LOW]['count'], 3)
+
+    def test_queued_buffers_are_snapshots(self):
+        connection = _BlockingConnection()
+        scheduler = SendScheduler(connection)
+        scheduler.start()
+        status = StatusMessage()
+        status.setDeviceName("First")
+        self.assertTrue(scheduler.submit(status))
+        connection.writing.wait(timeout=5)
+
+        # the buffers are reused by the caller before the scheduler sends them
+        template = MessageTemplate.forPosition("Tracker")
+        self.assertTrue(scheduler.submitBytes(template.pack(1, 2, 3, 0, 0, 0, 1, timestamp=10), "POSITION"))
+        expected = bytes(template.pack(1, 2, 3, 0, 0, 0, 1, timestamp=10))
+        template.pack(4, 5, 6, 0, 0, 0, 1, timestamp=20)
+        pos_msg = PositionMessage()
+        pos_msg.setDeviceName("Probe")
+        pos_msg.pack()
+        pos_msg.header, pos_msg.body = bytearray(pos_msg.header), bytearray(pos_msg.body)
+        packed = bytes(pos_msg.header + pos_msg.body)
+        self.assertTrue(scheduler.submit(pos_msg))
+        pos_msg.header[14:19] = b'Other'
+        pos_msg.body[0:4] = b'\xff\xff\xff\xff'
+
+        connection.release.set()
+        self.assertTrue(scheduler.flush(timeout=5))
+        scheduler.stop()
+        self.assertEqual(b''.join(connection.writes[-3:]), expected + packed)
+
+    def test_rules(self):
+        print("Testing send scheduler rules")
+        scheduler = SendScheduler(_BlockingConnection())
+        scheduler.setPriority(PRIORITY_HIGH, deviceName="Probe")
+        scheduler.setPriority(PRIORITY_NORMAL, "IMAGE", "Probe")
+        self.assertEqual(scheduler.getPriority("IMAGE", "Probe"), PRIORITY_NORMAL)
+        self.assertEqual(scheduler.getPriority("SENSOR", "Probe"), PRIORITY_HIGH)
+        self.assertEqual(scheduler.getPriority("IMAGE", "Other"), PRIORITY_LOW)
+        self.assertEqual(scheduler.getPriority("SENSOR", "Other"), PRIORITY_NORMAL)
+        self.assertFalse(scheduler.submit(PositionMessage()))
+
+
+if __name__ == '__main__':
+    unittest.main()
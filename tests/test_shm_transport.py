@@ -0,0 +1,120 @@
+import socket
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class TestSharedMemoryTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.sender_end, self.receiver_end = socket.socketpair()
+        self.sender_connection = ClientSocket(SocketTransport(self.sender_end))
+        self.receiver_connection = ClientSocket(SocketTransport(self.receiver_end))
+
+    def tearDown(self):
+        self.sender_end.close()
+        self.receiver_end.close()
+
+    def test_send_receive(self):
+        print("Testing shared memory image transport")
+        sender = SharedMemoryImageSender(self.sender_connection, slots=2)
+        receiver = SharedMemoryImageReceiver()
+        self.assertTrue(sender.isLocal())
+
+        img = np.arange(200 * 100, dtype=np.uint16).reshape([200, 100])
+        img_msg = ImageMessage2()
+        img_msg.setDeviceName("US")
+        img_msg.setScalarTypeToUint16()
+        img_msg.setSpacing([0.5, 0.5, 1])
+        img_msg.setData(img)
+
+        self.assertTrue(sender.send(img_msg))
+        self.assertTrue(sender.send(img_msg))
+        # both slots are in use until the receiver releases them
+        self.assertFalse(sender.send(img_msg))
+        self.assertEqual(sender.getNumberOfDroppedFrames(), 1)
+
+        for _ in range(2):
+            rcv_msg = receiver.receive(self.receiver_connection)
+            self.assertIsInstance(rcv_msg, ShmImageMessage)
+            self.assertEqual(rcv_msg.getDeviceName(), "US")
+            self.assertEqual(rcv_msg.getSpacing(), [0.5, 0.5, 1])
+            np.testing.assert_array_equal(np.squeeze(rcv_msg.getData()), img)
+            self.assertTrue(receiver.release(rcv_msg))
+
+        self.assertTrue(sender.send(img_msg))
+        rcv_msg = receiver.receive(self.receiver_connection)
+        np.testing.assert_array_equal(np.squeeze(rcv_msg.getData()), img)
+        receiver.release(rcv_msg)
+
+        receiver.close()
+        sender.close()
+
+    def _sendThroughShm(self, img_msg):
+        sender = SharedMemoryImageSender(self.sender_connection, slots=1)
+        receiver = SharedMemoryImageReceiver()
+        try:
+            self.assertTrue(sender.send(img_msg))
+            rcv_msg = receiver.receive(self.receiver_connection)
+            self.assertIsInstance(rcv_msg, ShmImageMessage)
+            data = np.array(rcv_msg.getData())
+            receiver.release(rcv_msg)
+            return rcv_msg, data
+        finally:
+            receiver.close()
+            sender.close()
+
+    def _unpackImage(self, img_msg):
+        img_msg.pack()
+        rcv_msg = ImageMessage2()
+        rcv_msg.header = img_msg.header
+        rcv_msg.unpack()
+        rcv_msg.body = img_msg.body
+        rcv_msg.unpack()
+        return rcv_msg.getData()
+
+    def test_multiple_components(self):
+        img = np.arange(4 * 5 * 3, dtype=np.uint8).reshape([4, 5, 1, 3])
+        img_msg = ImageMessage2()
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setData(img)
+        img_msg.setNumComponents(3)
+
+        _, data = self._sendThroughShm(img_msg)
+        self.assertEqual(data.shape, (4, 5, 1, 3))
+        self.assertEqual(data.shape, self._unpackImage(img_msg).shape)
+        np.testing.assert_array_equal(data, img)
+
+    def test_subvolume(self):
+        slab = np.arange(4 * 3 * 2, dtype=np.uint16).reshape([4, 3, 2])
+        img_msg = ImageMessage2()
+        img_msg.setScalarTypeToUint16()
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setData(slab)
+        img_msg.setDimensions([8, 6, 5])
+        self.assertTrue(img_msg.setSubVolume([4, 3, 2], [2, 1, 3]))
+
+        rcv_msg, data = self._sendThroughShm(img_msg)
+        self.assertEqual(rcv_msg.getSubVolume(), ([4, 3, 2], [2, 1, 3]))
+        self.assertEqual(data.shape, (4, 3, 2))
+        self.assertEqual(data.shape, self._unpackImage(img_msg).shape)
+        np.testing.assert_array_equal(data, slab)
+
+    def test_fallback(self):
+        print("Testing shared memory image transport fallback")
+        sender = SharedMemoryImageSender(self.sender_connection, local=False)
+        receiver = SharedMemoryImageReceiver()
+
+        img_msg = ImageMessage2()
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setData(np.ones([10, 20], dtype=np.uint8))
+        self.assertTrue(sender.send(img_msg))
+
+        rcv_msg = receiver.receive(self.receiver_connection)
+        self.assertIsInstance(rcv_msg, ImageMessage2)
+        self.assertNotIsInstance(rcv_msg, ShmImageMessage)
+        self.assertEqual(rcv_msg.getData().shape, (10, 20, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import pickle
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class TestSlots(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        for cls in (IgtlHeader, MessageBase, ImageMessage2, PositionMessage, StatusMessage, SensorMessage,
+                    NDArrayMessage, PolyDataMessage, ClockSyncMessage, StartStreamMessage, StopStreamMessage,
+                    RtsStreamMessage, ShmImageMessage):
+            msg = cls()
+            self.assertFalse(hasattr(msg, '__dict__'), cls.__name__)
+            self.assertIs(type(pickle.loads(pickle.dumps(msg))), cls)
+
+    def test_lazy_image_fields(self):
+        msg = ImageMessage2()
+        self.assertIsNone(msg._matrix)
+        self.assertIsNone(msg._metaDataMap)
+        self.assertEqual(msg.getMetaData(), {})
+        self.assertTrue(np.array_equal(msg.getMatrix(), np.identity(4)))
+
+        # a message whose matrix was never accessed packs the identity orientation
+        msg.setSpacing([1, 2, 3])
+        msg.setData(np.zeros([4, 4], dtype=np.uint8))
+        other = ImageMessage2()
+        other.setSpacing([1, 2, 3])
+        other.setData(np.zeros([4, 4], dtype=np.uint8))
+        msg.pack()
+        other.pack()
+        self.assertEqual(msg.body, other.body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from pygtlink import *
+
+
+class _Client(object):
+    def __init__(self):
+        self.frames = []
+
+    def send(self, data):
+        self.frames.append(data)
+
+
+class TestStreamScheduler(unittest.TestCase):
+
+    def test_start_stop_messages(self):
+        print("Testing STT_/STP_ messages")
+        stt_msg = StartStreamMessage()
+        stt_msg.setStreamType("IMAGE")
+        stt_msg.setDeviceName("US")
+        stt_msg.setResolution(100)
+        stt_msg.pack()
+
+        rcv_msg = MessageBase()
+        rcv_msg.header = stt_msg.header
+        rcv_msg.unpack()
+        rcv_msg.body = stt_msg.body
+
+        scheduler = StreamScheduler()
+        client = _Client()
+        self.assertTrue(scheduler.handleMessage(client, rcv_msg))
+        self.assertEqual(scheduler.getNumberOfSubscriptions(), 1)
+        self.assertEqual(client.frames[-1][2:6], b'RTS_')
+
+        stp_msg = StopStreamMessage()
+        stp_msg.setStreamType("IMAGE")
+        stp_msg.setDeviceName("US")
+        stp_msg.pack()
+        self.assertTrue(scheduler.handleMessage(client, stp_msg))
+        self.assertEqual(scheduler.getNumberOfSubscriptions(), 0)
+
+    def test_stop_message_received_as_base(self):
+        scheduler = StreamScheduler()
+        client = _Client()
+        scheduler.subscribe(client, "IMAGE", "US", resolution=100)
+
+        stp_msg = StopStreamMessage()
+        stp_msg.setStreamType("IMAGE")
+        stp_msg.setDeviceName("US")
+        stp_msg.pack()
+
+        # received as on the normal path: the STP_ body is empty
+        rcv_msg = MessageBase()
+        rcv_msg.header = stp_msg.header
+        rcv_msg.unpack()
+        rcv_msg.body = stp_msg.body
+
+        self.assertTrue(scheduler.handleMessage(client, rcv_msg))
+        self.assertEqual(scheduler.getNumberOfSubscriptions(), 0)
+        self.assertEqual(client.frames[-1][2:12], b'RTS_IMAGE\x00')
+
+    def test_rates(self):
+        print("Testing per client stream rates")
+        produced = []
+
+        def source():
+            msg = PositionMessage()
+            msg.setDeviceName("Tracker")
+            msg.setPosition([len(produced), 0, 0])
+            produced.append(msg)
+            return msg
+
+        scheduler = StreamScheduler(clock=lambda: 0.0)
+        scheduler.registerSource("POSITION", "Tracker", source)
+        fast, slow, idle = _Client(), _Client(), _Client()
+        scheduler.subscribe(fast, "POSITION", "Tracker", resolution=10)
+        scheduler.subscribe(slow, "POSITION", "", resolution=40)
+
+        for i in range(8):
+            scheduler.tick(i * 0.01 + 0.001)
+
+        self.assertEqual(len(fast.frames), 8)
+        self.assertEqual(len(slow.frames), 2)
+        self.assertEqual(len(idle.frames), 0)
+        # the source is only polled when a subscriber is due
+        self.assertEqual(len(produced), 8)
+        self.assertIs(slow.frames[1], fast.frames[4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import io
+import json
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+def _image():
+    msg = ImageMessage2()
+    msg.setDeviceName("Probe")
+    msg.setSpacing([1, 1, 1])
+    msg.setData(np.zeros([32, 32], dtype=np.uint8))
+    return msg
+
+
+class TestTracing(unittest.TestCase):
+
+    def tearDown(self):
+        stopTracing()
+
+    def test_message_stages(self):
+        tracer = startTracing()
+        self.assertIs(getTracer(), tracer)
+        sender, receiver = PipeTransport.pair()
+        self.assertTrue(sender.sendMessage(_image()))
+
+        header, body = receiver.receiveFrame()
+        msg = ImageMessage2()
+        msg.header = header
+        msg.unpack()
+        msg.body = body
+        self.assertEqual(msg.unpack(crccheck=1), UNPACK_BODY)
+        self.assertIs(stopTracing(), tracer)
+
+        spans = tracer.getSpans()
+        # the pipe sends the header and the body with two raw sends
+        self.assertEqual([span[0] for span in spans],
+                         ['packContent', 'crc64', 'sendall', 'sendall', 'send', 'recv', 'recv', 'receiveFrame',
+                          'crc64', 'unpackContent'])
+        for stage, start, end, messageType, deviceName, size, _ in spans:
+            self.assertLessEqual(start, end)
+        tags = [(span[3], span[4], span[5]) for span in spans]
+        self.assertEqual(tags[2], ("IMAGE", "Probe", len(header)))
+        self.assertEqual(tags[3], ("", "", len(body)))
+        self.assertEqual(tags[5], ("IMAGE", "Probe", len(header)))
+        for i in (0, 1, 4, 6, 7, 8, 9):
+            self.assertEqual(tags[i], ("IMAGE", "Probe", len(body)), spans[i][0])
+
+    def test_raw_send(self):
+        msg = _image()
+        msg.pack()
+        data = bytes(msg.header) + bytes(msg.body)
+        sender, receiver = PipeTransport.pair()
+        tracer = startTracing()
+        sender.send(data)
+        header = receiver.receive(len(msg.header))
+        receiver.receive(len(msg.body))
+        stopTracing()
+
+        spans = tracer.getSpans()
+        self.assertEqual([span[0] for span in spans], ['sendall', 'recv', 'recv'])
+        self.assertEqual(spans[0][3:6], ("IMAGE", "Probe", len(data)))
+        self.assertEqual(spans[1][3:6], ("IMAGE", "Probe", len(header)))
+        # a body alone cannot be tagged
+        self.assertEqual(spans[2][3:6], ("", "", len(msg.body)))
+
+    def test_invalid_device_name(self):
+        msg = _image()
+        msg.pack()
+        header = bytearray(msg.header)
+        header[14:16] = b'\xff\xfe'
+        sender, receiver = PipeTransport.pair()
+        tracer = startTracing()
+        sender.send(bytes(header) + bytes(msg.body))
+        rcv_header, body = receiver.receiveFrame()
+        stopTracing()
+
+        self.assertEqual(rcv_header, header)
+        self.assertEqual([span[0] for span in tracer.getSpans()], ['sendall', 'recv', 'recv', 'receiveFrame'])
+        for span in tracer.getSpans():
+            self.assertEqual(span[3], "IMAGE")
+            self.assertEqual(span[4], "\ufffd\ufffd" + "Probe"[2:])
+
+    def test_off(self):
+        tracer = Tracer()
+        sender, receiver = PipeTransport.pair()
+        sender.sendMessage(_image())
+        receiver.receiveFrame()
+        self.assertIsNone(getTracer())
+        self.assertEqual(tracer.getSpans(), [])
+
+    def test_ring_buffer(self):
+        tracer = Tracer(capacity=4)
+        for i in range(10):
+            tracer.record("stage{}".format(i), i, i + 0.5)
+        self.assertEqual([span[0] for span in tracer.getSpans()], ["stage6", "stage7", "stage8", "stage9"])
+        self.assertEqual(tracer.getDroppedCount(), 6)
+        tracer.clear()
+        self.assertEqual(tracer.getSpans(), [])
+
+    def test_chrome_trace(self):
+        tracer = Tracer()
+        with tracer.span("process", "IMAGE", "Probe", 1024):
+            pass
+        out = io.StringIO()
+        tracer.exportChromeTrace(out)
+        trace = json.loads(out.getvalue())
+        events = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['name'], "process")
+        self.assertEqual(events[0]['args'], {'type': "IMAGE", 'device': "Probe", 'size': 1024})
+        self.assertGreaterEqual(events[0]['dur'], 0)
+        self.assertTrue(any(event['ph'] == 'M' for event in trace['traceEvents']))
+
+
+if __name__ == '__main__':
+    unittest.main()
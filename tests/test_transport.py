@@ -0,0 +1,90 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class TestTransports(unittest.TestCase):
+
+    def _exchange(self, server, connect):
+        # the client sends an image and a position message, the server echoes them back
+        img_msg = ImageMessage2()
+        img_msg.setDeviceName("US")
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setData(np.arange(300 * 200, dtype=np.uint8).reshape([300, 200]))
+        pos_msg = PositionMessage()
+        pos_msg.setDeviceName("Tracker")
+        pos_msg.setPosition([1, 2, 3])
+
+        def echo():
+            server.waitForConnection()
+            for _ in range(2):
+                header, body = server.receiveFrame()
+                server.send(header + body)
+
+        thread = threading.Thread(target=echo)
+        thread.start()
+
+        client = ClientSocket()
+        connect(client)
+        self.assertTrue(client.sendMessage(img_msg))
+        self.assertTrue(client.sendMessage(pos_msg))
+
+        rcv_img = ImageMessage2()
+        rcv_img.header = client.receive(rcv_img.getHeaderSize())
+        self.assertEqual(rcv_img.unpack(), UNPACK_HEADER)
+        rcv_img.body = client.receive(rcv_img.getPackBodySize())
+        self.assertEqual(rcv_img.unpack(1), UNPACK_BODY)
+        np.testing.assert_array_equal(np.squeeze(rcv_img.getData()), np.squeeze(img_msg.getData()))
+
+        header, body = client.receiveFrame()
+        rcv_pos = PositionMessage()
+        rcv_pos.header = header
+        rcv_pos.unpack()
+        rcv_pos.body = body
+        self.assertEqual(rcv_pos.unpack(1), UNPACK_BODY)
+        self.assertEqual(rcv_pos.getPosition(), [1, 2, 3])
+
+        thread.join()
+        client.kill()
+        server.kill()
+
+    def test_tcp(self):
+        print("Testing TCP transport")
+        server = SocketServer()
+        server.setAddress("127.0.0.1", 0)
+        server.start()
+        port = server.getListener().getPort()
+        self._exchange(server, lambda client: client.connectToServer("127.0.0.1", port))
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Unix domain sockets not available")
+    def test_unix(self):
+        print("Testing Unix domain socket transport")
+        path = os.path.join(tempfile.mkdtemp(), "igtl.sock")
+        server = SocketServer()
+        server.setUnixPath(path)
+        server.start()
+        self._exchange(server, lambda client: client.connectToUnixServer(path))
+        self.assertFalse(os.path.exists(path))
+
+    def test_pipe(self):
+        print("Testing in-process pipe transport")
+        listener = PipeListener(capacity=4096)
+        server = SocketServer()
+        server.setListener(listener)
+        self._exchange(server, lambda client: client.setTransport(listener.connect()))
+
+    def test_pipe_closed(self):
+        print("Testing in-process pipe transport end of stream")
+        a, b = PipeTransport.pair()
+        a.send(b'abc')
+        a.close()
+        self.assertEqual(b.receive(3), b'abc')
+        self.assertIsNone(b.receive(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import threading
+import tracemalloc
+import unittest
+import numpy as np
+from pygtlink import *
+
+
+class TestVolumeStreaming(unittest.TestCase):
+
+    def test_subvolume(self):
+        img_msg = ImageMessage2()
+        img_msg.setDimensions([10, 20, 30])
+        self.assertTrue(img_msg.setSubVolume([10, 5, 30], [0, 15, 0]))
+        self.assertFalse(img_msg.setSubVolume([10, 6, 30], [0, 15, 0]))
+        self.assertFalse(img_msg.setSubVolume([11, 5, 30], [0, 0, 0]))
+
+        img_msg.setSpacing([1, 1, 1])
+        img_msg.setScalarTypeToInt16()
+        img_msg.setData(np.arange(4 * 20 * 30, dtype=np.int16).reshape([4, 20, 30]))
+        img_msg.setDimensions([10, 20, 30])
+        img_msg.setSubVolume([4, 20, 30], [6, 0, 0])
+        self.assertEqual(img_msg.getSubVolumeSize(), 4 * 20 * 30 * 2)
+        img_msg.pack()
+
+        rcv_msg = ImageMessage2()
+        rcv_msg.header = img_msg.header
+        rcv_msg.unpack()
+        rcv_msg.body = img_msg.body
+        rcv_msg.unpack()
+        self.assertEqual(rcv_msg.getDimensions(), [10, 20, 30])
+        self.assertEqual(rcv_msg.getSubVolume(), ([4, 20, 30], [6, 0, 0]))
+        np.testing.assert_array_equal(rcv_msg.getData(), img_msg.getData())
+
+    def test_send_receive_volume(self):
+        volume = np.random.RandomState(0).randint(0, 4000, size=[50, 30, 20]).astype(np.uint16)
+        matrix = np.identity(4)
+        matrix[0:3, 3] = [1, 2, 3]
+        slabs = list(generateSlabs(volume, slabSize=30 * 20 * 2 * 8))
+        self.assertEqual(len(slabs), 7)
+        self.assertEqual(slabs[-1].getSubVolume(), ([2, 30, 20], [48, 0, 0]))
+
+        for axis in range(3):
+            client, server = PipeTransport.pair()
+            sent = []
+            thread = threading.Thread(target=sendVolume, args=(server, volume, [0.5, 0.5, 2], matrix, "CT", 4096, axis,
+                                                              sent.append))
+            thread.start()
+            received = []
+            assembler = receiveVolume(client, progress=received.append)
+            thread.join()
+
+            np.testing.assert_array_equal(assembler.getVolume(), volume)
+            np.testing.assert_allclose(assembler.getSpacing(), [0.5, 0.5, 2])
+            np.testing.assert_allclose(assembler.getMatrix(), matrix)
+            self.assertEqual(sent[-1], 1.0)
+            self.assertEqual(received, sorted(received))
+            self.assertEqual(received[-1], 1.0)
+            self.assertTrue(assembler.isComplete())
+
+    def test_device_filter(self):
+        volume = np.arange(8 * 4 * 3, dtype=np.uint16).reshape([8, 4, 3])
+        for deviceName in (None, "CT"):
+            client, server = PipeTransport.pair()
+            slabs = list(generateSlabs(volume, deviceName="CT", slabSize=4 * 3 * 2 * 2))
+            # a live image stream interleaved with the slabs
+            for i, slab in enumerate(slabs):
+                if deviceName is not None or i > 0:
+                    live = ImageMessage2()
+                    live.setDeviceName("Camera")
+                    live.setSpacing([1, 1, 1])
+                    live.setData(np.full([8, 4, 3], 7, dtype=np.uint16))
+                    server.sendMessage(live)
+                server.sendMessage(slab)
+
+            assembler = receiveVolume(client, deviceName=deviceName)
+            np.testing.assert_array_equal(assembler.getVolume(), volume)
+
+    def test_bounded_memory(self):
+        shape = [256, 256, 128]  # 16 MiB of uint16
+        slab_size = 512 * 1024
+        with tempfile.TemporaryDirectory() as directory:
+            source = np.lib.format.open_memmap(os.path.join(directory, "source.npy"), mode='w+', dtype=np.uint16,
+                                               shape=tuple(shape))
+            source[:] = np.arange(shape[0], dtype=np.uint16)[:, None, None]
+            source.flush()
+
+            assembler = VolumeAssembler(path=os.path.join(directory, "volume.npy"))
+            tracemalloc.start()
+            for msg in generateSlabs(source, slabSize=slab_size):
+                msg.pack()
+                rcv_msg = ImageMessage2()
+                rcv_msg.header = msg.header
+                rcv_msg.unpack()
+                rcv_msg.body = msg.body
+                rcv_msg.unpack()
+                assembler.add(rcv_msg)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.assertTrue(assembler.isComplete())
+            self.assertLess(peak, 8 * slab_size)
+            volume = assembler.getVolume()
+            self.assertIsInstance(volume, np.memmap)
+            self.assertTrue(np.array_equal(volume[:, 0, 0], np.arange(shape[0])))
+            del volume, source, assembler
+
+
+if __name__ == '__main__':
+    unittest.main()